@@ -2,13 +2,20 @@ import os
 from dotenv import load_dotenv
 
 from flask import Flask, Response, jsonify
-from werkzeug.exceptions import NotFound, Unauthorized, Forbidden
+from werkzeug.exceptions import (
+    NotFound,
+    Unauthorized,
+    Forbidden,
+    Conflict,
+    UnprocessableEntity,
+    UnsupportedMediaType,
+)
 from marshmallow import ValidationError
 
 load_dotenv()
 
 
-def create_app() -> Flask:
+def create_app(config: dict | None = None) -> Flask:
     from dotenv import load_dotenv
     load_dotenv()
 
@@ -16,23 +23,80 @@ def create_app() -> Flask:
 
     config_name = os.getenv("CONFIG_TYPE", default="app.config.DevelopmentConfig")
     app.config.from_object(config_name)
+    if config:
+        app.config.update(config)
 
-    from app.db import db
-    from app.migrate import migrate
-    from app.jwt import jwt
+    from app.db import db, apply_sqlite_profile, shard_binds
+    from app.migrate import migrate, include_object
+    from app.ids import id_allocator
+    from app.jwt import jwt, token_cache
+    from app.idempotency import store as idempotency_store
+    from app.write_buffer import write_buffer
+    from app.response_cache import response_cache
+    from app.access_log import access_log
+    from app.tracing import tracer
+    from app.profiler import profiler
+    from app.admission import admission
+    from app.hub_monitor import hub_monitor
+    from app import metrics
 
+    app.config["SQLALCHEMY_BINDS"] = {
+        **app.config.get("SQLALCHEMY_BINDS", {}),
+        **shard_binds(app.config["EXPENSE_SHARDS"]),
+    }
     db.init_app(app)
-    migrate.init_app(app, db, render_as_batch=True)
+    with app.app_context():
+        for key, engine in db.engines.items():
+            if engine.dialect.name != "sqlite":
+                continue
+            if key is None:
+                apply_sqlite_profile(engine, app.config["SQLITE_PROFILE"])
+            else:
+                # Shards hold no user table for their foreign keys to check.
+                apply_sqlite_profile(engine, app.config["SQLITE_PROFILE"], foreign_keys="OFF")
+    id_allocator.init_app(app)
+    migrate.init_app(app, db, render_as_batch=True, include_object=include_object)
     jwt.init_app(app)
+    metrics.register("jwt_cache", token_cache.metrics)
+    idempotency_store.init_app(app)
+    write_buffer.init_app(app)
+    response_cache.init_app(app)
+    metrics.register("response_cache", response_cache.metrics)
+    access_log.init_app(app)
+    metrics.register("access_log", access_log.metrics)
+    tracer.init_app(app)
+    metrics.register("tracing", tracer.metrics)
+    profiler.init_app(app)
+    admission.init_app(app)
+    metrics.register("admission", admission.metrics)
+    hub_monitor.init_app(app)
+    metrics.register("hub_monitor", hub_monitor.metrics)
 
     from app.expenses import bp as expenses_bp
     from app.swagger_bp import swagger_ui_bd
     from app.auth import bp as auth_bp
+    from app.categories import bp as categories_bp
+    from app.batch import bp as batch_bp
+    from app.reports import bp as reports_bp
 
     app.register_blueprint(expenses_bp)
+    app.register_blueprint(categories_bp)
+    app.register_blueprint(batch_bp)
+    app.register_blueprint(reports_bp)
+    app.register_blueprint(metrics.bp)
     app.register_blueprint(swagger_ui_bd)
     app.register_blueprint(auth_bp)
 
+    from app.stats import stats_cli
+    from app.sharding import shards_cli
+    from app.archive import archive_command
+    from app.reports import reports_cli
+
+    app.cli.add_command(stats_cli)
+    app.cli.add_command(shards_cli)
+    app.cli.add_command(archive_command)
+    app.cli.add_command(reports_cli)
+
     from app.swagger_utils import create_swagger_spec
 
     @app.route(app.config["SPEC_URL"])
@@ -60,11 +124,17 @@ def create_app() -> Flask:
         handle_not_fount,
         handle_schema_errors,
         handle_unauthorized,
-        handle_forbidden
+        handle_forbidden,
+        handle_conflict,
+        handle_unprocessable_entity,
+        handle_unsupported_media_type,
     )
 
     app.register_error_handler(NotFound, handle_not_fount)
     app.register_error_handler(ValidationError, handle_schema_errors)
     app.register_error_handler(Unauthorized, handle_unauthorized)
     app.register_error_handler(Forbidden, handle_forbidden)
+    app.register_error_handler(Conflict, handle_conflict)
+    app.register_error_handler(UnprocessableEntity, handle_unprocessable_entity)
+    app.register_error_handler(UnsupportedMediaType, handle_unsupported_media_type)
     return app
@@ -0,0 +1,147 @@
+import atexit
+import json
+import logging
+import random
+import sys
+import time
+
+from flask import Flask, Response, g, has_app_context, request
+from flask_jwt_extended import get_jwt_identity
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+from app.log_queue import DroppingQueueHandler, NativeQueueListener, native_queue
+
+logger = logging.getLogger("app.access")
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record: logging.LogRecord) -> str:
+        return json.dumps({
+            "ts": round(record.created, 3),
+            "level": record.levelname.lower(),
+            **record.access,
+        })
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany) -> None:
+    if has_app_context() and "access_db_time" in g:
+        conn.info.setdefault("access_query_start", []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany) -> None:
+    started = conn.info.get("access_query_start")
+    if started and has_app_context() and "access_db_time" in g:
+        g.access_db_time += time.perf_counter() - started.pop()
+        g.access_db_queries += 1
+
+
+def _handle_error(context) -> None:
+    # A statement that raises never reaches after_cursor_execute.
+    if context.connection is not None:
+        _after_cursor_execute(context.connection, None, None, None, None, False)
+
+
+def _current_identity() -> str | None:
+    try:
+        return get_jwt_identity()
+    except RuntimeError:
+        return None
+
+
+class AccessLog:
+    """
+    JSON access log written from a background thread.
+
+    Request handling only puts a record on an in-memory queue; a
+    QueueListener on a native thread formats and writes it. Non-2xx
+    responses are always logged, 2xx ones with ACCESS_LOG_SAMPLE_RATE,
+    and every record carries the rate so counts can be scaled back up.
+    """
+
+    def __init__(self) -> None:
+        self.listener: NativeQueueListener | None = None
+        self.sample_rate = 1.0
+        self._queue = None
+        self._handler: DroppingQueueHandler | None = None
+
+    def init_app(self, app: Flask) -> None:
+        if not app.config["ACCESS_LOG"]:
+            return
+
+        self.close()
+        self.sample_rate = app.config["ACCESS_LOG_SAMPLE_RATE"]
+
+        stream = logging.StreamHandler(sys.stdout)
+        stream.setFormatter(JsonFormatter())
+        self._queue = native_queue()
+        self._handler = DroppingQueueHandler(self._queue, app.config["ACCESS_LOG_QUEUE_SIZE"])
+        logger.addHandler(self._handler)
+        logger.setLevel(logging.INFO)
+        logger.propagate = False
+        self.listener = NativeQueueListener(self._queue, stream, name="access-log")
+        self.listener.start()
+
+        if not event.contains(Engine, "before_cursor_execute", _before_cursor_execute):
+            event.listen(Engine, "before_cursor_execute", _before_cursor_execute)
+            event.listen(Engine, "after_cursor_execute", _after_cursor_execute)
+            event.listen(Engine, "handle_error", _handle_error)
+
+        app.before_request(self._start)
+        app.after_request(self._log_response)
+        app.teardown_request(self._log_error)
+
+    def close(self) -> None:
+        """Flush queued records and detach from the logger."""
+        if self.listener is not None:
+            self.listener.stop()
+            self.listener = None
+        if self._handler is not None:
+            logger.removeHandler(self._handler)
+            self._handler = None
+
+    def metrics(self) -> dict:
+        return {
+            "queued": self._queue.qsize() if self._queue is not None else 0,
+            "dropped": self._handler.dropped if self._handler is not None else 0,
+        }
+
+    @staticmethod
+    def _start() -> None:
+        g.access_start = time.perf_counter()
+        g.access_db_time = 0.0
+        g.access_db_queries = 0
+        g.access_logged = False
+
+    def _log(self, status: int) -> None:
+        g.access_logged = True
+        sample_rate = self.sample_rate if 200 <= status < 300 else 1.0
+        if sample_rate < 1.0 and random.random() >= sample_rate:
+            return
+
+        record = logger.makeRecord(logger.name, logging.INFO, __file__, 0, "access", (), None)
+        record.access = {
+            "method": request.method,
+            "path": request.path,
+            "endpoint": request.endpoint,
+            "status": status,
+            "latency_ms": round((time.perf_counter() - g.access_start) * 1000, 3),
+            "db_ms": round(g.access_db_time * 1000, 3),
+            "db_queries": g.access_db_queries,
+            "user_id": _current_identity(),
+            "sample_rate": sample_rate,
+        }
+        logger.handle(record)
+
+    def _log_response(self, response: Response) -> Response:
+        if "access_start" in g:
+            self._log(response.status_code)
+        return response
+
+    def _log_error(self, exc: BaseException | None) -> None:
+        if exc is not None and "access_start" in g and not g.access_logged:
+            self._log(500)
+
+
+access_log = AccessLog()
+atexit.register(access_log.close)
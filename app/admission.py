@@ -0,0 +1,140 @@
+import json
+import threading
+from typing import Iterable
+
+from flask import Flask, current_app
+from werkzeug.exceptions import HTTPException, ServiceUnavailable
+from werkzeug.routing import RequestRedirect
+from werkzeug.wsgi import ClosingIterator
+
+# Always admitted, so a saturated worker can still be inspected.
+EXEMPT_ENDPOINTS = frozenset({"metrics.get_metrics"})
+
+
+class Gate:
+    """
+    At most ``limit`` requests at a time, with up to ``max_queue`` waiting.
+
+    The semaphore is gevent-patched in the workers, so waiting requests
+    park their greenlet instead of a thread.
+    """
+
+    def __init__(self, limit: int, max_queue: int) -> None:
+        self.limit = limit
+        self.max_queue = max_queue
+        self.in_flight = 0
+        self.queued = 0
+        self.admitted = 0
+        self.rejected = 0
+        self._slots = threading.BoundedSemaphore(limit)
+        self._lock = threading.Lock()
+
+    def acquire(self, timeout: float) -> bool:
+        with self._lock:
+            if self.in_flight >= self.limit and self.queued >= self.max_queue:
+                self.rejected += 1
+                return False
+            self.queued += 1
+        acquired = self._slots.acquire(timeout=timeout)
+        with self._lock:
+            self.queued -= 1
+            if acquired:
+                self.in_flight += 1
+                self.admitted += 1
+            else:
+                self.rejected += 1
+        return acquired
+
+    def release(self) -> None:
+        with self._lock:
+            self.in_flight -= 1
+        self._slots.release()
+
+    def metrics(self) -> dict:
+        return {
+            "limit": self.limit,
+            "in_flight": self.in_flight,
+            "queued": self.queued,
+            "admitted": self.admitted,
+            "rejected": self.rejected,
+        }
+
+
+class Admission:
+    """
+    WSGI middleware capping the requests a worker runs at once.
+
+    Requests beyond ADMISSION_MAX_REQUESTS wait up to
+    ADMISSION_QUEUE_TIMEOUT in a queue of ADMISSION_MAX_QUEUE; past that,
+    or when the queue is full, they get a 503 with Retry-After. Endpoints
+    in ADMISSION_EXPENSIVE_ENDPOINTS get their own, smaller pool, so a
+    burst of logins or imports cannot take every slot.
+    """
+
+    def __init__(self, app: Flask) -> None:
+        max_queue = app.config["ADMISSION_MAX_QUEUE"]
+        self.gates = {
+            "default": Gate(app.config["ADMISSION_MAX_REQUESTS"], max_queue),
+            "expensive": Gate(app.config["ADMISSION_EXPENSIVE_MAX_REQUESTS"], max_queue),
+        }
+        self.expensive = frozenset(app.config["ADMISSION_EXPENSIVE_ENDPOINTS"])
+        self.timeout = app.config["ADMISSION_QUEUE_TIMEOUT"].total_seconds()
+        self.retry_after = app.config["ADMISSION_RETRY_AFTER"]
+        self.url_map = app.url_map
+        self.wsgi_app = app.wsgi_app
+
+    def _endpoint(self, environ: dict) -> str | None:
+        try:
+            endpoint, _ = self.url_map.bind_to_environ(environ).match()
+        except (HTTPException, RequestRedirect):
+            return None
+        return endpoint
+
+    def _reject(self, start_response) -> Iterable[bytes]:
+        error = ServiceUnavailable(description="Server is busy, retry later")
+        body = json.dumps({
+            "error": {"code": error.code, "name": error.name, "description": error.description}
+        }).encode()
+        start_response(f"{error.code} {error.name}", [
+            ("Content-Type", "application/json"),
+            ("Content-Length", str(len(body))),
+            ("Retry-After", str(self.retry_after)),
+        ])
+        return [body]
+
+    def __call__(self, environ: dict, start_response) -> Iterable[bytes]:
+        endpoint = self._endpoint(environ)
+        if endpoint in EXEMPT_ENDPOINTS:
+            return self.wsgi_app(environ, start_response)
+
+        gate = self.gates["expensive" if endpoint in self.expensive else "default"]
+        if not gate.acquire(self.timeout):
+            return self._reject(start_response)
+        try:
+            app_iter = self.wsgi_app(environ, start_response)
+        except BaseException:
+            gate.release()
+            raise
+        # The slot is held until the server closes the body, which WSGI
+        # servers always do; streamed responses count as in flight.
+        return ClosingIterator(app_iter, gate.release)
+
+
+class AdmissionControl:
+    """Installs an ``Admission`` middleware per app when ADMISSION_CONTROL is on."""
+
+    def init_app(self, app: Flask) -> None:
+        if not app.config["ADMISSION_CONTROL"]:
+            return
+        app.extensions["admission"] = Admission(app)
+        app.wsgi_app = app.extensions["admission"]
+
+    @staticmethod
+    def metrics() -> dict:
+        admission = current_app.extensions.get("admission")
+        if admission is None:
+            return {}
+        return {name: gate.metrics() for name, gate in admission.gates.items()}
+
+
+admission = AdmissionControl()
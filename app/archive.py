@@ -0,0 +1,83 @@
+import datetime
+
+import click
+from flask import current_app
+from flask.cli import with_appcontext
+from sqlalchemy import delete, func, select
+
+from app import stats
+from app.db import db, shard_keys, use_shard, utcnow, Expenses, ExpensesArchive
+from app.response_cache import response_cache
+
+ARCHIVE_COLUMNS = ["id", "title", "amount", "user_id", "spent_at", "category_id"]
+
+
+def _next_user(after: int | None) -> int | None:
+    query = select(func.min(Expenses.user_id))
+    if after is not None:
+        query = query.where(Expenses.user_id > after)
+    return db.session.scalar(query)
+
+
+def _archive_chunk(user_id: int, cutoff: datetime.datetime, chunk_size: int) -> int:
+    # user_id = ? AND spent_at < ? is a range on ix_expenses_user_id_spent_at.
+    rows = db.session.execute(
+        select(Expenses.id, Expenses.amount)
+        .where(Expenses.user_id == user_id, Expenses.spent_at < cutoff)
+        .order_by(Expenses.spent_at, Expenses.id)
+        .limit(chunk_size)
+    ).all()
+    if not rows:
+        return 0
+
+    ids = [row.id for row in rows]
+    db.session.execute(
+        ExpensesArchive.__table__.insert().from_select(
+            ARCHIVE_COLUMNS,
+            select(*(getattr(Expenses, name) for name in ARCHIVE_COLUMNS))
+            .where(Expenses.id.in_(ids)),
+        )
+    )
+    db.session.execute(delete(Expenses).where(Expenses.id.in_(ids)))
+    stats.record_bulk_delete(user_id, [row.amount for row in rows])
+    db.session.commit()
+
+    response_cache.invalidate(user_id, ids)
+    return len(ids)
+
+
+def archive_expenses(cutoff: datetime.datetime, chunk_size: int) -> int:
+    """
+    Move expenses spent before ``cutoff`` into the archive table.
+
+    Users are walked in id order and each one's old expenses are found
+    through ix_expenses_user_id_spent_at, so no chunk scans the table.
+    Each chunk is copied, deleted and subtracted from the user's stats in
+    its own transaction, so the job holds write locks only briefly and
+    can be stopped and re-run at any point. Returns the number of rows moved.
+    """
+    moved = 0
+    for shard in shard_keys():
+        with use_shard(shard):
+            user_id = _next_user(None)
+            while user_id is not None:
+                count = chunk_size
+                while count == chunk_size:
+                    count = _archive_chunk(user_id, cutoff, chunk_size)
+                    moved += count
+                user_id = _next_user(user_id)
+    return moved
+
+
+@click.command("archive")
+@click.option("--days", type=int, help="Archive expenses spent more than this many days ago.")
+@click.option("--chunk-size", type=int, help="Rows moved per transaction.")
+@with_appcontext
+def archive_command(days: int | None, chunk_size: int | None) -> None:
+    """Move old expenses out of the hot expenses table."""
+    days = days if days is not None else current_app.config["ARCHIVE_AFTER_DAYS"]
+    chunk_size = chunk_size or current_app.config["ARCHIVE_CHUNK_SIZE"]
+
+    cutoff = utcnow() - datetime.timedelta(days=days)
+    moved = archive_expenses(cutoff, chunk_size)
+    click.echo(f"Archived {moved} expenses spent before {cutoff:%Y-%m-%d %H:%M}")
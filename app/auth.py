@@ -2,15 +2,19 @@ from flask import Blueprint, Response, request, jsonify
 from werkzeug.security import generate_password_hash
 from flask_jwt_extended import create_access_token, create_refresh_token
 from werkzeug.exceptions import Unauthorized
-from flask_jwt_extended import jwt_required, get_jwt_identity
+from flask_jwt_extended import jwt_required, get_jwt_identity, get_jwt
 
 from app.db import db, User
+from app.idempotency import idempotent
+from app.jwt import revoke_token
 from app.schemas import user_schema, user_schema_login
+from app.tracing import span
 
 bp = Blueprint("auth", __name__, url_prefix="/auth")
 
 
 @bp.route("/register", methods=["POST"])
+@idempotent
 def register() -> (Response, int):
     """
     Register a user
@@ -20,6 +24,10 @@ def register() -> (Response, int):
     tags:
       - auth
     parameters:
+      - in: header
+        name: Idempotency-Key
+        type: string
+        description: Retries with the same key replay the first response
       - in: body
         name: Users
         description: Create a new user
@@ -37,10 +45,9 @@ def register() -> (Response, int):
 
     data = user_schema.load(json_data)
 
-    user = User(
-        username=data["username"],
-        password=generate_password_hash(data["password"]),
-    )
+    with span("auth.hash_password"):
+        password = generate_password_hash(data["password"])
+    user = User(username=data["username"], password=password)
 
     db.session.add(user)
     db.session.commit()
@@ -49,6 +56,7 @@ def register() -> (Response, int):
 
 
 @bp.route("/login", methods=["POST"])
+@idempotent
 def login() -> (Response, int):
     """
     Get access token and refresh token
@@ -57,6 +65,10 @@ def login() -> (Response, int):
     tags:
       - auth
     parameters:
+      - in: header
+        name: Idempotency-Key
+        type: string
+        description: Retries with the same key replay the first response
       - in: body
         name: UserLogin
         description: Provide user login & password
@@ -78,7 +90,9 @@ def login() -> (Response, int):
         .one_or_none()
     )
 
-    if not user or not user.check_password(data["password"]):
+    with span("auth.check_password"):
+        valid = user is not None and user.check_password(data["password"])
+    if not valid:
         raise Unauthorized(description="Incorrect credentials")
 
     access_token = create_access_token(identity=user.id)
@@ -91,6 +105,7 @@ def login() -> (Response, int):
 
 @bp.route("/refresh", methods=["POST"])
 @jwt_required(refresh=True)
+@idempotent
 def refresh() -> (Response, int):
     """
         Refresh token
@@ -101,6 +116,11 @@ def refresh() -> (Response, int):
            - BearerAuth: []
         tags:
           - auth
+        parameters:
+          - in: header
+            name: Idempotency-Key
+            type: string
+            description: Retries with the same key replay the first response
         responses:
           200:
             description: Created
@@ -110,3 +130,26 @@ def refresh() -> (Response, int):
     identity = get_jwt_identity()
     access_token = create_access_token(identity=identity)
     return jsonify(access_token=access_token), 200
+
+
+@bp.route("/logout", methods=["POST"])
+@jwt_required(verify_type=False)
+def logout() -> (Response, int):
+    """
+    Revoke a token
+    Revoke the access or refresh token passed in the Authorization header
+
+    ---
+    security:
+       - BearerAuth: []
+    tags:
+      - auth
+    responses:
+      200:
+        description: Token revoked
+        schema:
+          $ref: "#definitions/LogoutOut"
+    """
+    token = get_jwt()
+    revoke_token(token)
+    return jsonify(msg=f"{token['type'].capitalize()} token revoked"), 200
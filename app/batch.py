@@ -0,0 +1,112 @@
+from flask import Blueprint, Response, current_app, jsonify, request
+from flask_jwt_extended import current_user, jwt_required
+from marshmallow import ValidationError
+from werkzeug.exceptions import HTTPException, NotFound
+from werkzeug.test import EnvironBuilder
+
+from app.db import db, begin_transaction, session_on, user_engine
+from app.idempotency import store as idempotency_store
+from app.response_cache import response_cache
+from app.schemas import batch_schema
+
+bp = Blueprint("batch", __name__)
+
+BATCH_BLUEPRINTS = {"expenses"}
+
+
+def _dispatch(sub_request: dict) -> Response:
+    """
+    Run one sub-request against the expenses views.
+
+    The sub-request gets its own request context but shares the batch's
+    app context, so ``current_user`` and the JWT decoded for the batch are
+    reused and the ``jwt_required`` wrapper is skipped.
+    """
+    app = current_app._get_current_object()
+    builder = EnvironBuilder(
+        path=sub_request["path"],
+        method=sub_request["method"],
+        json=sub_request["body"],
+        headers=sub_request["headers"],
+    )
+
+    with app.request_context(builder.get_environ()):
+        try:
+            if request.routing_exception is not None:
+                raise request.routing_exception
+            if request.blueprint not in BATCH_BLUEPRINTS:
+                raise NotFound(description="Only expenses routes can be batched")
+
+            view = app.view_functions[request.endpoint]
+            rv = view.__wrapped__(**request.view_args)
+        except (HTTPException, ValidationError) as e:
+            rv = app.handle_user_exception(e)
+        return app.make_response(rv)
+
+
+@bp.route("/batch", methods=["POST"])
+@jwt_required()
+def batch() -> (Response, int):
+    """
+    Run several expenses requests at once
+    Sub-requests run in order, in one database transaction
+
+    ---
+    security:
+      - BearerAuth: []
+    tags:
+      - batch
+    parameters:
+      - in: body
+        name: Batch
+        description: Sub-requests for the /expenses routes
+        schema:
+          $ref: "#definitions/BatchIn"
+        required: true
+    responses:
+      200:
+        description: One response per executed sub-request
+        schema:
+          $ref: "#definitions/BatchOut"
+    """
+    data = batch_schema.load(request.json)
+
+    max_requests = current_app.config["BATCH_MAX_REQUESTS"]
+    if len(data["requests"]) > max_requests:
+        raise ValidationError(
+            {"requests": [f"At most {max_requests} requests can be batched"]}
+        )
+
+    # Hand the connection used for the user lookup back before taking one
+    # for the whole batch.
+    db.session.close()
+
+    responses = []
+    committed = True
+    engine = user_engine(current_user.id)
+    with (
+        response_cache.deferred(),
+        idempotency_store.deferred() as commit_idempotent_responses,
+        engine.connect() as connection,
+    ):
+        transaction = begin_transaction(connection, write=True)
+        with session_on(connection):
+            for sub_request in data["requests"]:
+                response = _dispatch(sub_request)
+                responses.append({
+                    "status": response.status_code,
+                    "body": response.get_json(silent=True),
+                })
+                if response.status_code >= 400:
+                    db.session.rollback()
+                    if data["atomic"]:
+                        committed = False
+                        break
+
+        if committed:
+            transaction.commit()
+            commit_idempotent_responses()
+        else:
+            transaction.rollback()
+
+    return jsonify(committed=committed, responses=responses), 200
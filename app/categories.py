@@ -0,0 +1,88 @@
+from flask import blueprints, request, jsonify, Response
+from flask_jwt_extended import jwt_required, current_user
+from marshmallow import ValidationError
+from sqlalchemy import select
+
+from app.db import db, Category
+from app.schemas import category_schema, categories_schema
+
+bp = blueprints.Blueprint("categories", __name__, url_prefix="/categories")
+
+
+def check_category(category_id: int | None) -> None:
+    """Reject a category_id that does not belong to the current user."""
+    if category_id is None:
+        return
+    category = db.session.get(Category, category_id)
+    if category is None or category.user_id != current_user.id:
+        raise ValidationError({"category_id": ["Category not found"]})
+
+
+@bp.route("/", methods=["POST"])
+@jwt_required()
+def create_category() -> (Response, int):
+    """
+    Create a new category
+    You can create a new category by passing its name in
+
+    ---
+    security:
+      - BearerAuth: []
+    tags:
+      - categories
+    parameters:
+      - in: body
+        name: Category
+        description: Category name
+        schema:
+          $ref: "#definitions/CategoryIn"
+        required: true
+    responses:
+      201:
+        description: Created
+        schema:
+          $ref: "#definitions/CategoryOut"
+    """
+    data = category_schema.load(request.json)
+
+    exists = db.session.scalar(
+        select(Category.id).where(
+            Category.user_id == current_user.id, Category.name == data["name"]
+        )
+    )
+    if exists is not None:
+        raise ValidationError({"name": ["Category already exists"]})
+
+    category = Category(user_id=current_user.id, **data)
+    db.session.add(category)
+    db.session.commit()
+
+    return jsonify(category_schema.dump(category)), 201
+
+
+@bp.route("/", methods=["GET"])
+@jwt_required()
+def get_categories() -> (Response, int):
+    """
+    Get all categories
+    Return a list of the user's categories
+
+    ---
+    security:
+      - BearerAuth: []
+    tags:
+      - categories
+    responses:
+      200:
+        description: List of all categories
+        schema:
+          type: array
+          items:
+            $ref: "#definitions/CategoryOut"
+    """
+    categories = db.session.scalars(
+        select(Category)
+        .where(Category.user_id == current_user.id)
+        .order_by(Category.name)
+    ).all()
+    return jsonify(categories_schema.dump(categories)), 200
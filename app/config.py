@@ -6,18 +6,83 @@ class BaseConfig:
 
     TESTING = False
     SQLALCHEMY_DATABASE_URI = os.getenv("SQLALCHEMY_DATABASE_URI")
+    SQLITE_PROFILE = os.getenv("SQLITE_PROFILE", "performance")
+    EXPENSE_SHARDS = [uri for uri in os.getenv("EXPENSE_SHARDS", "").split(",") if uri]
+    SHARD_ID_BLOCK_SIZE = 100
     SPEC_URL = "/spec"
     BASE_SWAGGER_URL = "/swagger"
     JWT_SECRET_KEY = os.getenv("JWT_SECRET_KEY")
     JWT_REFRESH_TOKEN_EXPIRES = datetime.timedelta(hours=1)
     JWT_ACCESS_TOKEN_EXPIRES = datetime.timedelta(minutes=5)
+    JWT_BLOCKLIST_PERSIST = True
+    JWT_BLOCKLIST_SYNC_INTERVAL = datetime.timedelta(seconds=10)
+    JWT_DECODE_CACHE_SIZE = 10_000
+    # "database" shares keys between workers, "memory" keeps them per worker.
+    IDEMPOTENCY_BACKEND = os.getenv("IDEMPOTENCY_BACKEND", "database")
+    IDEMPOTENCY_KEY_TTL = datetime.timedelta(hours=1)
+    # Only the memory backend is capped; database rows are bounded by the TTL.
+    IDEMPOTENCY_MAX_KEYS = 10_000
+    IDEMPOTENCY_WAIT_TIMEOUT = datetime.timedelta(seconds=10)
+    BATCH_MAX_REQUESTS = 50
+    EXPENSE_WRITE_BUFFER = os.getenv("EXPENSE_WRITE_BUFFER", "false").lower() == "true"
+    EXPENSE_WRITE_BUFFER_MAX_ROWS = 100
+    EXPENSE_WRITE_BUFFER_MAX_DELAY = datetime.timedelta(milliseconds=5)
+    EXPENSE_WRITE_BUFFER_TIMEOUT = datetime.timedelta(seconds=30)
+    IMPORT_CHUNK_SIZE = 1000
+    IMPORT_MAX_ERRORS = 100
+    ARCHIVE_AFTER_DAYS = 365
+    ARCHIVE_CHUNK_SIZE = 1000
+    REPORTS_DIR = os.getenv("REPORTS_DIR")
+    REPORT_PROCESSES = int(os.getenv("REPORT_PROCESSES", "2"))
+    REPORT_CHUNK_SIZE = 5000
+    REPORT_POLL_INTERVAL = datetime.timedelta(seconds=1)
+    ACCESS_LOG = os.getenv("ACCESS_LOG", "true").lower() == "true"
+    ACCESS_LOG_SAMPLE_RATE = float(os.getenv("ACCESS_LOG_SAMPLE_RATE", "1.0"))
+    ACCESS_LOG_QUEUE_SIZE = 10_000
+    TRACING_EXPORTER = os.getenv("TRACING_EXPORTER", "none")
+    TRACING_SAMPLE_RATE = float(os.getenv("TRACING_SAMPLE_RATE", "1.0"))
+    TRACING_FILE = os.getenv("TRACING_FILE", "traces.jsonl")
+    TRACING_MAX_TRACES = 1000
+    TRACING_QUEUE_SIZE = 10_000
+    ADMISSION_CONTROL = os.getenv("ADMISSION_CONTROL", "true").lower() == "true"
+    # SQLAlchemy's default pool holds 5 connections plus 10 overflow.
+    ADMISSION_MAX_REQUESTS = int(os.getenv("ADMISSION_MAX_REQUESTS", "15"))
+    ADMISSION_EXPENSIVE_MAX_REQUESTS = int(os.getenv("ADMISSION_EXPENSIVE_MAX_REQUESTS", "4"))
+    ADMISSION_EXPENSIVE_ENDPOINTS = (
+        "auth.login",
+        "auth.register",
+        "batch.batch",
+        "expenses.import_expenses_csv",
+        "reports.download_report",
+    )
+    ADMISSION_MAX_QUEUE = 64
+    ADMISSION_QUEUE_TIMEOUT = datetime.timedelta(seconds=2)
+    ADMISSION_RETRY_AFTER = 1
+    HUB_MONITOR = os.getenv("HUB_MONITOR", "false").lower() == "true"
+    HUB_MONITOR_THRESHOLD = datetime.timedelta(
+        milliseconds=int(os.getenv("HUB_MONITOR_THRESHOLD_MS", "100"))
+    )
+    PROFILER_ENABLED = False
+    PROFILER_SECRET = os.getenv("PROFILER_SECRET")
+    PROFILER_DIR = os.getenv("PROFILER_DIR")
+    PROFILER_SAMPLE_INTERVAL = 0.001
+    RESPONSE_CACHE_BACKEND = os.getenv("RESPONSE_CACHE_BACKEND", "memory")
+    RESPONSE_CACHE_REDIS_URL = os.getenv("RESPONSE_CACHE_REDIS_URL", "redis://localhost:6379/0")
+    RESPONSE_CACHE_MAX_ENTRIES = 10_000
+    RESPONSE_CACHE_TTL = datetime.timedelta(minutes=1)
 
 
 class DevelopmentConfig(BaseConfig):
     DEBUG = True
+    TRACING_EXPORTER = os.getenv("TRACING_EXPORTER", "memory")
+    PROFILER_ENABLED = True
 
 
 class TestingConfig(BaseConfig):
     TESTING = True
-    SQLALCHEMY_DATABASE_URI = "sqlite:///test.db"
+    ACCESS_LOG = False
+    # The test client never closes responses, so slots would never be freed.
+    ADMISSION_CONTROL = False
+    # One file per pytest-xdist worker, so parallel workers never share a database.
+    SQLALCHEMY_DATABASE_URI = f"sqlite:///test-{os.getenv('PYTEST_XDIST_WORKER', 'main')}.db"
     SERVER_NAME = "localhost:5000"
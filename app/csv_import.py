@@ -0,0 +1,72 @@
+import csv
+import io
+from typing import IO
+
+from marshmallow import ValidationError
+from sqlalchemy import insert, select
+
+from app import stats
+from app.db import db, Category, Expenses
+from app.ids import id_allocator
+from app.schemas import expense_schema
+
+REQUIRED_COLUMNS = {"title", "amount"}
+
+
+def _insert_chunk(user_id: int, rows: list[dict]) -> None:
+    db.session.execute(insert(Expenses), id_allocator.assign("expenses", rows))
+    stats.record_bulk_insert(user_id, [row["amount"] for row in rows])
+    db.session.commit()
+
+
+def import_expenses(
+        stream: IO[bytes],
+        user_id: int,
+        chunk_size: int,
+        max_errors: int,
+) -> dict:
+    """
+    Import expenses from a CSV byte stream, one transaction per chunk.
+
+    Rows are read and validated one at a time, so memory holds at most one
+    chunk of rows and ``max_errors`` error entries whatever the file size.
+    Chunks that were committed stay imported if a later row fails.
+    """
+    reader = csv.DictReader(
+        io.TextIOWrapper(stream, encoding="utf-8-sig", errors="replace", newline="")
+    )
+    missing = REQUIRED_COLUMNS - set(reader.fieldnames or ())
+    if missing:
+        raise ValidationError({"file": [f"Missing columns: {', '.join(sorted(missing))}"]})
+
+    # None is allowed too: a row without a category.
+    category_ids = {None, *db.session.scalars(
+        select(Category.id).where(Category.user_id == user_id)
+    )}
+
+    imported = failed = 0
+    errors = []
+    chunk = []
+    for row in reader:
+        fields = {key: value for key, value in row.items() if key and value not in ("", None)}
+        try:
+            data = expense_schema.load(fields, unknown="exclude")
+            if data.get("category_id") not in category_ids:
+                raise ValidationError({"category_id": ["Category not found"]})
+        except ValidationError as e:
+            failed += 1
+            if len(errors) < max_errors:
+                errors.append({"line": reader.line_num, "errors": e.normalized_messages()})
+            continue
+
+        chunk.append({"user_id": user_id, **data})
+        if len(chunk) >= chunk_size:
+            _insert_chunk(user_id, chunk)
+            imported += len(chunk)
+            chunk = []
+
+    if chunk:
+        _insert_chunk(user_id, chunk)
+        imported += len(chunk)
+
+    return {"imported": imported, "failed": failed, "errors": errors}
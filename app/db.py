@@ -1,6 +1,16 @@
+import contextlib
+import datetime
+import zlib
+from typing import Iterator
+
+from flask import current_app
 from flask_sqlalchemy import SQLAlchemy
+from flask_sqlalchemy.session import Session
+from sqlalchemy import Table, UpdateBase, inspect
+from sqlalchemy.engine import Connection, Engine, RootTransaction
+from sqlalchemy.exc import UnboundExecutionError
 from sqlalchemy.orm import DeclarativeBase, Mapped, mapped_column, relationship
-from sqlalchemy import MetaData, CheckConstraint
+from sqlalchemy import MetaData, CheckConstraint, Index, UniqueConstraint, event, func
 from werkzeug.security import generate_password_hash, check_password_hash
 
 
@@ -16,7 +26,170 @@ class Base(DeclarativeBase):
     )
 
 
-db = SQLAlchemy(model_class=Base)
+# Tables whose rows belong to one user and live on that user's shard.
+SHARDED_TABLES = ("category", "expenses", "expenses_archive", "user_expense_stats")
+
+
+def shard_key(user_id: int, shard_count: int) -> str:
+    """Bind key of the shard holding a user's rows, from a stable hash of the id."""
+    return f"shard{zlib.crc32(str(user_id).encode()) % shard_count}"
+
+
+def shard_binds(uris: list[str]) -> dict[str, str]:
+    return {f"shard{i}": uri for i, uri in enumerate(uris)}
+
+
+def _sharded_table(mapper, clause) -> bool:
+    table = None
+    if mapper is not None:
+        table = inspect(mapper).local_table
+    elif isinstance(clause, Table):
+        table = clause
+    elif isinstance(clause, UpdateBase):
+        table = clause.table
+    return table is not None and table.name in SHARDED_TABLES
+
+
+class ShardedSession(Session):
+    """
+    Session that sends the user-owned tables to the selected shard.
+
+    Without EXPENSE_SHARDS it behaves like the default session. With them,
+    statements on SHARDED_TABLES go to the bind named by ``info["shard"]``,
+    which select_shard() sets, and every other table stays on the default
+    bind.
+    """
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if (
+            bind is None
+            and current_app.config["EXPENSE_SHARDS"]
+            and _sharded_table(mapper, clause)
+        ):
+            shard = self.info.get("shard")
+            if shard is None:
+                raise UnboundExecutionError("No shard selected for a user-owned table")
+            return self._db.engines[shard]
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+
+db = SQLAlchemy(model_class=Base, session_options={"class_": ShardedSession})
+
+
+def shard_keys() -> list[str | None]:
+    """Bind keys of every shard, or just the default bind without sharding."""
+    shards = current_app.config["EXPENSE_SHARDS"]
+    return list(shard_binds(shards)) if shards else [None]
+
+
+def user_shard(user_id: int) -> str | None:
+    shards = current_app.config["EXPENSE_SHARDS"]
+    return shard_key(user_id, len(shards)) if shards else None
+
+
+def select_shard(user_id: int) -> None:
+    """Route this session's user-owned tables to the shard of ``user_id``."""
+    db.session.info["shard"] = user_shard(user_id)
+
+
+@contextlib.contextmanager
+def use_shard(shard: str | None) -> Iterator[None]:
+    previous = db.session.info.get("shard")
+    db.session.info["shard"] = shard
+    try:
+        yield
+    finally:
+        db.session.info["shard"] = previous
+
+
+def user_engine(user_id: int) -> Engine:
+    """Engine holding a user's rows: their shard, or the default bind."""
+    shard = user_shard(user_id)
+    return db.engines[shard] if shard is not None else db.engine
+
+
+SQLITE_PROFILES = {
+    "default": {
+        "foreign_keys": "ON",
+    },
+    "performance": {
+        # Readers no longer wait for writers; NORMAL only fsyncs at checkpoints,
+        # which is durable across application crashes (not power loss) in WAL.
+        "journal_mode": "WAL",
+        "synchronous": "NORMAL",
+        "mmap_size": 256 * 1024 * 1024,
+        "cache_size": -64 * 1024,
+        "busy_timeout": 5000,
+        "foreign_keys": "ON",
+    },
+}
+
+
+def apply_sqlite_profile(engine: Engine, profile: str, **overrides) -> None:
+    """Run the profile's PRAGMAs on every new connection of a SQLite engine."""
+    pragmas = {**SQLITE_PROFILES[profile], **overrides}
+
+    @event.listens_for(engine, "connect")
+    def set_pragmas(dbapi_connection, _connection_record) -> None:
+        cursor = dbapi_connection.cursor()
+        for name, value in pragmas.items():
+            cursor.execute(f"PRAGMA {name} = {value}")
+        cursor.close()
+
+
+def begin_transaction(connection: Connection, write: bool = False) -> RootTransaction:
+    """
+    Begin a transaction that SAVEPOINTs can nest in.
+
+    pysqlite only emits BEGIN lazily before a write and never before a
+    SAVEPOINT, so releasing the first savepoint would commit. On SQLite the
+    BEGIN is therefore emitted explicitly. With ``write`` it is BEGIN
+    IMMEDIATE: in WAL mode a transaction that read first cannot wait for
+    the write lock and fails with "database is locked" at once, while
+    IMMEDIATE takes the lock up front and honours busy_timeout.
+    """
+    transaction = connection.begin()
+    if connection.dialect.name == "sqlite":
+        connection.exec_driver_sql("BEGIN IMMEDIATE" if write else "BEGIN")
+    return transaction
+
+
+class ConnectionSession(Session):
+    """Session pinned to one connection instead of the app's engines."""
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs) -> Connection:
+        return bind if bind is not None else self.bind
+
+
+@contextlib.contextmanager
+def session_on(connection: Connection) -> Iterator[Session]:
+    """
+    Point ``db.session`` at an already open connection for the block.
+
+    The session joins the connection's transaction through SAVEPOINTs, so
+    ``commit()`` and ``rollback()`` inside the block only release or undo
+    a savepoint. The caller decides whether the outer transaction commits.
+    A session the block replaces is restored when it exits.
+    """
+    registry = db.session.registry
+    previous = registry() if registry.has() else None
+    session = ConnectionSession(
+        db, bind=connection, join_transaction_mode="create_savepoint"
+    )
+    registry.set(session)
+    try:
+        yield session
+    finally:
+        session.close()
+        if previous is not None:
+            registry.set(previous)
+        else:
+            registry.clear()
+
+
+def in_session_on() -> bool:
+    """Whether ``db.session`` is pinned to a caller's transaction by ``session_on``."""
+    return isinstance(db.session(), ConnectionSession)
 
 
 class User(db.Model):
@@ -25,6 +198,7 @@ class User(db.Model):
     password: Mapped[str] = mapped_column(db.String(20), nullable=False)
 
     expenses: Mapped[list["Expenses"]] = relationship(back_populates="user")
+    categories: Mapped[list["Category"]] = relationship(back_populates="user")
 
     __table_args__ = (
         CheckConstraint("length(username) > 4", name="username_min_length"),
@@ -41,13 +215,165 @@ class User(db.Model):
         return check_password_hash(self.password, password)
 
 
+class Category(db.Model):
+    id: Mapped[int] = mapped_column(primary_key=True)
+    name: Mapped[str] = mapped_column(db.String(30))
+    user_id: Mapped[int] = mapped_column(db.ForeignKey("user.id", ondelete="CASCADE"))
+
+    user: Mapped["User"] = relationship(back_populates="categories")
+
+    __table_args__ = (
+        UniqueConstraint("user_id", "name"),
+    )
+
+    def __repr__(self) -> str:
+        return f"<Category {self.id} {self.name}>"
+
+
+def utcnow() -> datetime.datetime:
+    return datetime.datetime.now(datetime.timezone.utc).replace(tzinfo=None)
+
+
 class Expenses(db.Model):
     id: Mapped[int] = mapped_column(primary_key=True)
     title: Mapped[str] = mapped_column(db.String(50))
     amount: Mapped[float] = mapped_column(db.DECIMAL(precision=5, scale=2))
-    user_id: Mapped[int] = mapped_column(db.ForeignKey("user.id", ondelete="CASCADE"))
+    user_id: Mapped[int] = mapped_column(
+        db.ForeignKey("user.id", ondelete="CASCADE"), index=True
+    )
+    spent_at: Mapped[datetime.datetime] = mapped_column(
+        default=utcnow, server_default=func.now()
+    )
+    category_id: Mapped[int | None] = mapped_column(
+        db.ForeignKey("category.id", ondelete="SET NULL")
+    )
 
     user: Mapped["User"] = relationship(back_populates="expenses")
+    category: Mapped["Category | None"] = relationship()
+
+    __table_args__ = (
+        Index("ix_expenses_user_id_spent_at", "user_id", "spent_at"),
+        Index("ix_expenses_user_id_amount", "user_id", "amount"),
+        # text_pattern_ops lets PostgreSQL serve title prefix LIKEs from it.
+        Index(
+            "ix_expenses_user_id_title",
+            "user_id",
+            "title",
+            postgresql_ops={"title": "text_pattern_ops"},
+        ),
+        Index("ix_expenses_user_id_category_id", "user_id", "category_id"),
+        # Archived ids must never be handed out again by SQLite.
+        {"sqlite_autoincrement": True},
+    )
 
     def __repr__(self) -> str:
         return f"<{self.id} - {self.title}>"
+
+
+# Column order of the plain rows the list endpoints read, see dump_expense_rows.
+EXPENSE_ROW_FIELDS = ("id", "title", "amount", "spent_at", "category_id", "user_id")
+
+
+def expense_row_columns(model=Expenses) -> tuple:
+    return tuple(getattr(model, name) for name in EXPENSE_ROW_FIELDS)
+
+
+class ExpensesArchive(db.Model):
+    """Expenses moved out of the hot table by ``flask archive``, ids kept."""
+
+    __tablename__ = "expenses_archive"
+
+    id: Mapped[int] = mapped_column(primary_key=True, autoincrement=False)
+    title: Mapped[str] = mapped_column(db.String(50))
+    amount: Mapped[float] = mapped_column(db.DECIMAL(precision=5, scale=2))
+    user_id: Mapped[int] = mapped_column(db.ForeignKey("user.id", ondelete="CASCADE"))
+    spent_at: Mapped[datetime.datetime]
+    category_id: Mapped[int | None] = mapped_column(
+        db.ForeignKey("category.id", ondelete="SET NULL")
+    )
+
+    __table_args__ = (
+        Index("ix_expenses_archive_user_id_spent_at", "user_id", "spent_at"),
+    )
+
+    def __repr__(self) -> str:
+        return f"<Archived {self.id} - {self.title}>"
+
+
+class UserExpenseStats(db.Model):
+    __tablename__ = "user_expense_stats"
+
+    user_id: Mapped[int] = mapped_column(
+        db.ForeignKey("user.id", ondelete="CASCADE"), primary_key=True
+    )
+    count: Mapped[int] = mapped_column(default=0)
+    total: Mapped[float] = mapped_column(db.DECIMAL(precision=12, scale=2), default=0)
+    min_amount: Mapped[float | None] = mapped_column(db.DECIMAL(precision=5, scale=2))
+    max_amount: Mapped[float | None] = mapped_column(db.DECIMAL(precision=5, scale=2))
+
+    def __repr__(self) -> str:
+        return f"<UserExpenseStats {self.user_id} {self.count}>"
+
+
+class ReportJob(db.Model):
+    """A report requested through POST /reports and built by ``flask reports worker``."""
+
+    __tablename__ = "report_job"
+
+    id: Mapped[int] = mapped_column(primary_key=True)
+    user_id: Mapped[int] = mapped_column(
+        db.ForeignKey("user.id", ondelete="CASCADE"), index=True
+    )
+    year: Mapped[int]
+    format: Mapped[str] = mapped_column(db.String(4))
+    status: Mapped[str] = mapped_column(db.String(8), default="queued")
+    rows_done: Mapped[int] = mapped_column(default=0)
+    rows_total: Mapped[int | None]
+    error: Mapped[str | None] = mapped_column(db.String(200))
+    created_at: Mapped[datetime.datetime] = mapped_column(default=utcnow)
+    finished_at: Mapped[datetime.datetime | None]
+
+    __table_args__ = (
+        Index("ix_report_job_status_id", "status", "id"),
+    )
+
+    def __repr__(self) -> str:
+        return f"<ReportJob {self.id} {self.status}>"
+
+
+class RevokedToken(db.Model):
+    __tablename__ = "revoked_token"
+
+    jti: Mapped[str] = mapped_column(db.String(36), primary_key=True)
+    expires_at: Mapped[datetime.datetime] = mapped_column(index=True)
+
+    def __repr__(self) -> str:
+        return f"<RevokedToken {self.jti}>"
+
+
+class IdBlock(db.Model):
+    """Next id that app.ids hands out for a sharded table, on the default bind."""
+
+    __tablename__ = "id_block"
+
+    name: Mapped[str] = mapped_column(db.String(30), primary_key=True)
+    next_id: Mapped[int] = mapped_column(db.BigInteger)
+
+    def __repr__(self) -> str:
+        return f"<IdBlock {self.name} {self.next_id}>"
+
+
+class IdempotencyKey(db.Model):
+    """A claimed Idempotency-Key and, once the request finished, its response."""
+
+    __tablename__ = "idempotency_key"
+
+    key: Mapped[str] = mapped_column(db.String(64), primary_key=True)
+    fingerprint: Mapped[str] = mapped_column(db.String(64))
+    status: Mapped[int | None]
+    body: Mapped[bytes | None] = mapped_column(db.LargeBinary)
+    content_type: Mapped[str | None] = mapped_column(db.String(100))
+    expires_at: Mapped[datetime.datetime] = mapped_column(index=True)
+
+    def __repr__(self) -> str:
+        return f"<IdempotencyKey {self.key}>"
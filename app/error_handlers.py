@@ -1,5 +1,12 @@
 from flask import Response, jsonify
-from werkzeug.exceptions import NotFound, Unauthorized, Forbidden
+from werkzeug.exceptions import (
+    NotFound,
+    Unauthorized,
+    Forbidden,
+    Conflict,
+    UnprocessableEntity,
+    UnsupportedMediaType,
+)
 from marshmallow import ValidationError
 
 
@@ -38,3 +45,36 @@ def handle_forbidden(e: Forbidden) -> (Response, int):
         }
     }
     return jsonify(data), e.code
+
+
+def handle_conflict(e: Conflict) -> (Response, int):
+    data = {
+        "error": {
+            "code": e.code,
+            "name": e.name,
+            "description": e.description,
+        }
+    }
+    return jsonify(data), e.code
+
+
+def handle_unprocessable_entity(e: UnprocessableEntity) -> (Response, int):
+    data = {
+        "error": {
+            "code": e.code,
+            "name": e.name,
+            "description": e.description,
+        }
+    }
+    return jsonify(data), e.code
+
+
+def handle_unsupported_media_type(e: UnsupportedMediaType) -> (Response, int):
+    data = {
+        "error": {
+            "code": e.code,
+            "name": e.name,
+            "description": e.description,
+        }
+    }
+    return jsonify(data), e.code
@@ -1,19 +1,181 @@
-from flask import blueprints, request, jsonify, Response
+from typing import NoReturn
+
+from flask import blueprints, current_app, request, jsonify, Response
 from flask_jwt_extended import jwt_required, current_user
-from werkzeug.exceptions import Forbidden
+from marshmallow import ValidationError
+from sqlalchemy import Float, Row, Select, delete, func, select, type_coerce, union_all, update
+from werkzeug.exceptions import Forbidden, HTTPException, NotFound, UnsupportedMediaType
 
-from app.db import db, Expenses
+from app import stats
+from app.categories import check_category
+from app.csv_import import import_expenses
+from app.db import (
+    db, expense_row_columns, in_session_on, shard_keys, user_shard,
+    Category, Expenses, ExpensesArchive,
+)
+from app.distribution import load_amounts, summarize
+from app.idempotency import idempotent
+from app.response_cache import response_cache
+from app.write_buffer import write_buffer
+from app.search import escape_like, search_query
+from app.tracing import span
 from app.schemas import (
     expense_schema,
     expense_out_schema,
-    expense_update_schema, expenses_out_schema,
+    expense_update_schema,
+    dump_expense_rows,
+    expense_totals_schema,
+    expense_filter_schema,
+    expense_rollup_schema,
+    expense_rollup_out_schema,
+    expense_search_schema,
+    expense_stats_schema,
+    expense_breakdown_schema,
+    spent_at_range_schema,
 )
 
 bp = blueprints.Blueprint("expenses", __name__, url_prefix="/expenses")
 
 
+def _filter_by_spent_at(query: Select, filters: dict, model=Expenses) -> Select:
+    """Restrict a query to the spent_at range served by (user_id, spent_at)."""
+    if "spent_from" in filters:
+        query = query.where(model.spent_at >= filters["spent_from"])
+    if "spent_to" in filters:
+        query = query.where(model.spent_at < filters["spent_to"])
+    return query
+
+
+# Every sort is served by an index, with the primary key as tie-breaker.
+_SORTS = {
+    "id": lambda c: (c.id,),
+    "amount": lambda c: (c.amount, c.id),
+    "-amount": lambda c: (c.amount.desc(), c.id.desc()),
+}
+
+
+def build_expenses_query(user_id: int, filters: dict, model=Expenses) -> Select:
+    """
+    Compile list filters into a single query over a user's expenses.
+
+    Each filter is a range on one of the (user_id, ...) composite indexes,
+    and a title prefix is rewritten as a range so it can use
+    ix_expenses_user_id_title instead of a LIKE scan. ``model`` may also be
+    ExpensesArchive, whose rows have the same columns. The query selects
+    plain columns, so results are tuples rather than ORM instances.
+    """
+    query = _filter_by_spent_at(
+        select(*expense_row_columns(model)).where(model.user_id == user_id), filters, model
+    )
+
+    if "amount_min" in filters:
+        query = query.where(model.amount >= filters["amount_min"])
+    if "amount_max" in filters:
+        query = query.where(model.amount <= filters["amount_max"])
+    if "title_prefix" in filters:
+        query = _filter_by_title_prefix(query, filters["title_prefix"], model)
+
+    return query.order_by(*_SORTS[filters.get("sort", "id")](model))
+
+
+_MAX_CODE_POINT = chr(0x10FFFF)
+
+
+def _prefix_upper_bound(prefix: str) -> str | None:
+    """
+    The least string above every string starting with ``prefix``, in code
+    point order, or None when there is none because the prefix is all
+    U+10FFFF. Surrogates are skipped, so U+D7FF is followed by U+E000.
+    """
+    prefix = prefix.rstrip(_MAX_CODE_POINT)
+    if not prefix:
+        return None
+    following = ord(prefix[-1]) + 1
+    if 0xD800 <= following <= 0xDFFF:
+        following = 0xE000
+    return prefix[:-1] + chr(following)
+
+
+def _filter_by_title_prefix(query: Select, prefix: str, model) -> Select:
+    if db.session.get_bind().dialect.name == "postgresql":
+        # Ranges would follow the column's linguistic collation; a LIKE
+        # prefix uses the text_pattern_ops index byte by byte instead.
+        return query.where(model.title.like(f"{escape_like(prefix)}%", escape="\\"))
+
+    # SQLite compares text as UTF-8 bytes, which sort in code point order.
+    query = query.where(model.title >= prefix)
+    upper = _prefix_upper_bound(prefix)
+    return query if upper is None else query.where(model.title < upper)
+
+
+def build_archived_expenses_query(user_id: int, filters: dict) -> Select:
+    """The list query over both the hot and the archive table."""
+    both = union_all(
+        build_expenses_query(user_id, filters).order_by(None),
+        build_expenses_query(user_id, filters, ExpensesArchive).order_by(None),
+    ).subquery()
+    return select(both).order_by(*_SORTS[filters.get("sort", "id")](both.c))
+
+
+_EXPENSE_COLUMNS = tuple(Expenses.__table__.c)
+
+
+def _owned(statement, pk: int):
+    """Scope a statement on expenses to one row of the current user."""
+    return statement.where(Expenses.id == pk, Expenses.user_id == current_user.id)
+
+
+def _raise_unless_owned(pk: int, action: str) -> None:
+    """
+    Tell a missing expense (404) from another user's (403).
+
+    Ownership-scoped statements match no row in either case, so this
+    extra lookup only runs on those failure paths. Another user's expense
+    may be on another shard, so those are probed too, outside the
+    request's transaction.
+    """
+    query = select(Expenses.user_id).where(Expenses.id == pk)
+    owner = db.session.scalar(query)
+    own_shard = user_shard(current_user.id)
+    for shard in shard_keys():
+        if owner is not None:
+            break
+        if shard != own_shard:
+            with db.engines[shard].connect() as connection:
+                owner = connection.scalar(query)
+    if owner is None:
+        raise NotFound(description="Expense not found")
+    if owner != current_user.id:
+        raise Forbidden(description=f"You are not authorized to {action} this expense")
+
+
+def _not_owned(pk: int, action: str) -> NoReturn:
+    _raise_unless_owned(pk, action)
+    # The row was changed between the statement and the lookup.
+    raise NotFound(description="Expense not found")
+
+
+def _owned_expense_row(pk: int) -> Row | None:
+    return db.session.execute(_owned(select(*_EXPENSE_COLUMNS), pk)).one_or_none()
+
+
+def _spent_at_bucket(bucket: str):
+    """Truncate spent_at to the start of its day, week or month in SQL."""
+    if db.session.get_bind().dialect.name == "postgresql":
+        return func.to_char(
+            func.date_trunc(bucket, Expenses.spent_at), "YYYY-MM-DD"
+        )
+    modifiers = {
+        "day": (),
+        "week": ("weekday 0", "-6 days"),
+        "month": ("start of month",),
+    }
+    return func.date(Expenses.spent_at, *modifiers[bucket])
+
+
 @bp.route("/", methods=["POST"])
 @jwt_required()
+@idempotent
 def create_expense() -> (Response, 201):
     """
     Create a new expense
@@ -25,6 +187,10 @@ def create_expense() -> (Response, 201):
     tags:
       - expenses
     parameters:
+      - in: header
+        name: Idempotency-Key
+        type: string
+        description: Retries with the same key replay the first response
       - in: body
         name: Expenses
         description: Expenses title and amount
@@ -39,13 +205,25 @@ def create_expense() -> (Response, 201):
     """
 
     data = expense_schema.load(request.json)
+    check_category(data.get("category_id"))
+
+    # Inside a batch the row has to join the batch's transaction.
+    if current_app.config["EXPENSE_WRITE_BUFFER"] and not in_session_on():
+        user_id = current_user.id
+        # Hand the connection used for the user lookup back while waiting,
+        # so waiting requests cannot starve their leader's flush of one.
+        db.session.close()
+        expense = write_buffer.submit({"user_id": user_id, **data})
+        return jsonify(expense_out_schema.dump(expense)), 201
 
     expense = Expenses(
         user_id=current_user.id,
-        **expense_schema.load(data)
+        **data
     )
 
     db.session.add(expense)
+    db.session.flush()
+    stats.record_insert(expense.user_id, expense.amount)
     db.session.commit()
 
     return jsonify(
@@ -53,6 +231,47 @@ def create_expense() -> (Response, 201):
     ), 201
 
 
+@bp.route("/import", methods=["POST"])
+@jwt_required()
+def import_expenses_csv() -> (Response, int):
+    """
+    Import expenses from CSV
+    Send a CSV file with title and amount columns, and optionally spent_at
+    and category_id, as the raw request body
+
+    ---
+    security:
+      - BearerAuth: []
+    tags:
+      - expenses
+    consumes:
+      - text/csv
+    parameters:
+      - in: body
+        name: file
+        description: CSV with a header row
+        required: true
+        schema:
+          type: string
+          example: "title,amount,spent_at,category_id"
+    responses:
+      200:
+        description: Import summary, the first errors are listed by CSV line
+        schema:
+          $ref: "#definitions/ImportOut"
+    """
+    if request.mimetype != "text/csv":
+        raise UnsupportedMediaType(description="Send the file as text/csv")
+
+    summary = import_expenses(
+        request.stream,
+        current_user.id,
+        chunk_size=current_app.config["IMPORT_CHUNK_SIZE"],
+        max_errors=current_app.config["IMPORT_MAX_ERRORS"],
+    )
+    return jsonify(summary), 200
+
+
 @bp.route("/", methods=["GET"])
 @jwt_required()
 def get_expenses() -> (Response, int):
@@ -65,19 +284,289 @@ def get_expenses() -> (Response, int):
       - BearerAuth: []
     tags:
       - expenses
+    parameters:
+      - in: query
+        name: from
+        type: string
+        format: date-time
+        description: Only expenses spent at or after this moment
+      - in: query
+        name: to
+        type: string
+        format: date-time
+        description: Only expenses spent before this moment
+      - in: query
+        name: amount_min
+        type: number
+      - in: query
+        name: amount_max
+        type: number
+      - in: query
+        name: title_prefix
+        type: string
+        description: Case-sensitive title prefix
+      - in: query
+        name: sort
+        type: string
+        enum: [id, amount, -amount]
+        default: id
+      - in: query
+        name: include_archived
+        type: boolean
+        default: false
+        description: Also return expenses moved to the archive
     responses:
       200:
         description: List of all expenses
+        headers:
+          X-Total-Count:
+            type: integer
+            description: Number of expenses the user has
         schema:
           type: array
           items:
             $ref: "#definitions/ExpenseOut"
     """
 
-    data = expenses_out_schema.dump(current_user.expenses)
+    filters = expense_filter_schema.load(request.args)
+
+    include_archived = filters.pop("include_archived", False)
+
+    with span("expenses.query", include_archived=include_archived):
+        if include_archived:
+            query = build_archived_expenses_query(current_user.id, filters)
+        else:
+            query = build_expenses_query(current_user.id, filters)
+        expenses = db.session.execute(query).all()
+
+        # The stats row only counts the hot table.
+        if filters.keys() <= {"sort"} and not include_archived:
+            total_count = stats.get_user_stats(current_user.id).count
+        else:
+            total_count = len(expenses)
+
+    with span("expenses.serialize", rows=len(expenses)):
+        data = dump_expense_rows(expenses)
+    with span("json.encode"):
+        response = jsonify(data)
+    return response, 200, {"X-Total-Count": total_count}
+
+
+@bp.route("/rollup", methods=["GET"])
+@jwt_required()
+def get_rollup() -> (Response, int):
+    """
+    Get expenses rollup
+    Return count and sum of expenses per day, week or month
+
+    ---
+    security:
+      - BearerAuth: []
+    tags:
+      - expenses
+    parameters:
+      - in: query
+        name: bucket
+        type: string
+        enum: [day, week, month]
+        default: month
+        description: Bucket size, weeks start on Monday
+      - in: query
+        name: from
+        type: string
+        format: date-time
+      - in: query
+        name: to
+        type: string
+        format: date-time
+    responses:
+      200:
+        description: Buckets ordered by date
+        schema:
+          type: array
+          items:
+            $ref: "#definitions/ExpenseRollup"
+    """
+    params = expense_rollup_schema.load(request.args)
+    bucket = _spent_at_bucket(params["bucket"]).label("bucket")
+
+    query = _filter_by_spent_at(
+        select(
+            bucket,
+            func.count(Expenses.id).label("count"),
+            func.sum(Expenses.amount).label("total"),
+        ).where(Expenses.user_id == current_user.id),
+        params
+    ).group_by(bucket).order_by(bucket)
+
+    rows = db.session.execute(query).mappings().all()
+    return jsonify(expense_rollup_out_schema.dump(rows)), 200
+
+
+@bp.route("/totals", methods=["GET"])
+@jwt_required()
+def get_totals() -> (Response, int):
+    """
+    Get expenses totals
+    Return count, sum, min and max of the user's expenses
+
+    ---
+    security:
+      - BearerAuth: []
+    tags:
+      - expenses
+    responses:
+      200:
+        description: Expenses totals
+        schema:
+          $ref: "#definitions/ExpenseTotals"
+    """
+    user_stats = stats.get_user_stats(current_user.id)
+    return jsonify(expense_totals_schema.dump(user_stats)), 200
+
+
+@bp.route("/stats", methods=["GET"])
+@jwt_required()
+def get_stats() -> (Response, int):
+    """
+    Get expenses distribution
+    Return percentiles, standard deviation and a histogram of the amounts
+
+    ---
+    security:
+      - BearerAuth: []
+    tags:
+      - expenses
+    parameters:
+      - in: query
+        name: bins
+        type: integer
+        default: 10
+        maximum: 100
+        description: Number of equal-width histogram bins
+      - in: query
+        name: from
+        type: string
+        format: date-time
+      - in: query
+        name: to
+        type: string
+        format: date-time
+    responses:
+      200:
+        description: Distribution of the amounts, nulls when there are none
+        schema:
+          $ref: "#definitions/ExpenseStats"
+    """
+    params = expense_stats_schema.load(request.args)
+
+    # Without a date range ix_expenses_user_id_amount covers the query and
+    # already returns the amounts sorted.
+    query = _filter_by_spent_at(
+        select(type_coerce(Expenses.amount, Float)).where(Expenses.user_id == current_user.id),
+        params
+    ).order_by(Expenses.amount)
+
+    with span("expenses.query"):
+        amounts = load_amounts(query)
+    with span("expenses.summarize", rows=len(amounts)):
+        data = summarize(amounts, params["bins"])
     return jsonify(data), 200
 
 
+@bp.route("/breakdown", methods=["GET"])
+@jwt_required()
+def get_breakdown() -> (Response, int):
+    """
+    Get expenses breakdown
+    Return count and sum of expenses per category
+
+    ---
+    security:
+      - BearerAuth: []
+    tags:
+      - expenses
+    parameters:
+      - in: query
+        name: from
+        type: string
+        format: date-time
+      - in: query
+        name: to
+        type: string
+        format: date-time
+    responses:
+      200:
+        description: One entry per category, uncategorized expenses have a null category
+        schema:
+          type: array
+          items:
+            $ref: "#definitions/ExpenseBreakdown"
+    """
+    params = spent_at_range_schema.load(request.args)
+
+    query = _filter_by_spent_at(
+        select(
+            Expenses.category_id,
+            Category.name.label("category"),
+            func.count(Expenses.id).label("count"),
+            func.sum(Expenses.amount).label("total"),
+        )
+        .outerjoin(Category, Expenses.category_id == Category.id)
+        .where(Expenses.user_id == current_user.id),
+        params
+    ).group_by(Expenses.category_id, Category.name).order_by(Category.name)
+
+    rows = db.session.execute(query).mappings().all()
+    return jsonify(expense_breakdown_schema.dump(rows)), 200
+
+
+@bp.route("/search", methods=["GET"])
+@jwt_required()
+def search_expenses() -> (Response, int):
+    """
+    Search expenses
+    Return expenses whose title contains the query, best matches first
+
+    ---
+    security:
+      - BearerAuth: []
+    tags:
+      - expenses
+    parameters:
+      - in: query
+        name: q
+        type: string
+        minLength: 3
+        required: true
+      - in: query
+        name: page
+        type: integer
+        default: 1
+      - in: query
+        name: per_page
+        type: integer
+        default: 20
+        maximum: 100
+    responses:
+      200:
+        description: Page of matching expenses
+        schema:
+          type: array
+          items:
+            $ref: "#definitions/ExpenseOut"
+    """
+    params = expense_search_schema.load(request.args)
+
+    query = (
+        search_query(current_user.id, params["q"])
+        .limit(params["per_page"])
+        .offset((params["page"] - 1) * params["per_page"])
+    )
+    expenses = db.session.execute(query).all()
+    return jsonify(dump_expense_rows(expenses)), 200
+
+
 @bp.route("/<int:pk>", methods=["GET"])
 @jwt_required()
 def get_expense(pk: int) -> (Response, int):
@@ -98,7 +587,7 @@ def get_expense(pk: int) -> (Response, int):
         required: true
     responses:
       200:
-        description: Return a single expense
+        description: Return a single expense, X-Cache tells whether it was cached
         schema:
           $ref: "#definitions/ExpenseOut"
       404:
@@ -106,14 +595,20 @@ def get_expense(pk: int) -> (Response, int):
         schema:
           $ref: "#definitions/NotFound"
     """
-    expense = db.get_or_404(Expenses, pk, description="Expense not found")
+    cached, generation = response_cache.get(current_user.id, pk)
+    if cached is not None:
+        return Response(cached, mimetype="application/json", headers={"X-Cache": "HIT"}), 200
 
-    if expense.user_id != current_user.id:
-        raise Forbidden(
-            description="You are not authorized to view this expense"
-        )
-    data = expense_out_schema.dump(expense)
-    return jsonify(data), 200
+    with span("expenses.query"):
+        expense = _owned_expense_row(pk)
+    if expense is None:
+        _not_owned(pk, "view")
+
+    with span("expenses.serialize"):
+        response = jsonify(expense_out_schema.dump(expense))
+    response_cache.set(current_user.id, pk, response.get_data(), generation)
+    response.headers["X-Cache"] = "MISS"
+    return response, 200
 
 
 @bp.route("/<int:pk>", methods=["PATCH"])
@@ -146,17 +641,35 @@ def update_expense(pk: int) -> (Response, int):
             schema:
               $ref: "#definitions/ExpenseOut"
         """
-    expense = db.get_or_404(Expenses, pk, description="Expense not found")
+    try:
+        data = expense_update_schema.load(request.json)
+        check_category(data.get("category_id"))
+    except (ValidationError, HTTPException):
+        # Someone else's or a missing expense is reported before a bad body.
+        _raise_unless_owned(pk, "patch")
+        raise
 
-    if expense.user_id != current_user.id:
-        raise Forbidden(
-            description="You are not authorized to patch this expense"
-        )
+    if not data:
+        expense = _owned_expense_row(pk)
+        if expense is None:
+            _not_owned(pk, "patch")
+        return jsonify(expense_out_schema.dump(expense)), 200
+
+    # RETURNING only reports the new amount, so the stats are moved first,
+    # reading the old amount in the same statement.
+    stats_updated = "amount" in data and stats.record_amount_change(
+        current_user.id, pk, data["amount"]
+    )
 
-    data = expense_update_schema.load(request.json)
-    expense.title = data.get("title", expense.title)
-    expense.amount = data.get("amount", expense.amount)
+    expense = db.session.execute(
+        _owned(update(Expenses), pk).values(**data).returning(*_EXPENSE_COLUMNS)
+    ).one_or_none()
+    if expense is None:
+        _not_owned(pk, "patch")
+    if "amount" in data and not stats_updated:
+        stats.refresh_user_stats(current_user.id)
     db.session.commit()
+    response_cache.invalidate(expense.user_id, [pk])
 
     return jsonify(expense_out_schema.dump(expense)), 200
 
@@ -187,12 +700,13 @@ def delete_expense(pk: int) -> (Response, int):
           $ref: "#definitions/NotFound"
 
     """
-    expense = db.get_or_404(Expenses, pk, description="Expense not found")
-    if expense.user_id != current_user.id:
-        raise Forbidden(
-            description="You are not authorized to delete this expense"
-        )
-    db.session.delete(expense)
+    amount = db.session.scalar(
+        _owned(delete(Expenses), pk).returning(Expenses.amount)
+    )
+    if amount is None:
+        _not_owned(pk, "delete")
+    stats.record_delete(current_user.id, amount)
     db.session.commit()
+    response_cache.invalidate(current_user.id, [pk])
 
     return "", 204
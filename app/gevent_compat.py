@@ -0,0 +1,15 @@
+import importlib
+
+
+def original(module: str, name: str):
+    """
+    The unpatched ``module.name`` when gevent has monkey-patched it.
+
+    Work that must not run on the hub, like blocking writes or watching
+    the hub itself, needs a real OS thread and thread-safe primitives.
+    """
+    try:
+        from gevent import monkey
+    except ImportError:
+        return getattr(importlib.import_module(module), name)
+    return monkey.get_original(module, name)
@@ -0,0 +1,94 @@
+import logging
+import threading
+import weakref
+
+from flask import Flask, request
+
+logger = logging.getLogger("app.hub")
+
+OUTSIDE_REQUEST = "(outside request)"
+
+
+class HubMonitor:
+    """
+    Report code that keeps the gevent hub from switching greenlets.
+
+    gevent's monitor thread checks the hub every HUB_MONITOR_THRESHOLD and
+    emits EventLoopBlocked when one greenlet ran longer than that. Each
+    block is attributed to the Flask endpoint that greenlet was serving,
+    counted per endpoint and logged with the blocked stack, so CPU-bound
+    or unpatched calls can be found and moved off the loop.
+    """
+
+    def __init__(self) -> None:
+        self.blocks = 0
+        self.endpoints: dict[str, dict] = {}
+        self._serving: weakref.WeakKeyDictionary = weakref.WeakKeyDictionary()
+        self._getcurrent = None
+        self._blocked_event: type | None = None
+        self._lock = threading.Lock()
+
+    def init_app(self, app: Flask) -> None:
+        if not app.config["HUB_MONITOR"]:
+            return
+        try:
+            import gevent
+            from gevent import events
+        except ImportError as e:
+            raise RuntimeError("HUB_MONITOR needs gevent") from e
+
+        gevent.config.max_blocking_time = app.config["HUB_MONITOR_THRESHOLD"].total_seconds()
+        self._getcurrent = gevent.getcurrent
+        self._blocked_event = events.EventLoopBlocked
+        if self._on_event not in events.subscribers:
+            events.subscribers.append(self._on_event)
+        gevent.get_hub().start_periodic_monitoring_thread()
+
+        app.before_request(self._start)
+        app.teardown_request(self._finish)
+
+    def _start(self) -> None:
+        current = self._getcurrent()
+        # Batch sub-requests run in the batch's greenlet and keep its endpoint.
+        if current not in self._serving:
+            self._serving[current] = (request._get_current_object(), request.endpoint)
+
+    def _finish(self, exc: BaseException | None) -> None:
+        current = self._getcurrent()
+        serving = self._serving.get(current)
+        if serving is not None and serving[0] is request._get_current_object():
+            del self._serving[current]
+
+    def _on_event(self, event) -> None:
+        # Runs on gevent's native monitor thread, not in a greenlet.
+        if not isinstance(event, self._blocked_event):
+            return
+        serving = self._serving.get(event.greenlet)
+        endpoint = (serving[1] if serving else None) or OUTSIDE_REQUEST
+        blocked_ms = event.blocking_time * 1000
+        self.record(endpoint, blocked_ms)
+        logger.warning(
+            "Hub blocked for %.1f ms in %s\n%s", blocked_ms, endpoint, "\n".join(event.info)
+        )
+
+    def record(self, endpoint: str, blocked_ms: float) -> None:
+        with self._lock:
+            self.blocks += 1
+            stats = self.endpoints.setdefault(endpoint, {"count": 0, "total_ms": 0.0, "max_ms": 0.0})
+            stats["count"] += 1
+            stats["total_ms"] += blocked_ms
+            stats["max_ms"] = max(stats["max_ms"], blocked_ms)
+
+    def metrics(self) -> dict:
+        with self._lock:
+            return {
+                "blocks": self.blocks,
+                "endpoints": {
+                    endpoint: {**stats, "total_ms": round(stats["total_ms"], 3),
+                               "max_ms": round(stats["max_ms"], 3)}
+                    for endpoint, stats in self.endpoints.items()
+                },
+            }
+
+
+hub_monitor = HubMonitor()
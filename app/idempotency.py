@@ -0,0 +1,351 @@
+import contextlib
+import datetime
+import functools
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, Iterator, Protocol
+
+from flask import Flask, Response, g, has_app_context, make_response, request
+from flask_jwt_extended import get_jwt_identity
+from sqlalchemy import delete, insert, select, update
+from sqlalchemy.engine import Connection
+from sqlalchemy.exc import IntegrityError
+from werkzeug.exceptions import BadRequest, Conflict, UnprocessableEntity
+
+from app.db import db, utcnow, ConnectionSession, IdempotencyKey
+
+HEADER = "Idempotency-Key"
+MAX_KEY_LENGTH = 255
+
+# Status, body and content type of a stored response.
+StoredResponse = tuple[int, bytes, str]
+
+
+class IdempotencyBackend(Protocol):
+    def claim(self, key: str, fingerprint: str) -> tuple[bool, str]:
+        """Claim ``key`` unless a live entry has it; return ownership and its fingerprint."""
+
+    def wait(self, key: str, timeout: float) -> tuple[bool, StoredResponse | None]:
+        """
+        Wait for the owner of ``key`` to finish. Returns False on timeout,
+        else True with the stored response, or None if the owner released it.
+        """
+
+    def complete(self, key: str, response: StoredResponse) -> None: ...
+
+    def release(self, key: str) -> None: ...
+
+    def clear(self) -> None: ...
+
+
+class _Entry:
+    __slots__ = ("fingerprint", "done", "response", "expires_at")
+
+    def __init__(self, fingerprint: str, expires_at: float) -> None:
+        self.fingerprint = fingerprint
+        self.done = threading.Event()
+        self.response: StoredResponse | None = None
+        self.expires_at = expires_at
+
+
+class MemoryBackend:
+    """Bounded, TTL-expiring entries private to the worker process."""
+
+    def __init__(self, max_keys: int = 10_000, ttl: float = 3600) -> None:
+        self.max_keys = max_keys
+        self.ttl = ttl
+        self._entries: OrderedDict[str, _Entry] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def claim(self, key: str, fingerprint: str) -> tuple[bool, str]:
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry.expires_at > now:
+                return False, entry.fingerprint
+
+            self._entries[key] = _Entry(fingerprint, now + self.ttl)
+            self._entries.move_to_end(key)
+            self._evict(now)
+            return True, fingerprint
+
+    def wait(self, key: str, timeout: float) -> tuple[bool, StoredResponse | None]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return True, None
+        if not entry.done.wait(timeout):
+            return False, None
+        return True, entry.response
+
+    def complete(self, key: str, response: StoredResponse) -> None:
+        entry = self._entries.get(key)
+        if entry is not None:
+            entry.response = response
+            entry.done.set()
+
+    def release(self, key: str) -> None:
+        with self._lock:
+            entry = self._entries.pop(key, None)
+        if entry is not None:
+            entry.done.set()
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def _evict(self, now: float) -> None:
+        # Entries are in expiry order. Claims still in flight are never
+        # evicted, or a retry with their key would run the view again, so
+        # the store can exceed max_keys by the number of requests running.
+        excess = len(self._entries) - self.max_keys
+        victims = []
+        for key, entry in self._entries.items():
+            expired = entry.expires_at <= now
+            if not expired and len(victims) >= excess:
+                break
+            if expired or entry.done.is_set():
+                victims.append(key)
+        for key in victims:
+            del self._entries[key]
+
+
+class DatabaseBackend:
+    """
+    Entries in the idempotency_key table, shared by every worker.
+
+    The primary key makes exactly one claim of a key succeed. Each call
+    runs in its own transaction on the default bind, so a claim is visible
+    to other workers at once and outlives the request's own rollback.
+    Duplicates poll for the owner's response. Expired rows are deleted by
+    the next claim. IDEMPOTENCY_MAX_KEYS does not apply here; the table
+    is bounded by the TTL and the request rate only.
+    """
+
+    poll_interval = 0.05
+
+    def __init__(self, ttl: float = 3600) -> None:
+        self.ttl = ttl
+
+    @staticmethod
+    @contextlib.contextmanager
+    def _begin() -> Iterator[Connection]:
+        # A batch pinned to the default bind already holds SQLite's write
+        # lock, so its claims go in a SAVEPOINT on its connection and commit
+        # or roll back with it.
+        session = db.session() if has_app_context() else None
+        if isinstance(session, ConnectionSession) and session.bind.engine is db.engine:
+            with session.bind.begin_nested():
+                yield session.bind
+        else:
+            with db.engine.begin() as connection:
+                yield connection
+
+    def claim(self, key: str, fingerprint: str) -> tuple[bool, str]:
+        now = utcnow()
+        try:
+            with self._begin() as connection:
+                connection.execute(delete(IdempotencyKey).where(IdempotencyKey.expires_at <= now))
+                connection.execute(insert(IdempotencyKey).values(
+                    key=key,
+                    fingerprint=fingerprint,
+                    expires_at=now + datetime.timedelta(seconds=self.ttl),
+                ))
+        except IntegrityError:
+            with self._begin() as connection:
+                stored = connection.scalar(
+                    select(IdempotencyKey.fingerprint).where(IdempotencyKey.key == key)
+                )
+            if stored is None:
+                # The owner released the key in between.
+                return self.claim(key, fingerprint)
+            return False, stored
+        return True, fingerprint
+
+    def wait(self, key: str, timeout: float) -> tuple[bool, StoredResponse | None]:
+        deadline = time.monotonic() + timeout
+        query = select(
+            IdempotencyKey.status, IdempotencyKey.body, IdempotencyKey.content_type
+        ).where(IdempotencyKey.key == key)
+        while True:
+            with self._begin() as connection:
+                row = connection.execute(query).one_or_none()
+            if row is None:
+                return True, None
+            if row.status is not None:
+                return True, (row.status, row.body, row.content_type)
+            if time.monotonic() >= deadline:
+                return False, None
+            time.sleep(self.poll_interval)
+
+    def complete(self, key: str, response: StoredResponse) -> None:
+        status, body, content_type = response
+        with self._begin() as connection:
+            connection.execute(
+                update(IdempotencyKey)
+                .where(IdempotencyKey.key == key)
+                .values(status=status, body=body, content_type=content_type)
+            )
+
+    def release(self, key: str) -> None:
+        with self._begin() as connection:
+            connection.execute(delete(IdempotencyKey).where(IdempotencyKey.key == key))
+
+    def clear(self) -> None:
+        with self._begin() as connection:
+            connection.execute(delete(IdempotencyKey))
+
+
+class IdempotencyStore:
+    """
+    First responses keyed by Idempotency-Key, in a configurable backend.
+
+    The first request with a key claims it and runs the view; duplicates
+    that arrive while it is in flight wait for its response instead of
+    running the view a second time. IDEMPOTENCY_BACKEND picks where claims
+    live: "database" shares them between workers, "memory" keeps them in
+    the worker. Inside ``deferred()`` responses are held until the caller
+    commits, so a batch that rolls back stores nothing.
+    """
+
+    def __init__(self, backend: IdempotencyBackend | None = None) -> None:
+        self.backend = backend or MemoryBackend()
+        self.wait_timeout = 10.0
+
+    def init_app(self, app: Flask) -> None:
+        name = app.config["IDEMPOTENCY_BACKEND"]
+        ttl = app.config["IDEMPOTENCY_KEY_TTL"].total_seconds()
+        if name == "memory":
+            self.backend = MemoryBackend(app.config["IDEMPOTENCY_MAX_KEYS"], ttl)
+        elif name == "database":
+            self.backend = DatabaseBackend(ttl)
+        else:
+            raise ValueError(f"Unknown IDEMPOTENCY_BACKEND {name!r}")
+        self.wait_timeout = app.config["IDEMPOTENCY_WAIT_TIMEOUT"].total_seconds()
+
+    def claim(self, key: str, fingerprint: str) -> tuple[bool, str]:
+        return self.backend.claim(key, fingerprint)
+
+    def wait(self, key: str) -> tuple[bool, StoredResponse | None]:
+        return self.backend.wait(key, self.wait_timeout)
+
+    def complete(self, key: str, response: StoredResponse) -> None:
+        if has_app_context() and "idempotency_deferred" in g:
+            g.idempotency_deferred[key] = response
+        else:
+            self.backend.complete(key, response)
+
+    def release(self, key: str) -> None:
+        """Forget a key whose request failed so that a retry can run."""
+        self.backend.release(key)
+
+    @staticmethod
+    def held(key: str) -> StoredResponse | None:
+        """The response completed for ``key`` earlier in the current ``deferred()`` block."""
+        return g.get("idempotency_deferred", {}).get(key) if has_app_context() else None
+
+    @contextlib.contextmanager
+    def deferred(self) -> Iterator[Callable[[], None]]:
+        """
+        Hold the responses completed in the block until the returned
+        function is called after the commit. Whatever is still held when
+        the block exits is released, so retries run the view again.
+        """
+        g.idempotency_deferred = pending = {}
+
+        def commit() -> None:
+            for key, response in pending.items():
+                self.backend.complete(key, response)
+            pending.clear()
+
+        try:
+            yield commit
+        finally:
+            g.pop("idempotency_deferred")
+            for key in pending:
+                self.release(key)
+
+    def clear(self) -> None:
+        self.backend.clear()
+
+
+store = IdempotencyStore()
+
+
+def _current_identity() -> str | None:
+    try:
+        return get_jwt_identity()
+    except RuntimeError:
+        return None
+
+
+def _replay(response: StoredResponse) -> Response:
+    status, body, content_type = response
+    replay = Response(body, status=status, content_type=content_type)
+    replay.headers["Idempotent-Replayed"] = "true"
+    return replay
+
+
+def idempotent(view: Callable) -> Callable:
+    """
+    Replay the first response for a repeated Idempotency-Key.
+
+    Keys are scoped to the endpoint and the JWT identity, so the decorator
+    goes below ``jwt_required`` on protected views. Reusing a key with a
+    different body is rejected. Responses with a 5xx status and views that
+    raise are not stored, so the client can retry them.
+    """
+
+    @functools.wraps(view)
+    def wrapper(*args, **kwargs):
+        idempotency_key = request.headers.get(HEADER)
+        if idempotency_key is None:
+            return view(*args, **kwargs)
+        if not idempotency_key or len(idempotency_key) > MAX_KEY_LENGTH:
+            raise BadRequest(description=f"{HEADER} must be 1-{MAX_KEY_LENGTH} characters")
+
+        scope = f"{request.endpoint}\0{_current_identity()}\0{idempotency_key}"
+        key = hashlib.sha256(scope.encode()).hexdigest()
+        fingerprint = hashlib.sha256(request.get_data()).hexdigest()
+
+        while True:
+            owner, stored_fingerprint = store.claim(key, fingerprint)
+            if owner:
+                break
+            if stored_fingerprint != fingerprint:
+                raise UnprocessableEntity(
+                    description=f"{HEADER} was already used with a different request"
+                )
+            # A duplicate within the same batch replays the held response.
+            held = store.held(key)
+            if held is not None:
+                return _replay(held)
+            finished, stored = store.wait(key)
+            if not finished:
+                raise Conflict(description="A request with this key is still in progress")
+            if stored is not None:
+                return _replay(stored)
+
+        try:
+            response = make_response(view(*args, **kwargs))
+        except BaseException:
+            # The view's unfinished writes would block the release on SQLite.
+            db.session.rollback()
+            store.release(key)
+            raise
+
+        if response.status_code >= 500:
+            db.session.rollback()
+            store.release(key)
+        else:
+            store.complete(
+                key,
+                (response.status_code, response.get_data(), response.content_type),
+            )
+        return response
+
+    return wrapper
@@ -0,0 +1,107 @@
+import threading
+
+from flask import Flask, current_app
+from sqlalchemy import event, func, insert, select, update
+from sqlalchemy.exc import IntegrityError
+
+from app.db import db, shard_keys, Category, Expenses, ExpensesArchive, IdBlock
+
+# Tables whose ids must not repeat across shards, with every table the
+# same ids may already be stored in.
+ID_TABLES = {
+    "category": (Category.__table__,),
+    "expenses": (Expenses.__table__, ExpensesArchive.__table__),
+}
+
+
+class IdAllocator:
+    """
+    Ids that are unique across every shard, for the tables in ID_TABLES.
+
+    Each shard's own autoincrement would hand out the same ids as the
+    others, which makes ids ambiguous and blocks moving users between
+    shards. With EXPENSE_SHARDS set, new rows instead get ids from the
+    id_block table on the default bind. A process reserves SHARD_ID_BLOCK_SIZE
+    ids at a time and hands them out from memory, so ids are unique but
+    only roughly ordered by creation. Without shards nothing changes.
+    """
+
+    def __init__(self, block_size: int = 100) -> None:
+        self.block_size = block_size
+        self._blocks: dict[tuple[str, str], range] = {}
+        self._lock = threading.Lock()
+
+    def init_app(self, app: Flask) -> None:
+        self.block_size = app.config["SHARD_ID_BLOCK_SIZE"]
+
+    @staticmethod
+    def enabled() -> bool:
+        return bool(current_app.config["EXPENSE_SHARDS"])
+
+    def next_ids(self, name: str, count: int) -> list[int]:
+        # Blocks are kept per database so that apps on other databases in
+        # the same process never share them.
+        key = (str(db.engine.url), name)
+        ids = []
+        with self._lock:
+            while len(ids) < count:
+                block = self._blocks.get(key) or self._reserve(
+                    name, max(self.block_size, count - len(ids))
+                )
+                taken = block[:count - len(ids)]
+                ids.extend(taken)
+                self._blocks[key] = block[len(taken):]
+        return ids
+
+    def assign(self, name: str, rows: list[dict]) -> list[dict]:
+        """Give ``rows`` for a Core insert into ``name`` their ids when sharded."""
+        if not self.enabled():
+            return rows
+        return [
+            {**row, "id": pk} for row, pk in zip(rows, self.next_ids(name, len(rows)))
+        ]
+
+    def _reserve(self, name: str, count: int) -> range:
+        # Its own transaction, so the ids stay taken if the caller rolls back.
+        with db.engine.begin() as connection:
+            end = connection.scalar(
+                update(IdBlock)
+                .where(IdBlock.name == name)
+                .values(next_id=IdBlock.next_id + count)
+                .returning(IdBlock.next_id)
+            )
+        if end is not None:
+            return range(end - count, end)
+
+        start = self._highest_id(name) + 1
+        try:
+            with db.engine.begin() as connection:
+                connection.execute(insert(IdBlock).values(name=name, next_id=start + count))
+        except IntegrityError:
+            # Another process created the row first.
+            return self._reserve(name, count)
+        return range(start, start + count)
+
+    @staticmethod
+    def _highest_id(name: str) -> int:
+        """Highest id already stored anywhere, for the first reservation."""
+        highest = 0
+        for key in {None, *shard_keys()}:
+            with db.engines[key].connect() as connection:
+                for table in ID_TABLES[name]:
+                    highest = max(highest, connection.scalar(select(func.max(table.c.id))) or 0)
+        return highest
+
+    def clear(self) -> None:
+        with self._lock:
+            self._blocks.clear()
+
+
+id_allocator = IdAllocator()
+
+
+@event.listens_for(Category, "before_insert")
+@event.listens_for(Expenses, "before_insert")
+def _assign_id(mapper, connection, target) -> None:
+    if target.id is None and id_allocator.enabled():
+        target.id = id_allocator.next_ids(mapper.local_table.name, 1)[0]
@@ -1,8 +1,207 @@
+import datetime
+import hashlib
+import heapq
+import math
+import threading
+import time
+from collections import OrderedDict
+
+from flask import Flask, current_app
 from flask_jwt_extended import JWTManager
+from sqlalchemy import delete, select
+
+from app.db import db, select_shard, User, RevokedToken
+from app.tracing import span
+
+
+class DecodedTokenCache:
+    """
+    Bounded LRU of verified claims, keyed by a digest of the encoded token.
+
+    A hit is only returned while the token's ``exp`` (plus the decode
+    leeway) is in the future; past that the entry is dropped and the full
+    decode raises the usual expiry error. Revocation is unaffected: the
+    blocklist check runs on the claims after decoding, cached or not.
+    """
+
+    def __init__(self, max_entries: int = 10_000) -> None:
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._entries: OrderedDict[bytes, tuple[dict, float]] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    @staticmethod
+    def _key(encoded_token: str) -> bytes:
+        return hashlib.blake2b(encoded_token.encode(), digest_size=16).digest()
+
+    def get(self, encoded_token: str) -> dict | None:
+        key = self._key(encoded_token)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            claims, valid_until = entry
+            if valid_until < time.time():
+                del self._entries[key]
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+        # Callers may add to the claims they get; keep the cached copy intact.
+        return dict(claims)
+
+    def add(self, encoded_token: str, claims: dict, leeway: float) -> None:
+        if not self.max_entries:
+            return
+        valid_until = claims["exp"] + leeway if "exp" in claims else math.inf
+        with self._lock:
+            self._entries[self._key(encoded_token)] = (dict(claims), valid_until)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self.hits = self.misses = 0
+
+    def metrics(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+        }
+
+
+token_cache = DecodedTokenCache()
+
+
+class TracedJWTManager(JWTManager):
+    """
+    JWTManager that reports token encoding and decoding as trace spans.
+
+    Verified claims are kept in ``token_cache``, so a client repeating the
+    same access token skips signature verification and claims parsing.
+    """
+
+    def init_app(self, app: Flask, add_context_processor: bool = False) -> None:
+        super().init_app(app, add_context_processor)
+        # Claims verified under another app's secret must not be reused.
+        token_cache.clear()
+        token_cache.max_entries = app.config["JWT_DECODE_CACHE_SIZE"]
+
+    def _encode_jwt_from_config(self, *args, **kwargs) -> str:
+        with span("jwt.encode"):
+            return super()._encode_jwt_from_config(*args, **kwargs)
+
+    def _decode_jwt_from_config(
+        self, encoded_token: str, csrf_value=None, allow_expired: bool = False
+    ) -> dict:
+        # Cookie tokens are checked against their CSRF value on every request.
+        cacheable = csrf_value is None and not allow_expired
+        if cacheable:
+            claims = token_cache.get(encoded_token)
+            if claims is not None:
+                return claims
+
+        with span("jwt.decode"):
+            claims = super()._decode_jwt_from_config(encoded_token, csrf_value, allow_expired)
+        if cacheable:
+            token_cache.add(encoded_token, claims, current_app.config["JWT_DECODE_LEEWAY"])
+        return claims
+
 
-from app.db import db, User
+jwt = TracedJWTManager()
 
-jwt = JWTManager()
+
+class TokenBlocklist:
+    """
+    Expiry-aware set of revoked token ids (``jti``).
+
+    Membership is a dict lookup. Entries are dropped once the token they
+    revoke has expired, so the set only ever holds live revocations.
+    """
+
+    def __init__(self) -> None:
+        self._expires: dict[str, float] = {}
+        self._heap: list[tuple[float, str]] = []
+        self._lock = threading.Lock()
+        self.synced_at = 0.0
+
+    def __contains__(self, jti: str) -> bool:
+        if self._heap and self._heap[0][0] <= time.time():
+            self.prune()
+        return jti in self._expires
+
+    def __len__(self) -> int:
+        return len(self._expires)
+
+    def add(self, jti: str, expires_at: float) -> None:
+        with self._lock:
+            if jti not in self._expires:
+                self._expires[jti] = expires_at
+                heapq.heappush(self._heap, (expires_at, jti))
+
+    def prune(self) -> None:
+        now = time.time()
+        with self._lock:
+            while self._heap and self._heap[0][0] <= now:
+                _, jti = heapq.heappop(self._heap)
+                self._expires.pop(jti, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._expires.clear()
+            self._heap.clear()
+            self.synced_at = 0.0
+
+
+blocklist = TokenBlocklist()
+
+
+def _to_naive_utc(timestamp: float) -> datetime.datetime:
+    return datetime.datetime.fromtimestamp(timestamp, datetime.timezone.utc).replace(tzinfo=None)
+
+
+def sync_blocklist() -> None:
+    """
+    Load revocations persisted by other workers into the in-memory set.
+
+    Runs at most once per JWT_BLOCKLIST_SYNC_INTERVAL, so token checks
+    don't query the database on every request.
+    """
+    if not current_app.config["JWT_BLOCKLIST_PERSIST"]:
+        return
+
+    interval = current_app.config["JWT_BLOCKLIST_SYNC_INTERVAL"].total_seconds()
+    now = time.time()
+    if now - blocklist.synced_at < interval:
+        return
+    blocklist.synced_at = now
+
+    rows = db.session.execute(
+        select(RevokedToken.jti, RevokedToken.expires_at)
+        .where(RevokedToken.expires_at > _to_naive_utc(now))
+    )
+    for jti, expires_at in rows:
+        blocklist.add(jti, expires_at.replace(tzinfo=datetime.timezone.utc).timestamp())
+
+
+def revoke_token(jwt_payload: dict) -> None:
+    jti, expires_at = jwt_payload["jti"], jwt_payload["exp"]
+    blocklist.add(jti, expires_at)
+
+    if current_app.config["JWT_BLOCKLIST_PERSIST"]:
+        now = _to_naive_utc(time.time())
+        db.session.execute(delete(RevokedToken).where(RevokedToken.expires_at <= now))
+        db.session.add(RevokedToken(jti=jti, expires_at=_to_naive_utc(expires_at)))
+        db.session.commit()
 
 
 @jwt.user_identity_loader
@@ -13,4 +212,16 @@ def user_identity_lookup(user_id: int) -> str:
 @jwt.user_lookup_loader
 def user_lookup_callback(_jwt_header: dict, jwt_data: dict) -> User | None:
     identity = jwt_data.get("sub")
-    return db.session.query(User).filter(User.id == identity).one_or_none()
+    with span("jwt.user_lookup"):
+        user = db.session.query(User).filter(User.id == identity).one_or_none()
+    if user is not None:
+        # Everything an authenticated request reads or writes is the user's own.
+        select_shard(user.id)
+    return user
+
+
+@jwt.token_in_blocklist_loader
+def check_if_token_revoked(_jwt_header: dict, jwt_data: dict) -> bool:
+    with span("jwt.blocklist"):
+        sync_blocklist()
+        return jwt_data["jti"] in blocklist
@@ -0,0 +1,42 @@
+import logging
+import logging.handlers
+
+from app.gevent_compat import original
+
+
+def native_queue():
+    """Queue that a native thread can block on without blocking the gevent hub."""
+    return original("queue", "SimpleQueue")()
+
+
+class DroppingQueueHandler(logging.handlers.QueueHandler):
+    """Drop records instead of blocking when the listener falls behind."""
+
+    def __init__(self, log_queue, max_size: int) -> None:
+        super().__init__(log_queue)
+        self.max_size = max_size
+        self.dropped = 0
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        if self.queue.qsize() >= self.max_size:
+            self.dropped += 1
+            return
+        self.queue.put_nowait(record)
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # Formatting happens on the listener thread; the record is not shared.
+        return record
+
+
+class NativeQueueListener(logging.handlers.QueueListener):
+    """Listener on a real OS thread, so slow output never blocks the hub."""
+
+    def __init__(self, log_queue, *handlers: logging.Handler, name: str) -> None:
+        super().__init__(log_queue, *handlers)
+        self.name = name
+
+    def start(self) -> None:
+        self._thread = original("threading", "Thread")(
+            target=self._monitor, name=self.name, daemon=True
+        )
+        self._thread.start()
@@ -0,0 +1,30 @@
+from typing import Callable
+
+from flask import blueprints, jsonify, Response
+
+bp = blueprints.Blueprint("metrics", __name__)
+
+_providers: dict[str, Callable[[], dict]] = {}
+
+
+def register(name: str, provider: Callable[[], dict]) -> None:
+    """Publish the counters returned by ``provider`` under ``name``."""
+    _providers[name] = provider
+
+
+@bp.route("/metrics", methods=["GET"])
+def get_metrics() -> (Response, int):
+    """
+    Get worker metrics
+    Counters are kept in memory, so each worker reports its own
+
+    ---
+    tags:
+      - metrics
+    responses:
+      200:
+        description: Counters grouped by component
+        schema:
+          $ref: "#definitions/Metrics"
+    """
+    return jsonify({name: provider() for name, provider in _providers.items()}), 200
@@ -0,0 +1,185 @@
+import cProfile
+import datetime
+import hmac
+import json
+import marshal
+import os
+import sys
+import time
+
+from flask import Flask, Response, g, request
+
+from app.gevent_compat import original
+
+FORMATS = {"pstats": ".prof", "speedscope": ".speedscope.json"}
+
+
+class StackSampler:
+    """
+    Sampling profiler for one thread, recording stacks on a real OS thread.
+
+    Under gevent the sampled thread is the hub's, so samples also catch
+    whatever other greenlets run while the request waits.
+    """
+
+    def __init__(self, thread_id: int, interval: float) -> None:
+        self.thread_id = thread_id
+        self.interval = interval
+        self.frames: dict[tuple, int] = {}
+        self.samples: list[list[int]] = []
+        self.weights: list[float] = []
+        self._running = False
+        self._thread = None
+
+    def start(self) -> None:
+        self._running = True
+        self._thread = original("threading", "Thread")(target=self._run, daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._running = False
+        self._thread.join()
+
+    def _frame_index(self, code) -> int:
+        key = (code.co_name, code.co_filename, code.co_firstlineno)
+        return self.frames.setdefault(key, len(self.frames))
+
+    def _run(self) -> None:
+        last = time.perf_counter()
+        while self._running:
+            original("time", "sleep")(self.interval)
+            frame = sys._current_frames().get(self.thread_id)
+            now = time.perf_counter()
+            stack = []
+            while frame is not None:
+                stack.append(self._frame_index(frame.f_code))
+                frame = frame.f_back
+            if stack:
+                self.samples.append(stack[::-1])
+                self.weights.append(now - last)
+            last = now
+
+    def speedscope(self, name: str) -> dict:
+        return {
+            "$schema": "https://www.speedscope.app/file-format-schema.json",
+            "name": name,
+            "exporter": "expenses-api",
+            "shared": {"frames": [
+                {"name": fn, "file": file, "line": line}
+                for fn, file, line in self.frames
+            ]},
+            "profiles": [{
+                "type": "sampled",
+                "name": name,
+                "unit": "seconds",
+                "startValue": 0,
+                "endValue": sum(self.weights),
+                "samples": self.samples,
+                "weights": self.weights,
+            }],
+        }
+
+
+class RequestProfiler:
+    """
+    Profile single requests on demand.
+
+    A request with ``X-Profile: pstats`` runs under cProfile, one with
+    ``X-Profile: speedscope`` under the stack sampler. Profiling is only
+    honoured when PROFILER_ENABLED is set (development) or the request
+    carries PROFILER_SECRET in ``X-Profile-Secret``; otherwise the header
+    is ignored. The profile replaces the response body, or is written to
+    PROFILER_DIR when that is set.
+    """
+
+    def __init__(self) -> None:
+        self.enabled = False
+        self.secret: str | None = None
+        self.directory: str | None = None
+        self.interval = 0.001
+
+    def init_app(self, app: Flask) -> None:
+        self.enabled = app.config["PROFILER_ENABLED"]
+        self.secret = app.config["PROFILER_SECRET"]
+        self.directory = app.config["PROFILER_DIR"]
+        self.interval = app.config["PROFILER_SAMPLE_INTERVAL"]
+        if not (self.enabled or self.secret):
+            return
+
+        app.before_request(self._start)
+        app.after_request(self._finish)
+        app.teardown_request(self._abort)
+
+    def _allowed(self) -> bool:
+        if self.enabled:
+            return True
+        supplied = request.headers.get("X-Profile-Secret", "")
+        return bool(self.secret) and hmac.compare_digest(supplied, self.secret)
+
+    def _start(self) -> None:
+        # Batch sub-requests share g and are already covered by the batch's profile.
+        if g.get("profiler") is not None:
+            return
+        fmt = request.headers.get("X-Profile")
+        if fmt not in FORMATS or not self._allowed():
+            return
+
+        if fmt == "pstats":
+            profiler = cProfile.Profile()
+            try:
+                profiler.enable()
+            except ValueError:
+                # Python 3.12+ allows one cProfile per process at a time.
+                return
+        else:
+            profiler = StackSampler(original("threading", "get_ident")(), self.interval)
+            profiler.start()
+        g.profiler = (fmt, profiler, request._get_current_object())
+
+    def _stop(self):
+        fmt, profiler, _ = g.profiler
+        g.profiler = None
+        if fmt == "pstats":
+            profiler.disable()
+            profiler.create_stats()
+            return marshal.dumps(profiler.stats)
+        profiler.stop()
+        name = f"{request.method} {request.path}"
+        return json.dumps(profiler.speedscope(name)).encode()
+
+    def _finish(self, response: Response) -> Response:
+        if g.get("profiler") is None or g.profiler[2] is not request._get_current_object():
+            return response
+
+        fmt = g.profiler[0]
+        data = self._stop()
+        filename = "{}-{}{}".format(
+            datetime.datetime.now().strftime("%Y%m%dT%H%M%S%f"),
+            (request.endpoint or "unknown").replace(".", "_"),
+            FORMATS[fmt],
+        )
+
+        if self.directory:
+            os.makedirs(self.directory, exist_ok=True)
+            with open(os.path.join(self.directory, filename), "wb") as f:
+                f.write(data)
+            response.headers["X-Profile-File"] = filename
+            return response
+
+        profile = Response(
+            data,
+            mimetype="application/json" if fmt == "speedscope" else "application/octet-stream",
+            headers={
+                "Content-Disposition": f"attachment; filename={filename}",
+                "X-Profiled-Status": str(response.status_code),
+            },
+        )
+        return profile
+
+    def _abort(self, exc: BaseException | None) -> None:
+        # A request that raised skips after_request; don't leave it profiling.
+        if g.get("profiler") is not None and g.profiler[2] is request._get_current_object():
+            self._stop()
+
+
+profiler = RequestProfiler()
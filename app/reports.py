@@ -0,0 +1,389 @@
+import csv
+import datetime
+import json
+import logging
+import multiprocessing
+import os
+import time
+from concurrent.futures import FIRST_COMPLETED, Executor, Future, ProcessPoolExecutor, wait
+from typing import Callable, TextIO
+
+import click
+from flask import Blueprint, Response, current_app, jsonify, request, send_file, url_for
+from flask.cli import AppGroup
+from flask_jwt_extended import current_user, jwt_required
+from sqlalchemy import Select, and_, func, or_, select, union_all, update
+from werkzeug.exceptions import Forbidden, NotFound
+
+from app.db import (
+    db, use_shard, user_shard, utcnow, Category, Expenses, ExpensesArchive, ReportJob,
+)
+from app.schemas import report_request_schema, report_job_schema
+
+logger = logging.getLogger(__name__)
+
+bp = Blueprint("reports", __name__, url_prefix="/reports")
+reports_cli = AppGroup("reports", help="Build the reports queued through POST /reports.")
+
+# Settings a pool process needs to open the same databases as its parent.
+PROCESS_CONFIG_KEYS = ("SQLALCHEMY_DATABASE_URI", "EXPENSE_SHARDS", "REPORTS_DIR", "REPORT_CHUNK_SIZE")
+
+REPORT_COLUMNS = ("id", "spent_at", "title", "amount", "category")
+
+
+def reports_dir() -> str:
+    return current_app.config["REPORTS_DIR"] or os.path.join(current_app.instance_path, "reports")
+
+
+def report_path(job: ReportJob) -> str:
+    return os.path.join(reports_dir(), f"{job.id}.{job.format}")
+
+
+class _CsvWriter:
+    def __init__(self, f: TextIO) -> None:
+        self._writer = csv.writer(f)
+        self._writer.writerow(REPORT_COLUMNS)
+
+    def write(self, rows: list) -> None:
+        self._writer.writerows(
+            (row.id, row.spent_at.isoformat(), row.title, row.amount, row.category or "")
+            for row in rows
+        )
+
+    def close(self) -> None:
+        pass
+
+
+class _JsonWriter:
+    """Writes one JSON array without holding the rows in memory."""
+
+    def __init__(self, f: TextIO) -> None:
+        self._f = f
+        self._first = True
+        f.write("[")
+
+    def write(self, rows: list) -> None:
+        for row in rows:
+            self._f.write("\n" if self._first else ",\n")
+            self._first = False
+            self._f.write(json.dumps({
+                "id": row.id,
+                "spent_at": row.spent_at.isoformat(),
+                "title": row.title,
+                "amount": float(row.amount),
+                "category": row.category,
+            }))
+
+    def close(self) -> None:
+        self._f.write("\n]\n")
+
+
+WRITERS: dict[str, Callable[[TextIO], _CsvWriter | _JsonWriter]] = {
+    "csv": _CsvWriter,
+    "json": _JsonWriter,
+}
+
+
+def _report_page(job: ReportJob, after, limit: int) -> Select:
+    """
+    The next ``limit`` rows of a job's year after the keyset ``after``.
+
+    Archived expenses belong to the year as much as hot ones, so both
+    tables are read; each side is paged over its own (user_id, spent_at)
+    index before the two pages are merged.
+    """
+    start = datetime.datetime(job.year, 1, 1)
+
+    def year_rows(model):
+        query = (
+            select(
+                model.id, model.spent_at, model.title, model.amount,
+                Category.name.label("category"),
+            )
+            .outerjoin(Category, model.category_id == Category.id)
+            .where(
+                model.user_id == job.user_id,
+                model.spent_at >= start,
+                model.spent_at < start.replace(year=job.year + 1),
+            )
+        )
+        if after is not None:
+            query = query.where(or_(
+                model.spent_at > after.spent_at,
+                and_(model.spent_at == after.spent_at, model.id > after.id),
+            ))
+        return select(query.order_by(model.spent_at, model.id).limit(limit).subquery())
+
+    both = union_all(year_rows(Expenses), year_rows(ExpensesArchive)).subquery()
+    return select(both).order_by(both.c.spent_at, both.c.id).limit(limit)
+
+
+def _set_progress(job_id: int, **values) -> None:
+    db.session.execute(update(ReportJob).where(ReportJob.id == job_id).values(**values))
+    db.session.commit()
+
+
+def build_report(job_id: int) -> None:
+    """
+    Write a job's report file, recording progress after every chunk.
+
+    Rows are read in (spent_at, id) keyset pages over the hot and archive
+    tables' (user_id, spent_at) indexes, so no cursor stays open across
+    the progress commits. The file is written under a temporary name and
+    renamed when complete.
+    """
+    job = db.session.get(ReportJob, job_id)
+    path = report_path(job)
+    partial = path + ".part"
+    chunk_size = current_app.config["REPORT_CHUNK_SIZE"]
+
+    try:
+        with use_shard(user_shard(job.user_id)):
+            total = db.session.scalar(
+                select(func.count()).select_from(_report_page(job, None, None).subquery())
+            )
+            _set_progress(job_id, rows_total=total)
+
+            os.makedirs(reports_dir(), exist_ok=True)
+            done, last = 0, None
+            with open(partial, "w", newline="") as f:
+                writer = WRITERS[job.format](f)
+                while True:
+                    rows = db.session.execute(_report_page(job, last, chunk_size)).all()
+                    if not rows:
+                        break
+                    writer.write(rows)
+                    done += len(rows)
+                    last = rows[-1]
+                    _set_progress(job_id, rows_done=done)
+                writer.close()
+        os.replace(partial, path)
+    except Exception as e:
+        db.session.rollback()
+        if os.path.exists(partial):
+            os.remove(partial)
+        logger.exception("Report job %s failed", job_id)
+        _set_progress(job_id, status="failed", error=str(e)[:200], finished_at=utcnow())
+        return
+
+    _set_progress(job_id, status="done", finished_at=utcnow())
+
+
+def claim_job() -> int | None:
+    """Mark the oldest queued job as running and return its id."""
+    while True:
+        job_id = db.session.scalar(
+            select(ReportJob.id)
+            .where(ReportJob.status == "queued")
+            .order_by(ReportJob.id)
+            .limit(1)
+        )
+        if job_id is None:
+            return None
+        # Another runner may claim the same job; only one UPDATE matches.
+        result = db.session.execute(
+            update(ReportJob)
+            .where(ReportJob.id == job_id, ReportJob.status == "queued")
+            .values(status="running")
+        )
+        db.session.commit()
+        if result.rowcount == 1:
+            return job_id
+
+
+def requeue_interrupted() -> int:
+    """Queue again the jobs a stopped runner left running."""
+    result = db.session.execute(
+        update(ReportJob)
+        .where(ReportJob.status == "running")
+        .values(status="queued", rows_done=0, rows_total=None)
+    )
+    db.session.commit()
+    return result.rowcount
+
+
+def _init_process(config: dict) -> None:
+    from app import create_app
+
+    app = create_app(config)
+    app.app_context().push()
+
+
+def _run_in_process(job_id: int) -> None:
+    try:
+        build_report(job_id)
+    finally:
+        db.session.remove()
+
+
+def process_pool(processes: int) -> ProcessPoolExecutor:
+    """
+    Pool of report processes, each with its own app and connections.
+
+    Processes are spawned rather than forked, so they share no database
+    connections or gevent state with the process that starts them.
+    """
+    config = {key: current_app.config[key] for key in PROCESS_CONFIG_KEYS}
+    return ProcessPoolExecutor(
+        processes,
+        mp_context=multiprocessing.get_context("spawn"),
+        initializer=_init_process,
+        initargs=(config,),
+    )
+
+
+def serve(pool: Executor, processes: int, poll_interval: float, until_idle: bool = False) -> int:
+    """
+    Claim queued jobs and run them on ``pool``, at most ``processes`` at a time.
+
+    Runs forever unless ``until_idle`` is set, in which case it returns once
+    no job is queued or running. Returns the number of jobs run.
+    """
+    running: set[Future] = set()
+    finished = 0
+    while True:
+        while len(running) < processes and (job_id := claim_job()) is not None:
+            running.add(pool.submit(_run_in_process, job_id))
+
+        if not running:
+            if until_idle:
+                return finished
+            time.sleep(poll_interval)
+            continue
+
+        done, running = wait(running, timeout=poll_interval, return_when=FIRST_COMPLETED)
+        for future in done:
+            finished += 1
+            if future.exception() is not None:
+                logger.error("Report process failed", exc_info=future.exception())
+
+
+@reports_cli.command("worker")
+@click.option("--processes", type=int, default=None, help="Defaults to REPORT_PROCESSES.")
+def worker_command(processes: int | None) -> None:
+    """Build queued reports until stopped. Run one per deployment."""
+    processes = processes or current_app.config["REPORT_PROCESSES"]
+    requeued = requeue_interrupted()
+    if requeued:
+        click.echo(f"Requeued {requeued} interrupted jobs")
+    poll_interval = current_app.config["REPORT_POLL_INTERVAL"].total_seconds()
+    with process_pool(processes) as pool:
+        serve(pool, processes, poll_interval)
+
+
+def _owned_job(pk: int) -> ReportJob:
+    job = db.session.get(ReportJob, pk)
+    if job is None:
+        raise NotFound(description="Report not found")
+    if job.user_id != current_user.id:
+        raise Forbidden(description="You are not authorized to view this report")
+    return job
+
+
+def _job_body(job: ReportJob) -> dict:
+    data = report_job_schema.dump(job)
+    if job.rows_total:
+        data["progress"] = round(job.rows_done / job.rows_total, 4)
+    else:
+        data["progress"] = 1.0 if job.status == "done" else 0.0
+    data["download_url"] = (
+        url_for("reports.download_report", pk=job.id) if job.status == "done" else None
+    )
+    return data
+
+
+@bp.route("", methods=["POST"])
+@jwt_required()
+def create_report() -> (Response, int):
+    """
+    Queue a report
+    Build a CSV or JSON file of a year of expenses in the background
+
+    ---
+    security:
+      - BearerAuth: []
+    tags:
+      - reports
+    parameters:
+      - in: body
+        name: Report
+        required: true
+        schema:
+          $ref: "#definitions/ReportIn"
+    responses:
+      202:
+        description: Queued, poll the Location header for progress
+        schema:
+          $ref: "#definitions/ReportJob"
+    """
+    data = report_request_schema.load(request.json)
+
+    job = ReportJob(user_id=current_user.id, **data)
+    db.session.add(job)
+    db.session.commit()
+
+    location = url_for("reports.get_report", pk=job.id)
+    return jsonify(_job_body(job)), 202, {"Location": location}
+
+
+@bp.route("/<int:pk>", methods=["GET"])
+@jwt_required()
+def get_report(pk: int) -> (Response, int):
+    """
+    Get a report job
+    Return the status and progress of a report, with a download link when done
+
+    ---
+    security:
+      - BearerAuth: []
+    tags:
+      - reports
+    parameters:
+      - in: path
+        name: pk
+        type: integer
+        required: true
+    responses:
+      200:
+        description: Report job
+        schema:
+          $ref: "#definitions/ReportJob"
+      404:
+        schema:
+          $ref: "#definitions/NotFound"
+    """
+    return jsonify(_job_body(_owned_job(pk))), 200
+
+
+@bp.route("/<int:pk>/file", methods=["GET"])
+@jwt_required()
+def download_report(pk: int) -> Response:
+    """
+    Download a report
+    Return the report file of a finished job
+
+    ---
+    security:
+      - BearerAuth: []
+    tags:
+      - reports
+    parameters:
+      - in: path
+        name: pk
+        type: integer
+        required: true
+    responses:
+      200:
+        description: The CSV or JSON file
+      404:
+        schema:
+          $ref: "#definitions/NotFound"
+    """
+    job = _owned_job(pk)
+    if job.status != "done":
+        raise NotFound(description="Report is not ready")
+    return send_file(
+        report_path(job),
+        as_attachment=True,
+        download_name=f"expenses-{job.year}.{job.format}",
+    )
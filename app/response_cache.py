@@ -0,0 +1,238 @@
+import contextlib
+import threading
+import time
+from collections import OrderedDict
+from typing import Iterable, Iterator, Protocol
+
+from flask import Flask, g
+
+
+class CacheBackend(Protocol):
+    """
+    Storage for cached responses with a generation per key.
+
+    ``invalidate`` drops a key's value and moves its generation on, and
+    ``set`` only stores a value if the key is still at the generation the
+    caller saw when its ``get`` missed. A response read from the database
+    before a concurrent write committed can then never be cached after
+    that write's invalidation.
+    """
+
+    def get(self, key: str) -> tuple[bytes | None, int]: ...
+
+    def set(self, key: str, value: bytes, ttl: float, generation: int) -> None: ...
+
+    def invalidate(self, *keys: str) -> None: ...
+
+    def clear(self) -> None: ...
+
+
+class MemoryBackend:
+    """LRU dict of serialized responses, private to the worker process."""
+
+    def __init__(self, max_entries: int = 10_000) -> None:
+        self.max_entries = max_entries
+        self._entries: OrderedDict[str, tuple[bytes, float]] = OrderedDict()
+        # Generations come from one counter. A key whose generation was
+        # evicted reports the highest evicted one, which is never lower.
+        self._generations: OrderedDict[str, int] = OrderedDict()
+        self._counter = 0
+        self._evicted_generation = 0
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def _generation(self, key: str) -> int:
+        return self._generations.get(key, self._evicted_generation)
+
+    def get(self, key: str) -> tuple[bytes | None, int]:
+        with self._lock:
+            generation = self._generation(key)
+            entry = self._entries.get(key)
+            if entry is None:
+                return None, generation
+            value, expires_at = entry
+            if expires_at <= time.time():
+                del self._entries[key]
+                return None, generation
+            self._entries.move_to_end(key)
+            return value, generation
+
+    def set(self, key: str, value: bytes, ttl: float, generation: int) -> None:
+        with self._lock:
+            if self._generation(key) != generation:
+                return
+            self._entries[key] = (value, time.time() + ttl)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, *keys: str) -> None:
+        with self._lock:
+            for key in keys:
+                self._entries.pop(key, None)
+                self._counter += 1
+                self._generations[key] = self._counter
+                self._generations.move_to_end(key)
+            while len(self._generations) > self.max_entries:
+                _, evicted = self._generations.popitem(last=False)
+                self._evicted_generation = max(self._evicted_generation, evicted)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            # Keep the generations so that reads in flight can't fill the cache.
+            self._evicted_generation = self._counter = self._counter + 1
+            self._generations.clear()
+
+
+# Stores the value only if the generation key still holds the generation
+# the reader saw; a missing generation key counts as 0.
+_SET_IF_CURRENT = """
+if (redis.call('get', KEYS[2]) or '0') == ARGV[2] then
+    redis.call('set', KEYS[1], ARGV[1], 'PX', ARGV[3])
+end
+"""
+
+
+class RedisBackend:
+    """
+    Responses stored in Redis, shared by every worker that uses the same URL.
+
+    Redis does the eviction, so configure it with an LRU ``maxmemory-policy``.
+    Generations are taken from one shared counter and expire after
+    ``generation_ttl`` seconds, far longer than any read they guard.
+    """
+
+    prefix = "expenses:response:"
+
+    def __init__(self, url: str, generation_ttl: float = 3600) -> None:
+        try:
+            import redis
+        except ImportError as e:
+            raise RuntimeError("RESPONSE_CACHE_BACKEND=redis needs the redis package") from e
+        self._client = redis.Redis.from_url(url)
+        self._set_if_current = self._client.register_script(_SET_IF_CURRENT)
+        self.generation_ttl = generation_ttl
+
+    def _generation_key(self, key: str) -> str:
+        return f"{self.prefix}generation:{key}"
+
+    def get(self, key: str) -> tuple[bytes | None, int]:
+        value, generation = self._client.mget(self.prefix + key, self._generation_key(key))
+        return value, int(generation or 0)
+
+    def set(self, key: str, value: bytes, ttl: float, generation: int) -> None:
+        self._set_if_current(
+            keys=[self.prefix + key, self._generation_key(key)],
+            args=[value, str(generation), int(ttl * 1000)],
+        )
+
+    def invalidate(self, *keys: str) -> None:
+        if not keys:
+            return
+        counter = self._client.incrby(f"{self.prefix}generation", len(keys))
+        pipeline = self._client.pipeline(transaction=False)
+        pipeline.delete(*(self.prefix + key for key in keys))
+        for generation, key in enumerate(keys, start=counter - len(keys) + 1):
+            pipeline.set(self._generation_key(key), generation, px=int(self.generation_ttl * 1000))
+        pipeline.execute()
+
+    def clear(self) -> None:
+        keys = [
+            key for key in self._client.scan_iter(match=self.prefix + "*")
+            if not key.startswith(f"{self.prefix}generation".encode())
+        ]
+        if keys:
+            self._client.delete(*keys)
+
+
+class ResponseCache:
+    """
+    Cache of serialized single-expense responses keyed by owner and id.
+
+    Views invalidate an entry after committing a change to it, and a miss
+    hands back the key's generation for the ``set`` that follows, so a
+    response read before that commit is not stored after it. Inside
+    ``deferred()`` reads bypass the cache and invalidations are repeated
+    when the block exits, so a batch that later rolls back can't leave its
+    uncommitted rows behind. Hit and miss counters are kept per worker.
+    """
+
+    def __init__(self, backend: CacheBackend | None = None, ttl: float = 60) -> None:
+        self.backend = backend
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    def init_app(self, app: Flask) -> None:
+        name = app.config["RESPONSE_CACHE_BACKEND"]
+        if name == "memory":
+            self.backend = MemoryBackend(app.config["RESPONSE_CACHE_MAX_ENTRIES"])
+        elif name == "redis":
+            self.backend = RedisBackend(app.config["RESPONSE_CACHE_REDIS_URL"])
+        elif name == "none":
+            self.backend = None
+        else:
+            raise ValueError(f"Unknown RESPONSE_CACHE_BACKEND {name!r}")
+        self.ttl = app.config["RESPONSE_CACHE_TTL"].total_seconds()
+        self.hits = self.misses = self.invalidations = 0
+
+    @staticmethod
+    def _key(user_id: int, pk: int) -> str:
+        return f"{user_id}:{pk}"
+
+    def _bypassed(self) -> bool:
+        return self.backend is None or "response_cache_deferred" in g
+
+    def get(self, user_id: int, pk: int) -> tuple[bytes | None, int]:
+        """Return the cached value, or None, and the generation to pass to ``set``."""
+        if self._bypassed():
+            return None, 0
+        value, generation = self.backend.get(self._key(user_id, pk))
+        if value is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return value, generation
+
+    def set(self, user_id: int, pk: int, value: bytes, generation: int) -> None:
+        if not self._bypassed():
+            self.backend.set(self._key(user_id, pk), value, self.ttl, generation)
+
+    def invalidate(self, user_id: int, pks: Iterable[int]) -> None:
+        if self.backend is None:
+            return
+        keys = [self._key(user_id, pk) for pk in pks]
+        self.backend.invalidate(*keys)
+        self.invalidations += len(keys)
+        if "response_cache_deferred" in g:
+            g.response_cache_deferred.extend(keys)
+
+    @contextlib.contextmanager
+    def deferred(self) -> Iterator[None]:
+        g.response_cache_deferred = keys = []
+        try:
+            yield
+        finally:
+            g.pop("response_cache_deferred")
+            if self.backend is not None and keys:
+                self.backend.invalidate(*keys)
+
+    def clear(self) -> None:
+        if self.backend is not None:
+            self.backend.clear()
+
+    def metrics(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "invalidations": self.invalidations,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+        }
+
+
+response_cache = ResponseCache()
@@ -1,11 +1,25 @@
+import datetime
+
 from marshmallow import Schema, fields, validate, validates, ValidationError
 from app.db import db, User
 
 
+class NaiveUTCDateTime(fields.DateTime):
+    """ISO 8601 datetime stored as naive UTC, like ``Expenses.spent_at``."""
+
+    def _deserialize(self, value, attr, data, **kwargs) -> datetime.datetime:
+        result = super()._deserialize(value, attr, data, **kwargs)
+        if result.tzinfo is not None:
+            result = result.astimezone(datetime.timezone.utc).replace(tzinfo=None)
+        return result
+
+
 class ExpenseSchema(Schema):
     id = fields.Integer(dump_only=True)
     title = fields.Str(required=True, validate=validate.Length(min=1, max=50))
     amount = fields.Float(required=True, validate=validate.Range(min=0))
+    spent_at = NaiveUTCDateTime()
+    category_id = fields.Integer(allow_none=True)
 
 
 class ExpenseOutSchema(ExpenseSchema):
@@ -18,6 +32,124 @@ expenses_out_schema = ExpenseOutSchema(many=True)
 expense_update_schema = ExpenseSchema(partial=True)
 
 
+def dump_expense_rows(rows) -> list[dict]:
+    """
+    ``expenses_out_schema.dump`` for rows of ``expense_row_columns()``.
+
+    List endpoints can return thousands of rows, and building the dicts
+    directly skips marshmallow's per-field dispatch. Keep it in step with
+    ExpenseOutSchema.
+    """
+    return [
+        {
+            "id": id_,
+            "title": title,
+            "amount": float(amount),
+            "spent_at": spent_at.isoformat(),
+            "category_id": category_id,
+            "user_id": user_id,
+        }
+        for id_, title, amount, spent_at, category_id, user_id in rows
+    ]
+
+
+class ExpenseTotalsSchema(Schema):
+    count = fields.Integer(dump_only=True)
+    total = fields.Float(dump_only=True)
+    min = fields.Float(dump_only=True, attribute="min_amount")
+    max = fields.Float(dump_only=True, attribute="max_amount")
+
+
+expense_totals_schema = ExpenseTotalsSchema()
+
+
+EXPENSE_SORTS = ("id", "amount", "-amount")
+
+
+class SpentAtRangeSchema(Schema):
+    spent_from = NaiveUTCDateTime(data_key="from")
+    spent_to = NaiveUTCDateTime(data_key="to")
+
+
+class ExpenseFilterSchema(SpentAtRangeSchema):
+    amount_min = fields.Float(validate=validate.Range(min=0))
+    amount_max = fields.Float(validate=validate.Range(min=0))
+    title_prefix = fields.Str(validate=validate.Length(min=1, max=50))
+    sort = fields.Str(load_default="id", validate=validate.OneOf(EXPENSE_SORTS))
+    include_archived = fields.Boolean()
+
+
+class ExpenseRollupSchema(SpentAtRangeSchema):
+    bucket = fields.Str(
+        load_default="month", validate=validate.OneOf(["day", "week", "month"])
+    )
+
+
+class ExpenseRollupOutSchema(Schema):
+    bucket = fields.Str(dump_only=True)
+    count = fields.Integer(dump_only=True)
+    total = fields.Float(dump_only=True)
+
+
+class ExpenseStatsSchema(SpentAtRangeSchema):
+    bins = fields.Integer(load_default=10, validate=validate.Range(min=1, max=100))
+
+
+class PaginationSchema(Schema):
+    page = fields.Integer(load_default=1, validate=validate.Range(min=1))
+    per_page = fields.Integer(load_default=20, validate=validate.Range(min=1, max=100))
+
+
+class ExpenseSearchSchema(PaginationSchema):
+    q = fields.Str(required=True, validate=validate.Length(min=3, max=50))
+
+
+spent_at_range_schema = SpentAtRangeSchema()
+expense_filter_schema = ExpenseFilterSchema()
+expense_rollup_schema = ExpenseRollupSchema()
+expense_rollup_out_schema = ExpenseRollupOutSchema(many=True)
+expense_search_schema = ExpenseSearchSchema()
+expense_stats_schema = ExpenseStatsSchema()
+
+
+class ExpenseBreakdownSchema(Schema):
+    category_id = fields.Integer(dump_only=True)
+    category = fields.Str(dump_only=True)
+    count = fields.Integer(dump_only=True)
+    total = fields.Float(dump_only=True)
+
+
+expense_breakdown_schema = ExpenseBreakdownSchema(many=True)
+
+
+class CategorySchema(Schema):
+    id = fields.Integer(dump_only=True)
+    name = fields.Str(required=True, validate=validate.Length(min=1, max=30))
+
+
+category_schema = CategorySchema()
+categories_schema = CategorySchema(many=True)
+
+
+class BatchRequestSchema(Schema):
+    method = fields.Str(
+        required=True, validate=validate.OneOf(["GET", "POST", "PATCH", "DELETE"])
+    )
+    path = fields.Str(required=True, validate=validate.Length(min=1))
+    body = fields.Raw(load_default=None, allow_none=True)
+    headers = fields.Dict(keys=fields.Str(), values=fields.Str(), load_default=dict)
+
+
+class BatchSchema(Schema):
+    requests = fields.List(
+        fields.Nested(BatchRequestSchema), required=True, validate=validate.Length(min=1)
+    )
+    atomic = fields.Boolean(load_default=False)
+
+
+batch_schema = BatchSchema()
+
+
 class UserSchemaLogin(Schema):
     id = fields.Integer(dump_only=True)
     username = fields.Str(required=True, validate=validate.Length(min=4, max=20))
@@ -35,3 +167,24 @@ class UserSchema(UserSchemaLogin):
 
 user_schema = UserSchema()
 user_schema_login = UserSchemaLogin()
+
+
+class ReportRequestSchema(Schema):
+    year = fields.Integer(required=True, validate=validate.Range(min=1970, max=9998))
+    format = fields.Str(load_default="csv", validate=validate.OneOf(["csv", "json"]))
+
+
+class ReportJobSchema(Schema):
+    id = fields.Integer(dump_only=True)
+    year = fields.Integer(dump_only=True)
+    format = fields.Str(dump_only=True)
+    status = fields.Str(dump_only=True)
+    rows_done = fields.Integer(dump_only=True)
+    rows_total = fields.Integer(dump_only=True)
+    error = fields.Str(dump_only=True)
+    created_at = fields.DateTime(dump_only=True)
+    finished_at = fields.DateTime(dump_only=True)
+
+
+report_request_schema = ReportRequestSchema()
+report_job_schema = ReportJobSchema()
@@ -0,0 +1,63 @@
+from sqlalchemy import DDL, Select, column, event, func, literal_column, select, table
+
+from app.db import db, expense_row_columns, Expenses
+
+FTS_TABLE = "expenses_fts"
+
+expenses_fts = table(FTS_TABLE, column("rowid"), column("rank"))
+
+# Keep in sync with the "Add expenses full-text search" migration.
+SQLITE_FTS_DDL = (
+    f"CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5("
+    "title, content='expenses', content_rowid='id', tokenize='trigram')",
+    f"CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_ai AFTER INSERT ON expenses BEGIN "
+    f"INSERT INTO {FTS_TABLE}(rowid, title) VALUES (new.id, new.title); END",
+    f"CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_ad AFTER DELETE ON expenses BEGIN "
+    f"INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, title) "
+    "VALUES ('delete', old.id, old.title); END",
+    f"CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_au AFTER UPDATE OF title ON expenses BEGIN "
+    f"INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, title) "
+    "VALUES ('delete', old.id, old.title); "
+    f"INSERT INTO {FTS_TABLE}(rowid, title) VALUES (new.id, new.title); END",
+)
+
+for statement in SQLITE_FTS_DDL:
+    event.listen(
+        Expenses.__table__,
+        "after_create",
+        DDL(statement).execute_if(dialect="sqlite"),
+    )
+event.listen(
+    Expenses.__table__,
+    "before_drop",
+    DDL(f"DROP TABLE IF EXISTS {FTS_TABLE}").execute_if(dialect="sqlite"),
+)
+
+
+def escape_like(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+
+
+def search_query(user_id: int, q: str) -> Select:
+    """
+    Build a ranked title search over a user's expenses.
+
+    SQLite matches through the trigram FTS5 table, PostgreSQL through the
+    pg_trgm index on expenses.title. Other backends fall back to LIKE.
+    """
+    query = select(*expense_row_columns()).where(Expenses.user_id == user_id)
+    dialect = db.session.get_bind().dialect.name
+
+    if dialect == "sqlite":
+        phrase = '"' + q.replace('"', '""') + '"'
+        return (
+            query.join(expenses_fts, expenses_fts.c.rowid == Expenses.id)
+            .where(literal_column(FTS_TABLE).op("MATCH")(phrase))
+            .order_by(expenses_fts.c.rank, Expenses.id)
+        )
+
+    pattern = f"%{escape_like(q)}%"
+    query = query.where(Expenses.title.ilike(pattern, escape="\\"))
+    if dialect == "postgresql":
+        return query.order_by(func.similarity(Expenses.title, q).desc(), Expenses.id)
+    return query.order_by(Expenses.id)
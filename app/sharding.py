@@ -0,0 +1,121 @@
+import click
+from flask.cli import AppGroup
+from sqlalchemy import delete, select
+from sqlalchemy.engine import Connection, Engine
+
+from app.db import db, shard_key, shard_keys, SHARDED_TABLES, Expenses, ExpensesArchive
+from app.stats import _aggregate_query, stats_table
+
+shards_cli = AppGroup("shards", help="Manage the per-user expense shards.")
+
+MOVE_CHUNK_SIZE = 1000
+
+
+class ShardCollision(Exception):
+    """A row being moved has the id of another user's row on the target shard."""
+
+
+def _tables() -> list:
+    return [db.metadata.tables[name] for name in SHARDED_TABLES]
+
+
+def create_shard_schema() -> None:
+    """Create the user-owned tables on every shard that lacks them."""
+    for shard in shard_keys():
+        if shard is not None:
+            db.metadata.create_all(db.engines[shard], tables=_tables())
+
+
+def _shard_users(connection: Connection) -> set[int]:
+    users = set()
+    for table in _tables():
+        users.update(connection.scalars(select(table.c.user_id).distinct()))
+    return users
+
+
+def _copy_rows(source: Connection, target: Connection, table, user_id: int) -> None:
+    rows = source.execution_options(yield_per=MOVE_CHUNK_SIZE).execute(
+        select(table).where(table.c.user_id == user_id)
+    )
+    for chunk in rows.mappings().partitions():
+        existing = dict(target.execute(
+            select(table.c.id, table.c.user_id)
+            .where(table.c.id.in_([row["id"] for row in chunk]))
+        ).all())
+        if any(owner != user_id for owner in existing.values()):
+            raise ShardCollision(f"{table.name} ids of user {user_id} are taken")
+        # Rows already on the target were copied by an interrupted run.
+        missing = [dict(row) for row in chunk if row["id"] not in existing]
+        if missing:
+            target.execute(table.insert(), missing)
+
+
+def move_user(user_id: int, source: Engine, target: Engine) -> None:
+    """
+    Move a user's rows between shards.
+
+    The copy is committed on the target before the rows are deleted from
+    the source, so an interrupted move can be re-run. The stats row is
+    recomputed on the target rather than copied.
+    """
+    category = db.metadata.tables["category"]
+    expenses, archive = Expenses.__table__, ExpensesArchive.__table__
+    with source.connect() as src, target.begin() as dst:
+        for table in (category, expenses, archive):
+            _copy_rows(src, dst, table, user_id)
+        dst.execute(delete(stats_table).where(stats_table.c.user_id == user_id))
+        dst.execute(stats_table.insert().from_select(
+            ["user_id", "count", "total", "min_amount", "max_amount"],
+            _aggregate_query().where(Expenses.user_id == user_id),
+        ))
+
+    with source.begin() as src:
+        for table in (expenses, archive, category, stats_table):
+            src.execute(delete(table).where(table.c.user_id == user_id))
+
+
+def rebalance() -> tuple[int, list[int]]:
+    """
+    Move every user whose rows are not on the shard their id hashes to.
+
+    The default bind is scanned as well, so this also spreads a database
+    that predates sharding. Returns the number of users moved and the ids
+    of users that could not be moved because of id collisions.
+    """
+    shards = [shard for shard in shard_keys() if shard is not None]
+    if not shards:
+        raise click.UsageError("EXPENSE_SHARDS is not configured")
+
+    moved, collisions = 0, []
+    for source_key in [None, *shards]:
+        source = db.engines[source_key]
+        with source.connect() as connection:
+            users = _shard_users(connection)
+        for user_id in sorted(users):
+            target_key = shard_key(user_id, len(shards))
+            if target_key == source_key:
+                continue
+            try:
+                move_user(user_id, source, db.engines[target_key])
+            except ShardCollision:
+                collisions.append(user_id)
+            else:
+                moved += 1
+    return moved, collisions
+
+
+@shards_cli.command("init")
+def init_command() -> None:
+    """Create the expense tables on every shard."""
+    create_shard_schema()
+    click.echo(f"Initialised {len(shard_keys())} shards")
+
+
+@shards_cli.command("rebalance")
+def rebalance_command() -> None:
+    """Move users to the shard their id hashes to. Run it with writes stopped."""
+    moved, collisions = rebalance()
+    click.echo(f"Moved {moved} users")
+    if collisions:
+        click.echo(f"Could not move users with clashing ids: {', '.join(map(str, collisions))}")
+        raise SystemExit(1)
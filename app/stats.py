@@ -0,0 +1,259 @@
+from decimal import Decimal
+
+import click
+from flask.cli import AppGroup
+from sqlalchemy import case, delete, func, or_, select
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.exc import IntegrityError
+
+from app.db import db, shard_keys, use_shard, Expenses, UserExpenseStats
+
+stats_cli = AppGroup("stats", help="Maintain the per-user expense totals.")
+
+stats_table = UserExpenseStats.__table__
+
+
+def _aggregate_query():
+    return select(
+        Expenses.user_id,
+        func.count(Expenses.id),
+        func.coalesce(func.sum(Expenses.amount), 0),
+        func.min(Expenses.amount),
+        func.max(Expenses.amount),
+    ).group_by(Expenses.user_id)
+
+
+STATS_COLUMNS = ("user_id", "count", "total", "min_amount", "max_amount")
+
+# Dialects whose INSERT takes ON CONFLICT, so racing first writes do not fail.
+_UPSERT_INSERTS = {"postgresql": postgresql.insert, "sqlite": sqlite.insert}
+
+
+def _user_aggregate(user_id: int) -> dict:
+    row = db.session.execute(
+        _aggregate_query().where(Expenses.user_id == user_id)
+    ).one_or_none()
+    return dict(zip(STATS_COLUMNS, row or (user_id, 0, 0, None, None)))
+
+
+def _insert_stats(values: dict, overwrite: bool) -> bool:
+    """
+    Insert a stats row, tolerating one inserted concurrently by another
+    transaction: it is overwritten with ``values`` if ``overwrite`` is set
+    and left alone otherwise. Returns False when the row was left alone.
+    """
+    upsert = _UPSERT_INSERTS.get(db.session.get_bind().dialect.name)
+    if upsert is not None:
+        statement = upsert(stats_table).values(**values)
+        if overwrite:
+            statement = statement.on_conflict_do_update(
+                index_elements=["user_id"],
+                set_={name: statement.excluded[name] for name in STATS_COLUMNS[1:]},
+            )
+        else:
+            statement = statement.on_conflict_do_nothing(index_elements=["user_id"])
+        return db.session.execute(statement).rowcount > 0
+
+    try:
+        with db.session.begin_nested():
+            db.session.execute(stats_table.insert().values(**values))
+    except IntegrityError:
+        if not overwrite:
+            return False
+        db.session.execute(
+            stats_table.update()
+            .where(stats_table.c.user_id == values["user_id"])
+            .values(**values)
+        )
+    return True
+
+
+def refresh_user_stats(user_id: int) -> UserExpenseStats:
+    """Recompute a single user's stats row from the expenses table."""
+    _insert_stats(_user_aggregate(user_id), overwrite=True)
+    return db.session.get(UserExpenseStats, user_id, populate_existing=True)
+
+
+def get_user_stats(user_id: int) -> UserExpenseStats:
+    """Return the stats row for a user, backfilling it when it is missing."""
+    stats = db.session.get(UserExpenseStats, user_id)
+    if stats is None:
+        stats = refresh_user_stats(user_id)
+        db.session.commit()
+    return stats
+
+
+def _user_extreme(func_, user_id: int):
+    return (
+        select(func_(Expenses.amount))
+        .where(Expenses.user_id == user_id)
+        .scalar_subquery()
+    )
+
+
+def _apply_delta(user_id: int, count_delta: int, added=(), removed=()) -> None:
+    """
+    Apply a change to a user's stats row in a single UPDATE.
+
+    The total is moved by the added and removed amounts. When a removed
+    amount was the current min or max it is replaced from the expenses
+    table, so the caller must flush the expense change before calling this.
+    """
+    c = stats_table.c
+    total = c.total
+    min_cases = []
+    max_cases = []
+    if removed:
+        total = total - sum(Decimal(str(amount)) for amount in removed)
+        min_cases.append((c.min_amount == min(removed), _user_extreme(func.min, user_id)))
+        max_cases.append((c.max_amount == max(removed), _user_extreme(func.max, user_id)))
+    if added:
+        low, high = min(added), max(added)
+        total = total + sum(Decimal(str(amount)) for amount in added)
+        min_cases.append((or_(c.min_amount.is_(None), c.min_amount > low), low))
+        max_cases.append((or_(c.max_amount.is_(None), c.max_amount < high), high))
+
+    statement = (
+        stats_table.update()
+        .where(c.user_id == user_id)
+        .values(
+            count=c.count + count_delta,
+            total=total,
+            min_amount=case(*min_cases, else_=c.min_amount),
+            max_amount=case(*max_cases, else_=c.max_amount),
+        )
+    )
+    if db.session.execute(statement).rowcount == 0:
+        # The user has no stats row yet. If another transaction creates
+        # it first, its aggregate lacks this change, so apply the delta.
+        if not _insert_stats(_user_aggregate(user_id), overwrite=False):
+            db.session.execute(statement)
+
+
+def record_insert(user_id: int, amount) -> None:
+    _apply_delta(user_id, 1, added=(amount,))
+
+
+def record_bulk_insert(user_id: int, amounts: list) -> None:
+    """Account for many new expenses of one user in one statement."""
+    if amounts:
+        _apply_delta(user_id, len(amounts), added=amounts)
+
+
+def record_delete(user_id: int, amount) -> None:
+    _apply_delta(user_id, -1, removed=(amount,))
+
+
+def record_bulk_delete(user_id: int, amounts: list) -> None:
+    """Account for many removed expenses of one user in one statement."""
+    if amounts:
+        _apply_delta(user_id, -len(amounts), removed=amounts)
+
+
+def record_amount_change(user_id: int, pk: int, new_amount) -> bool:
+    """
+    Account for expense ``pk`` changing to ``new_amount``, before it is updated.
+
+    The old amount is read inside this UPDATE, locked with FOR UPDATE where
+    the database supports it and under SQLite's write lock otherwise, so no
+    other change to the expense can land between the read and the write.
+    Nothing is changed if the user does not own ``pk``. Returns False when
+    no stats row was updated; the caller then refreshes the row after its
+    own update.
+    """
+    c = stats_table.c
+    old = (
+        select(Expenses.amount)
+        .where(Expenses.id == pk, Expenses.user_id == user_id)
+        .with_for_update()
+        .scalar_subquery()
+    )
+    new = Decimal(str(new_amount))
+
+    def others(func_):
+        return (
+            select(func_(Expenses.amount))
+            .where(Expenses.user_id == user_id, Expenses.id != pk)
+            .scalar_subquery()
+        )
+
+    low, high = others(func.min), others(func.max)
+    result = db.session.execute(
+        stats_table.update()
+        .where(c.user_id == user_id, old.is_not(None))
+        .values(
+            total=c.total - old + new,
+            min_amount=case(
+                (c.min_amount == old, case((low < new, low), else_=new)),
+                (c.min_amount > new, new),
+                else_=c.min_amount,
+            ),
+            max_amount=case(
+                (c.max_amount == old, case((high > new, high), else_=new)),
+                (c.max_amount < new, new),
+                else_=c.max_amount,
+            ),
+        )
+    )
+    return result.rowcount > 0
+
+
+def rebuild_stats() -> int:
+    """Recompute every stats row from the expenses table, shard by shard."""
+    rows = 0
+    for shard in shard_keys():
+        with use_shard(shard):
+            db.session.execute(delete(UserExpenseStats))
+            result = db.session.execute(
+                stats_table.insert().from_select(
+                    ["user_id", "count", "total", "min_amount", "max_amount"],
+                    _aggregate_query(),
+                )
+            )
+            db.session.commit()
+        rows += result.rowcount
+    return rows
+
+
+def verify_stats() -> list[int]:
+    """Return ids of users whose stats row disagrees with their expenses."""
+    mismatched = []
+    for shard in shard_keys():
+        with use_shard(shard):
+            mismatched.extend(_verify_shard())
+    return sorted(mismatched)
+
+
+def _verify_shard() -> list[int]:
+    expected = {
+        row[0]: tuple(row[1:])
+        for row in db.session.execute(_aggregate_query())
+    }
+    actual = {
+        stats.user_id: (stats.count, stats.total, stats.min_amount, stats.max_amount)
+        for stats in db.session.scalars(select(UserExpenseStats))
+    }
+
+    mismatched = []
+    for user_id in sorted(expected.keys() | actual.keys()):
+        empty = (0, 0, None, None)
+        if expected.get(user_id, empty) != actual.get(user_id, empty):
+            mismatched.append(user_id)
+    return mismatched
+
+
+@stats_cli.command("rebuild")
+def rebuild_command() -> None:
+    """Recompute the stats table from scratch."""
+    rows = rebuild_stats()
+    click.echo(f"Rebuilt stats for {rows} users")
+
+
+@stats_cli.command("verify")
+def verify_command() -> None:
+    """Check the stats table against the expenses table."""
+    mismatched = verify_stats()
+    if mismatched:
+        click.echo(f"Stats out of date for users: {', '.join(map(str, mismatched))}")
+        raise SystemExit(1)
+    click.echo("Stats are consistent")
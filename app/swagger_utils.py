@@ -25,10 +25,15 @@ def create_swagger_spec(app: Flask) -> dict:
             "discriminator": "expenseInType",
             "properties": {
                 "title": {"type": "string"},
-                "amount": {"type": "number"}
+                "amount": {"type": "number"},
+                "spent_at": {"type": "string", "format": "date-time"},
+                "category_id": {"type": "integer"},
             },
             "example": {
-                "title": "I'm your expense", "amount": 5.21
+                "title": "I'm your expense",
+                "amount": 5.21,
+                "spent_at": "2025-02-14T19:02:35",
+                "category_id": 1,
             },
         },
         "ExpenseOut": {
@@ -46,18 +51,276 @@ def create_swagger_spec(app: Flask) -> dict:
                 }
             ]
         },
+        "ExpenseTotals": {
+            "type": "object",
+            "discriminator": "expenseTotalsType",
+            "properties": {
+                "count": {"type": "integer"},
+                "total": {"type": "number"},
+                "min": {"type": "number"},
+                "max": {"type": "number"},
+            },
+            "example": {
+                "count": 3, "total": 15.63, "min": 5.21, "max": 5.21
+            },
+        },
+        "ExpenseRollup": {
+            "type": "object",
+            "discriminator": "expenseRollupType",
+            "properties": {
+                "bucket": {"type": "string", "format": "date"},
+                "count": {"type": "integer"},
+                "total": {"type": "number"},
+            },
+            "example": {
+                "bucket": "2025-02-01", "count": 3, "total": 15.63
+            },
+        },
+        "ExpenseBreakdown": {
+            "type": "object",
+            "discriminator": "expenseBreakdownType",
+            "properties": {
+                "category_id": {"type": "integer"},
+                "category": {"type": "string"},
+                "count": {"type": "integer"},
+                "total": {"type": "number"},
+            },
+            "example": {
+                "category_id": 1, "category": "Food", "count": 3, "total": 15.63
+            },
+        },
+        "ExpenseStats": {
+            "type": "object",
+            "discriminator": "expenseStatsType",
+            "properties": {
+                "count": {"type": "integer"},
+                "min": {"type": "number"},
+                "max": {"type": "number"},
+                "mean": {"type": "number"},
+                "std": {"type": "number", "description": "Population standard deviation"},
+                "median": {"type": "number"},
+                "p90": {"type": "number"},
+                "p99": {"type": "number"},
+                "histogram": {
+                    "type": "array",
+                    "items": {
+                        "type": "object",
+                        "properties": {
+                            "start": {"type": "number"},
+                            "end": {"type": "number"},
+                            "count": {"type": "integer"},
+                        },
+                    },
+                },
+            },
+            "example": {
+                "count": 4, "min": 10.0, "max": 40.0, "mean": 25.0, "std": 11.1803,
+                "median": 25.0, "p90": 37.0, "p99": 39.7,
+                "histogram": [
+                    {"start": 10.0, "end": 25.0, "count": 2},
+                    {"start": 25.0, "end": 40.0, "count": 2},
+                ],
+            },
+        },
+        "ReportIn": {
+            "type": "object",
+            "discriminator": "reportInType",
+            "properties": {
+                "year": {"type": "integer"},
+                "format": {"type": "string", "enum": ["csv", "json"], "default": "csv"},
+            },
+            "example": {"year": 2025, "format": "csv"},
+        },
+        "ReportJob": {
+            "type": "object",
+            "discriminator": "reportJobType",
+            "properties": {
+                "id": {"type": "integer"},
+                "year": {"type": "integer"},
+                "format": {"type": "string"},
+                "status": {"type": "string", "enum": ["queued", "running", "done", "failed"]},
+                "rows_done": {"type": "integer"},
+                "rows_total": {"type": "integer"},
+                "progress": {"type": "number"},
+                "error": {"type": "string"},
+                "created_at": {"type": "string", "format": "date-time"},
+                "finished_at": {"type": "string", "format": "date-time"},
+                "download_url": {"type": "string"},
+            },
+            "example": {
+                "id": 1, "year": 2025, "format": "csv", "status": "done",
+                "rows_done": 1200, "rows_total": 1200, "progress": 1.0, "error": None,
+                "created_at": "2026-01-02T10:00:00", "finished_at": "2026-01-02T10:00:04",
+                "download_url": "/reports/1/file",
+            },
+        },
+        "CategoryIn": {
+            "type": "object",
+            "discriminator": "categoryInType",
+            "properties": {
+                "name": {"type": "string", "minLength": 1, "maxLength": 30},
+            },
+            "example": {"name": "Food"},
+        },
+        "CategoryOut": {
+            "allOf": [
+                {"$ref": "#/definitions/CategoryIn"},
+                {
+                    "properties": {"id": {"type": "integer"}},
+                    "example": {"id": 1},
+                }
+            ]
+        },
         "ExpensePatch": {
             "type": "object",
             "discriminator": "expensePatchType",
             "properties": {
                 "title": {"type": "string"},
-                "amount": {"type": "number"}
+                "amount": {"type": "number"},
+                "spent_at": {"type": "string", "format": "date-time"},
+                "category_id": {"type": "integer"},
             },
             "required": [],
             "example": {
                 "title": "I'm your expense", "amount": 5.21
             },
         },
+        "ImportOut": {
+            "type": "object",
+            "discriminator": "importOutType",
+            "properties": {
+                "imported": {"type": "integer"},
+                "failed": {"type": "integer"},
+                "errors": {
+                    "type": "array",
+                    "items": {
+                        "type": "object",
+                        "properties": {
+                            "line": {"type": "integer"},
+                            "errors": {"type": "object"},
+                        },
+                    },
+                },
+            },
+            "example": {
+                "imported": 2,
+                "failed": 1,
+                "errors": [
+                    {"line": 3, "errors": {"amount": ["Not a valid number."]}},
+                ],
+            },
+        },
+        "Metrics": {
+            "type": "object",
+            "discriminator": "metricsType",
+            "properties": {
+                "response_cache": {
+                    "type": "object",
+                    "properties": {
+                        "hits": {"type": "integer"},
+                        "misses": {"type": "integer"},
+                        "invalidations": {"type": "integer"},
+                        "hit_rate": {"type": "number"},
+                    },
+                },
+                "jwt_cache": {
+                    "type": "object",
+                    "properties": {
+                        "entries": {"type": "integer"},
+                        "hits": {"type": "integer"},
+                        "misses": {"type": "integer"},
+                        "hit_rate": {"type": "number"},
+                    },
+                },
+                "hub_monitor": {
+                    "type": "object",
+                    "properties": {
+                        "blocks": {"type": "integer"},
+                        "endpoints": {
+                            "type": "object",
+                            "description": "count, total_ms and max_ms of hub blocks per endpoint",
+                        },
+                    },
+                },
+                "admission": {
+                    "type": "object",
+                    "description": "One entry per pool, default and expensive",
+                    "additionalProperties": {
+                        "type": "object",
+                        "properties": {
+                            "limit": {"type": "integer"},
+                            "in_flight": {"type": "integer"},
+                            "queued": {"type": "integer"},
+                            "admitted": {"type": "integer"},
+                            "rejected": {"type": "integer"},
+                        },
+                    },
+                },
+            },
+            "example": {
+                "response_cache": {
+                    "hits": 75, "misses": 25, "invalidations": 3, "hit_rate": 0.75
+                },
+                "jwt_cache": {"entries": 12, "hits": 480, "misses": 20, "hit_rate": 0.96},
+            },
+        },
+        "BatchIn": {
+            "type": "object",
+            "discriminator": "batchInType",
+            "properties": {
+                "atomic": {"type": "boolean", "default": False},
+                "requests": {
+                    "type": "array",
+                    "items": {
+                        "type": "object",
+                        "properties": {
+                            "method": {
+                                "type": "string",
+                                "enum": ["GET", "POST", "PATCH", "DELETE"],
+                            },
+                            "path": {"type": "string"},
+                            "body": {"type": "object"},
+                            "headers": {"type": "object"},
+                        },
+                    },
+                },
+            },
+            "example": {
+                "atomic": True,
+                "requests": [
+                    {
+                        "method": "POST",
+                        "path": "/expenses/",
+                        "body": {"title": "I'm your expense", "amount": 5.21},
+                    },
+                    {"method": "DELETE", "path": "/expenses/1"},
+                ],
+            },
+        },
+        "BatchOut": {
+            "type": "object",
+            "discriminator": "batchOutType",
+            "properties": {
+                "committed": {"type": "boolean"},
+                "responses": {
+                    "type": "array",
+                    "items": {
+                        "type": "object",
+                        "properties": {
+                            "status": {"type": "integer"},
+                            "body": {"type": "object"},
+                        },
+                    },
+                },
+            },
+            "example": {
+                "committed": True,
+                "responses": [
+                    {"status": 201, "body": {"id": 2, "title": "I'm your expense"}},
+                    {"status": 204, "body": None},
+                ],
+            },
+        },
         "UserIn": {
             "type": "object",
             "discriminator": "UserInType",
@@ -115,6 +378,16 @@ def create_swagger_spec(app: Flask) -> dict:
                 "access_token": "YOUR ACCESS TOKEN",
             },
         },
+        "LogoutOut": {
+            "type": "object",
+            "discriminator": "LogoutOutType",
+            "properties": {
+                "msg": {"type": "string"},
+            },
+            "example": {
+                "msg": "Access token revoked",
+            },
+        },
         "UserOut": {
             "type": "object",
             "discriminator": "UserOutType",
@@ -0,0 +1,326 @@
+import atexit
+import contextlib
+import json
+import logging
+import random
+import time
+from collections import deque
+from typing import Iterator, Protocol
+
+from flask import Flask, Response, blueprints, current_app, g, has_app_context, jsonify, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+from app.log_queue import DroppingQueueHandler, NativeQueueListener, native_queue
+
+
+class Span:
+    __slots__ = ("span_id", "parent_id", "name", "start_ns", "end_ns", "attributes")
+
+    def __init__(self, name: str, parent_id: str | None, attributes: dict) -> None:
+        self.span_id = f"{random.getrandbits(64):016x}"
+        self.parent_id = parent_id
+        self.name = name
+        self.start_ns = time.time_ns()
+        self.end_ns = 0
+        self.attributes = attributes
+
+    @property
+    def duration_ms(self) -> float:
+        return (self.end_ns - self.start_ns) / 1e6
+
+    def to_dict(self) -> dict:
+        return {
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "name": self.name,
+            "start_ns": self.start_ns,
+            "duration_ms": round(self.duration_ms, 3),
+            "attributes": self.attributes,
+        }
+
+
+class Trace:
+    __slots__ = ("trace_id", "spans", "stack")
+
+    def __init__(self) -> None:
+        self.trace_id = f"{random.getrandbits(128):032x}"
+        self.spans: list[Span] = []
+        self.stack: list[Span] = []
+
+    @property
+    def root(self) -> Span:
+        return self.spans[0]
+
+    def to_dict(self) -> dict:
+        return {
+            "trace_id": self.trace_id,
+            "name": self.root.name,
+            "duration_ms": round(self.root.duration_ms, 3),
+            "spans": [span.to_dict() for span in self.spans],
+        }
+
+
+class Exporter(Protocol):
+    def export(self, trace: Trace) -> None: ...
+
+    def close(self) -> None: ...
+
+
+class MemoryExporter:
+    """Keeps the most recent traces for the slowest-traces view."""
+
+    def __init__(self, max_traces: int = 1000) -> None:
+        self.traces: deque[Trace] = deque(maxlen=max_traces)
+
+    def export(self, trace: Trace) -> None:
+        self.traces.append(trace)
+
+    def close(self) -> None:
+        pass
+
+    def slowest(self, limit: int) -> list[Trace]:
+        return sorted(self.traces, key=lambda t: t.root.duration_ms, reverse=True)[:limit]
+
+
+class _TraceFormatter(logging.Formatter):
+    def __init__(self, exporter: "FileExporter") -> None:
+        super().__init__()
+        self.exporter = exporter
+
+    def format(self, record: logging.LogRecord) -> str:
+        return json.dumps(self.exporter.encode(record.trace), default=str)
+
+
+class FileExporter:
+    """
+    Appends one JSON line per trace, written from a background thread.
+
+    ``export`` only puts the trace on a bounded queue; a listener on a
+    native thread encodes and writes it, the same way as the access log.
+    Traces are dropped rather than queued once ``max_queue`` are waiting.
+    """
+
+    def __init__(self, path: str, max_queue: int = 10_000) -> None:
+        self.path = path
+        self._queue = native_queue()
+        self._handler = DroppingQueueHandler(self._queue, max_queue)
+        writer = logging.FileHandler(path, delay=True)
+        writer.setFormatter(_TraceFormatter(self))
+        self.listener: NativeQueueListener | None = NativeQueueListener(
+            self._queue, writer, name="trace-export"
+        )
+        self.listener.start()
+
+    def encode(self, trace: Trace) -> dict:
+        return trace.to_dict()
+
+    def export(self, trace: Trace) -> None:
+        self._handler.handle(logging.makeLogRecord({"trace": trace}))
+
+    def close(self) -> None:
+        """Write the queued traces and stop the listener."""
+        if self.listener is not None:
+            self.listener.stop()
+            for handler in self.listener.handlers:
+                handler.close()
+            self.listener = None
+
+    def metrics(self) -> dict:
+        return {"queued": self._queue.qsize(), "dropped": self._handler.dropped}
+
+
+def _otlp_value(value) -> dict:
+    if isinstance(value, bool):
+        return {"boolValue": value}
+    if isinstance(value, int):
+        return {"intValue": str(value)}
+    if isinstance(value, float):
+        return {"doubleValue": value}
+    return {"stringValue": str(value)}
+
+
+class OtlpFileExporter(FileExporter):
+    """
+    Appends traces as OTLP/JSON ExportTraceServiceRequest lines.
+
+    An OpenTelemetry Collector can ship the file with its otlpjsonfile
+    receiver, so the app needs no OpenTelemetry dependency.
+    """
+
+    def __init__(self, path: str, service_name: str, max_queue: int = 10_000) -> None:
+        # encode() runs on the listener thread, which starts in __init__.
+        self.service_name = service_name
+        super().__init__(path, max_queue)
+
+    def encode(self, trace: Trace) -> dict:
+        spans = [
+            {
+                "traceId": trace.trace_id,
+                "spanId": span.span_id,
+                "parentSpanId": span.parent_id or "",
+                "name": span.name,
+                # SPAN_KIND_SERVER for the request, SPAN_KIND_INTERNAL below it.
+                "kind": 2 if span.parent_id is None else 1,
+                "startTimeUnixNano": str(span.start_ns),
+                "endTimeUnixNano": str(span.end_ns),
+                "attributes": [
+                    {"key": key, "value": _otlp_value(value)}
+                    for key, value in span.attributes.items()
+                ],
+            }
+            for span in trace.spans
+        ]
+        return {"resourceSpans": [{
+            "resource": {"attributes": [
+                {"key": "service.name", "value": {"stringValue": self.service_name}},
+            ]},
+            "scopeSpans": [{"scope": {"name": __name__}, "spans": spans}],
+        }]}
+
+
+@contextlib.contextmanager
+def span(name: str, **attributes) -> Iterator[Span | None]:
+    """
+    Time a block as a child of the current span.
+
+    Outside a sampled request this does nothing, so instrumented code pays
+    only for a lookup on ``g``.
+    """
+    trace = g.get("trace") if has_app_context() else None
+    if trace is None:
+        yield None
+        return
+
+    parent = trace.stack[-1] if trace.stack else None
+    current = Span(name, parent.span_id if parent else None, attributes)
+    trace.spans.append(current)
+    trace.stack.append(current)
+    try:
+        yield current
+    finally:
+        current.end_ns = time.time_ns()
+        trace.stack.pop()
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany) -> None:
+    if has_app_context() and g.get("trace") is not None:
+        sql_span = span("sql", statement=statement[:200])
+        conn.info.setdefault("trace_spans", []).append((sql_span, sql_span.__enter__()))
+
+
+def _end_sql_span(conn, error: BaseException | None = None) -> None:
+    spans = conn.info.get("trace_spans")
+    if spans and has_app_context() and g.get("trace") is not None:
+        sql_span, current = spans.pop()
+        if error is not None:
+            current.attributes["error"] = type(error).__name__
+        sql_span.__exit__(None, None, None)
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany) -> None:
+    _end_sql_span(conn)
+
+
+def _handle_error(context) -> None:
+    # A statement that raises never reaches after_cursor_execute.
+    if context.connection is not None:
+        _end_sql_span(context.connection, context.original_exception)
+
+
+bp = blueprints.Blueprint("tracing", __name__, url_prefix="/debug")
+
+
+@bp.route("/traces", methods=["GET"])
+def slowest_traces() -> (Response, int):
+    """Slowest recent traces kept by the in-memory exporter, dev only."""
+    limit = request.args.get("limit", 20, type=int)
+    exporter = current_app.extensions["tracer"].exporter
+    return jsonify([trace.to_dict() for trace in exporter.slowest(limit)]), 200
+
+
+class Tracer:
+    """
+    Per-request traces, sampled with TRACING_SAMPLE_RATE.
+
+    Every request that is sampled gets a root span; ``span()`` calls and
+    SQL statements made while it runs become its children. The finished
+    trace goes to the exporter picked by TRACING_EXPORTER.
+    """
+
+    def __init__(self) -> None:
+        self.exporter: Exporter | None = None
+        self.sample_rate = 1.0
+
+    def init_app(self, app: Flask) -> None:
+        name = app.config["TRACING_EXPORTER"]
+        if name == "none":
+            return
+        if name not in ("memory", "file", "otlp"):
+            raise ValueError(f"Unknown TRACING_EXPORTER {name!r}")
+
+        self.close()
+        if name == "memory":
+            self.exporter = MemoryExporter(app.config["TRACING_MAX_TRACES"])
+        elif name == "file":
+            self.exporter = FileExporter(
+                app.config["TRACING_FILE"], app.config["TRACING_QUEUE_SIZE"]
+            )
+        else:
+            self.exporter = OtlpFileExporter(
+                app.config["TRACING_FILE"], "expenses-api", app.config["TRACING_QUEUE_SIZE"]
+            )
+        self.sample_rate = app.config["TRACING_SAMPLE_RATE"]
+        app.extensions["tracer"] = self
+
+        if not event.contains(Engine, "before_cursor_execute", _before_cursor_execute):
+            event.listen(Engine, "before_cursor_execute", _before_cursor_execute)
+            event.listen(Engine, "after_cursor_execute", _after_cursor_execute)
+            event.listen(Engine, "handle_error", _handle_error)
+
+        app.before_request(self._start)
+        app.after_request(self._record_status)
+        app.teardown_request(self._finish)
+        if app.debug and name == "memory":
+            app.register_blueprint(bp)
+
+    def close(self) -> None:
+        """Flush the exporter's queued traces."""
+        if self.exporter is not None:
+            self.exporter.close()
+
+    def metrics(self) -> dict:
+        exporter_metrics = getattr(self.exporter, "metrics", None)
+        return exporter_metrics() if exporter_metrics else {"queued": 0, "dropped": 0}
+
+    def _start(self) -> None:
+        g.trace = None
+        if random.random() >= self.sample_rate:
+            return
+        g.trace = Trace()
+        # Batch sub-requests share g but must not end the batch's trace.
+        g.trace_request = request._get_current_object()
+        root = span(f"{request.method} {request.path}", endpoint=request.endpoint)
+        root.__enter__()
+        g.trace_root = root
+
+    @staticmethod
+    def _record_status(response: Response) -> Response:
+        trace = g.get("trace")
+        if trace is not None:
+            trace.root.attributes["status"] = response.status_code
+        return response
+
+    def _finish(self, exc: BaseException | None) -> None:
+        trace = g.get("trace")
+        if trace is None or g.trace_request is not request._get_current_object():
+            return
+        g.trace = None
+        g.trace_root.__exit__(None, None, None)
+        if exc is not None:
+            trace.root.attributes["error"] = type(exc).__name__
+        self.exporter.export(trace)
+
+
+tracer = Tracer()
+atexit.register(tracer.close)
@@ -0,0 +1,123 @@
+import threading
+from collections import defaultdict
+
+from flask import Flask
+from sqlalchemy import insert
+from werkzeug.exceptions import ServiceUnavailable
+
+from app import stats
+from app.db import db, begin_transaction, session_on, user_engine, user_shard, Expenses
+from app.ids import id_allocator
+
+
+class _Pending:
+    __slots__ = ("row", "done", "result", "error")
+
+    def __init__(self, row: dict) -> None:
+        self.row = row
+        self.done = threading.Event()
+        self.result: dict | None = None
+        self.error: BaseException | None = None
+
+
+class ExpenseWriteBuffer:
+    """
+    Group commit for expense creation.
+
+    Concurrent ``submit`` calls are queued. The first caller of a group
+    becomes its leader: it waits up to ``max_delay`` seconds, or until
+    ``max_rows`` rows are queued, then inserts the whole group and updates
+    the stats in one transaction per shard, on a connection of its own
+    rather than its request's session. Every caller gets its row back only
+    after that commit, so a 201 still means durable. A caller whose leader
+    has not finished within ``timeout`` seconds gets a 503; its row may
+    still be committed by the leader afterwards.
+    """
+
+    def __init__(
+            self,
+            max_rows: int = 100,
+            max_delay: float = 0.005,
+            timeout: float = 30
+    ) -> None:
+        self.max_rows = max_rows
+        self.max_delay = max_delay
+        self.timeout = timeout
+        self._lock = threading.Lock()
+        self._pending: list[_Pending] = []
+        self._group_full: threading.Event | None = None
+
+    def init_app(self, app: Flask) -> None:
+        self.max_rows = app.config["EXPENSE_WRITE_BUFFER_MAX_ROWS"]
+        self.max_delay = app.config["EXPENSE_WRITE_BUFFER_MAX_DELAY"].total_seconds()
+        self.timeout = app.config["EXPENSE_WRITE_BUFFER_TIMEOUT"].total_seconds()
+
+    def submit(self, row: dict) -> dict:
+        """Insert an expense as part of the current group and return its row."""
+        item = _Pending(row)
+        with self._lock:
+            self._pending.append(item)
+            leader = self._group_full is None
+            if leader:
+                self._group_full = threading.Event()
+            elif len(self._pending) >= self.max_rows:
+                self._group_full.set()
+            group_full = self._group_full
+
+        if leader:
+            group_full.wait(self.max_delay)
+            with self._lock:
+                group, self._pending = self._pending, []
+                self._group_full = None
+            self._flush(group)
+        elif not item.done.wait(self.timeout):
+            raise ServiceUnavailable(description="Timed out waiting for the write to commit")
+
+        if item.error is not None:
+            raise item.error
+        return item.result
+
+    def _flush(self, group: list[_Pending]) -> None:
+        shards = defaultdict(list)
+        for item in group:
+            shards[user_shard(item.row["user_id"])].append(item)
+        for items in shards.values():
+            self._insert(items)
+
+    def _insert(self, group: list[_Pending]) -> None:
+        try:
+            with user_engine(group[0].row["user_id"]).connect() as connection:
+                transaction = begin_transaction(connection, write=True)
+                with session_on(connection):
+                    rows = self._write(group)
+                transaction.commit()
+        except BaseException as e:
+            for item in group:
+                item.error = e
+        else:
+            for item, row in zip(group, rows):
+                item.result = dict(row)
+        finally:
+            for item in group:
+                item.done.set()
+
+    @staticmethod
+    def _write(group: list[_Pending]) -> list:
+        rows = db.session.execute(
+            insert(Expenses).returning(
+                *Expenses.__table__.c, sort_by_parameter_order=True
+            ),
+            id_allocator.assign("expenses", [item.row for item in group]),
+        ).mappings().all()
+
+        amounts = defaultdict(list)
+        for row in rows:
+            amounts[row["user_id"]].append(row["amount"])
+        for user_id, user_amounts in amounts.items():
+            stats.record_bulk_insert(user_id, user_amounts)
+
+        db.session.commit()
+        return rows
+
+
+write_buffer = ExpenseWriteBuffer()
@@ -0,0 +1,93 @@
+"""
+Helpers shared by the benchmark scripts.
+
+Benchmarks are run from the repository root as modules, for example
+``python -m benchmarks.search --rows 1000000``. Each one builds the app
+against a throwaway SQLite file unless SQLALCHEMY_DATABASE_URI is set.
+"""
+import os
+import random
+import statistics
+import tempfile
+import time
+from typing import Callable
+
+from flask import Flask
+
+WORDS = (
+    "coffee", "lunch", "taxi", "groceries", "rent", "train", "ticket",
+    "book", "cinema", "pharmacy", "gym", "internet", "phone", "dinner",
+)
+
+
+def create_bench_app() -> Flask:
+    os.environ.setdefault(
+        "SQLALCHEMY_DATABASE_URI",
+        f"sqlite:///{tempfile.mkdtemp()}/bench.db",
+    )
+    os.environ.setdefault("JWT_SECRET_KEY", "benchmark-secret")
+    os.environ["CONFIG_TYPE"] = "app.config.DevelopmentConfig"
+    # Test clients never close their responses, so admission slots would
+    # never be freed and every client past the limit would get a 503.
+    os.environ["ADMISSION_CONTROL"] = "false"
+    # One JSON line per request on stdout would bury the results.
+    os.environ["ACCESS_LOG"] = "false"
+
+    from app import create_app
+
+    app = create_app()
+    app.config["DEBUG"] = False
+    return app
+
+
+def random_title(rng: random.Random) -> str:
+    return " ".join(rng.choices(WORDS, k=2)) + f" #{rng.randrange(10_000)}"
+
+
+def seed(
+    users: int,
+    rows: int,
+    chunk_size: int = 50_000,
+    seed_value: int = 0,
+    username_prefix: str = "bench_user",
+) -> list[int]:
+    """Create users and spread ``rows`` expenses across them in chunks."""
+    from sqlalchemy import insert
+
+    from app.db import db, Expenses, User
+    from app.stats import rebuild_stats
+
+    rng = random.Random(seed_value)
+    user_ids = []
+    for i in range(users):
+        user = User(username=f"{username_prefix}_{i}")
+        user.set_password("bench_password")
+        db.session.add(user)
+        db.session.flush()
+        user_ids.append(user.id)
+    db.session.commit()
+
+    for start in range(0, rows, chunk_size):
+        batch = [
+            {
+                "user_id": user_ids[i % users],
+                "title": random_title(rng),
+                "amount": round(rng.uniform(0, 999), 2),
+            }
+            for i in range(start, min(start + chunk_size, rows))
+        ]
+        db.session.execute(insert(Expenses), batch)
+        db.session.commit()
+
+    rebuild_stats()
+    return user_ids
+
+
+def measure(fn: Callable[[], object], repeat: int = 20) -> float:
+    """Return the median wall time of ``fn`` in milliseconds."""
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        timings.append((time.perf_counter() - started) * 1000)
+    return statistics.median(timings)
@@ -0,0 +1,55 @@
+"""
+Measure the per-request cost of access-token checks with and without
+the decoded-token cache.
+
+    python -m benchmarks.jwt_cache --requests 10000
+
+"decode" is signature verification and claims parsing alone; "verify"
+is what ``@jwt_required()`` runs, including the blocklist check and the
+user lookup query.
+"""
+import argparse
+
+from flask_jwt_extended import create_access_token, decode_token, verify_jwt_in_request
+
+from benchmarks.common import create_bench_app, measure, seed
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--requests", type=int, default=10_000)
+    parser.add_argument("--repeat", type=int, default=10)
+    args = parser.parse_args()
+
+    app = create_bench_app()
+    with app.app_context():
+        from app.db import db
+        from app.jwt import token_cache
+
+        db.create_all()
+        user_id = seed(users=1, rows=0)[0]
+        token = create_access_token(identity=user_id)
+        headers = {"Authorization": f"Bearer {token}"}
+        max_entries = token_cache.max_entries
+
+        def decode() -> None:
+            for _ in range(args.requests):
+                decode_token(token)
+
+        def verify() -> None:
+            for _ in range(args.requests):
+                with app.test_request_context(headers=headers):
+                    verify_jwt_in_request()
+
+        print(f"{args.requests} checks of one token, median of {args.repeat} runs")
+        for cached in (False, True):
+            token_cache.clear()
+            token_cache.max_entries = max_entries if cached else 0
+            label = "cache" if cached else "no cache"
+            for name, fn in (("decode", decode), ("verify", verify)):
+                per_request_us = measure(fn, args.repeat) * 1000 / args.requests
+                print(f"  {label:9} {name:7} {per_request_us:8.2f} us/request")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,66 @@
+"""
+Compare the list read path through ORM instances with plain Core rows.
+
+    python -m benchmarks.list_read_path --sizes 10000,100000,1000000
+
+For each size one user gets that many expenses. "orm" loads Expenses
+instances and dumps them with marshmallow, as get_expenses used to; "core"
+selects the columns and builds the dicts with dump_expense_rows. Peak
+memory is measured with tracemalloc over one extra run, so it covers the
+Python objects of the rows and the dumped dicts, not SQLite's own cache.
+"""
+import argparse
+import tracemalloc
+
+from sqlalchemy import select
+
+from benchmarks.common import create_bench_app, measure, seed
+
+
+def peak_mb(fn) -> float:
+    tracemalloc.start()
+    fn()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return peak / 1024 / 1024
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--sizes", default="10000,100000,1000000")
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    app = create_bench_app()
+    with app.app_context():
+        from app.db import db, Expenses
+        from app.expenses import build_expenses_query
+        from app.schemas import dump_expense_rows, expenses_out_schema
+
+        db.create_all()
+
+        print(f"median of {args.repeat} runs, peak traced memory of one run")
+        for seed_value, size in enumerate(int(s) for s in args.sizes.split(",")):
+            user_id = seed(
+                users=1, rows=size, seed_value=seed_value, username_prefix=f"bench_{size}"
+            )[0]
+
+            def orm() -> list:
+                query = select(Expenses).where(Expenses.user_id == user_id).order_by(Expenses.id)
+                data = expenses_out_schema.dump(db.session.scalars(query).all())
+                # Instances stay in the identity map until the request ends.
+                db.session.expunge_all()
+                return data
+
+            def core() -> list:
+                rows = db.session.execute(build_expenses_query(user_id, {})).all()
+                return dump_expense_rows(rows)
+
+            for name, fn in (("orm", orm), ("core", core)):
+                ms = measure(fn, args.repeat)
+                mb = peak_mb(fn)
+                print(f"  {size:>9} rows  {name:5} {ms:10.1f} ms {mb:10.1f} MB")
+
+
+if __name__ == "__main__":
+    main()
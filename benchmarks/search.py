@@ -0,0 +1,44 @@
+"""
+Compare title search through the FTS5 trigram index with LIKE '%q%'.
+
+    python -m benchmarks.search --rows 1000000 --users 10
+"""
+import argparse
+
+from sqlalchemy import select
+
+from benchmarks.common import create_bench_app, measure, seed
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--users", type=int, default=10)
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    app = create_bench_app()
+    with app.app_context():
+        from app.db import db, Expenses
+        from app.search import search_query
+
+        db.create_all()
+        user_ids = seed(args.users, args.rows)
+        user_id = user_ids[0]
+
+        print(f"{args.rows} rows over {args.users} users, median of {args.repeat} runs")
+        for q in ("coffee", "ticket #12", "#4242", "no such title"):
+            fts = search_query(user_id, q).limit(20)
+            like = (
+                select(Expenses)
+                .where(Expenses.user_id == user_id, Expenses.title.like(f"%{q}%"))
+                .order_by(Expenses.id)
+                .limit(20)
+            )
+            fts_ms = measure(lambda: db.session.scalars(fts).all(), args.repeat)
+            like_ms = measure(lambda: db.session.scalars(like).all(), args.repeat)
+            print(f"  q={q!r:14} fts5: {fts_ms:8.2f} ms   like: {like_ms:8.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
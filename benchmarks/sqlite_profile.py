@@ -0,0 +1,93 @@
+"""
+Mixed read/write load against SQLite under each SQLITE_PROFILE.
+
+    python -m benchmarks.sqlite_profile --readers 8 --writers 4 --seconds 5
+
+Each profile runs in a fresh process on a fresh database file, since the
+profile is applied when the engine connects. Readers list a user's
+expenses while writers create them, as the gunicorn workers would.
+"""
+import argparse
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+from flask_jwt_extended import create_access_token
+
+from benchmarks.common import create_bench_app, seed
+
+
+def worker(app, headers: dict, deadline: float, write: bool, counts: dict) -> None:
+    client = app.test_client()
+    key = "writes" if write else "reads"
+    while time.perf_counter() < deadline:
+        if write:
+            response = client.post(
+                "/expenses/", json={"title": "bench", "amount": 1}, headers=headers
+            )
+        else:
+            response = client.get("/expenses/?sort=-amount", headers=headers)
+        counts[key if response.status_code < 500 else "errors"] += 1
+
+
+def run_profile(args: argparse.Namespace) -> None:
+    app = create_bench_app()
+    with app.app_context():
+        from app.db import db
+
+        db.create_all()
+        user_id = seed(users=1, rows=args.rows)[0]
+        headers = {"Authorization": f"Bearer {create_access_token(identity=user_id)}"}
+
+    app.config["PROPAGATE_EXCEPTIONS"] = False
+    counts = {"reads": 0, "writes": 0, "errors": 0}
+    deadline = time.perf_counter() + args.seconds
+    threads = [
+        threading.Thread(target=worker, args=(app, headers, deadline, i < args.writers, counts))
+        for i in range(args.writers + args.readers)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    print(
+        f"  {os.environ['SQLITE_PROFILE']:12}"
+        f" reads/s {counts['reads'] / args.seconds:8.0f}"
+        f"  writes/s {counts['writes'] / args.seconds:8.0f}"
+        f"  errors {counts['errors']}"
+    )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--readers", type=int, default=8)
+    parser.add_argument("--writers", type=int, default=4)
+    parser.add_argument("--seconds", type=float, default=5)
+    parser.add_argument("--rows", type=int, default=1000)
+    parser.add_argument("--profile", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.profile:
+        run_profile(args)
+        return
+
+    print(f"{args.readers} readers, {args.writers} writers, {args.seconds}s per profile")
+    for profile in ("default", "performance"):
+        env = {
+            **os.environ,
+            "SQLITE_PROFILE": profile,
+            "SQLALCHEMY_DATABASE_URI": f"sqlite:///{tempfile.mkdtemp()}/bench.db",
+        }
+        subprocess.run(
+            [sys.executable, "-m", "benchmarks.sqlite_profile", *sys.argv[1:], "--profile", profile],
+            env=env,
+            check=True,
+        )
+
+
+if __name__ == "__main__":
+    main()
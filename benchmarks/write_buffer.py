@@ -0,0 +1,56 @@
+"""
+Compare expense creation throughput with and without the write buffer.
+
+    python -m benchmarks.write_buffer --clients 16 --requests 200
+
+Every client is a thread posting to POST /expenses/ through the test
+client, so the numbers include the full view but not HTTP parsing.
+"""
+import argparse
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from flask_jwt_extended import create_access_token
+
+from benchmarks.common import create_bench_app, seed
+
+
+def run(app, headers: dict, clients: int, requests: int) -> float:
+    def client_loop(_) -> None:
+        client = app.test_client()
+        for i in range(requests):
+            response = client.post(
+                "/expenses/", json={"title": f"bench {i}", "amount": 1}, headers=headers
+            )
+            assert response.status_code == 201, response.json
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(clients) as pool:
+        list(pool.map(client_loop, range(clients)))
+    return clients * requests / (time.perf_counter() - started)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--clients", type=int, default=16)
+    parser.add_argument("--requests", type=int, default=200)
+    args = parser.parse_args()
+
+    app = create_bench_app()
+    with app.app_context():
+        from app.db import db
+
+        db.create_all()
+        user_id = seed(users=1, rows=0)[0]
+        headers = {"Authorization": f"Bearer {create_access_token(identity=user_id)}"}
+
+    print(f"{args.clients} clients x {args.requests} creates")
+    for buffered in (False, True):
+        app.config["EXPENSE_WRITE_BUFFER"] = buffered
+        rate = run(app, headers, args.clients, args.requests)
+        label = "write buffer" if buffered else "commit per request"
+        print(f"  {label:20} {rate:8.0f} creates/s")
+
+
+if __name__ == "__main__":
+    main()
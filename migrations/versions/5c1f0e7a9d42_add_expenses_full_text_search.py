@@ -0,0 +1,64 @@
+"""Add expenses full-text search
+
+Revision ID: 5c1f0e7a9d42
+Revises: 2def4ed6e1f7
+Create Date: 2026-10-19 15:02:11.208734
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '5c1f0e7a9d42'
+down_revision = '2def4ed6e1f7'
+branch_labels = None
+depends_on = None
+
+
+SQLITE_UPGRADE = (
+    "CREATE VIRTUAL TABLE expenses_fts USING fts5("
+    "title, content='expenses', content_rowid='id', tokenize='trigram')",
+    "CREATE TRIGGER expenses_fts_ai AFTER INSERT ON expenses BEGIN "
+    "INSERT INTO expenses_fts(rowid, title) VALUES (new.id, new.title); END",
+    "CREATE TRIGGER expenses_fts_ad AFTER DELETE ON expenses BEGIN "
+    "INSERT INTO expenses_fts(expenses_fts, rowid, title) "
+    "VALUES ('delete', old.id, old.title); END",
+    "CREATE TRIGGER expenses_fts_au AFTER UPDATE OF title ON expenses BEGIN "
+    "INSERT INTO expenses_fts(expenses_fts, rowid, title) "
+    "VALUES ('delete', old.id, old.title); "
+    "INSERT INTO expenses_fts(rowid, title) VALUES (new.id, new.title); END",
+    "INSERT INTO expenses_fts(expenses_fts) VALUES ('rebuild')",
+)
+
+SQLITE_DOWNGRADE = (
+    "DROP TRIGGER expenses_fts_au",
+    "DROP TRIGGER expenses_fts_ad",
+    "DROP TRIGGER expenses_fts_ai",
+    "DROP TABLE expenses_fts",
+)
+
+
+def upgrade():
+    dialect = op.get_bind().dialect.name
+    if dialect == "sqlite":
+        for statement in SQLITE_UPGRADE:
+            op.execute(statement)
+    elif dialect == "postgresql":
+        op.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+        op.create_index(
+            'ix_expenses_title_trgm',
+            'expenses',
+            ['title'],
+            postgresql_using='gin',
+            postgresql_ops={'title': 'gin_trgm_ops'},
+        )
+
+
+def downgrade():
+    dialect = op.get_bind().dialect.name
+    if dialect == "sqlite":
+        for statement in SQLITE_DOWNGRADE:
+            op.execute(statement)
+    elif dialect == "postgresql":
+        op.drop_index('ix_expenses_title_trgm', table_name='expenses')
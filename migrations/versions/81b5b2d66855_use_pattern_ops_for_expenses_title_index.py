@@ -0,0 +1,35 @@
+"""Use pattern ops for the expenses title index
+
+Revision ID: 81b5b2d66855
+Revises: b09527961e98
+Create Date: 2026-10-19 16:05:12.418203
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '81b5b2d66855'
+down_revision = 'b09527961e98'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Only PostgreSQL has operator classes; SQLite already compares bytes.
+    if op.get_bind().dialect.name == "postgresql":
+        op.drop_index('ix_expenses_user_id_title', table_name='expenses')
+        op.create_index(
+            'ix_expenses_user_id_title',
+            'expenses',
+            ['user_id', 'title'],
+            unique=False,
+            postgresql_ops={'title': 'text_pattern_ops'},
+        )
+
+
+def downgrade():
+    if op.get_bind().dialect.name == "postgresql":
+        op.drop_index('ix_expenses_user_id_title', table_name='expenses')
+        op.create_index('ix_expenses_user_id_title', 'expenses', ['user_id', 'title'], unique=False)
@@ -5,11 +5,21 @@ from flask import Flask, url_for
 from flask_jwt_extended import create_access_token, create_refresh_token
 
 from app import create_app
-from app.db import db, User, Expenses
+from app.db import db, begin_transaction, session_on, User, Expenses
+from app.idempotency import store as idempotency_store
+from app.response_cache import response_cache
 from app.schemas import UserSchema
 
 
-@pytest.fixture(scope="module")
+def pytest_configure(config) -> None:
+    config.addinivalue_line(
+        "markers",
+        "commits: the test needs data committed for other connections or threads, "
+        "so tables are emptied afterwards instead of rolling back",
+    )
+
+
+@pytest.fixture(scope="session")
 def test_client() -> Flask.test_client:
     os.environ["CONFIG_TYPE"] = "app.config.TestingConfig"
     flask_app = create_app()
@@ -19,17 +29,27 @@ def test_client() -> Flask.test_client:
             yield testing_client
 
 
-@pytest.fixture(scope="module")
+@pytest.fixture(scope="session")
 def init_database(test_client) -> None:
-    db.create_all()
+    # Apps built with shard binds register extra metadata on the shared
+    # extension, so only the default bind is created and dropped here.
+    db.drop_all(bind_key=None)
+    db.create_all(bind_key=None)
     yield
-    db.drop_all()
+    db.drop_all(bind_key=None)
 
 
-@pytest.fixture
-def default_user(init_database) -> User:
-    user = User(username="test_username")
+@pytest.fixture(scope="session")
+def default_password_hash() -> str:
+    # Hashing is slow on purpose, so do it once rather than for every test.
+    user = User()
     user.set_password("test_password")
+    return user.password
+
+
+@pytest.fixture
+def default_user(init_database, default_password_hash) -> User:
+    user = User(username="test_username", password=default_password_hash)
 
     db.session.add(user)
     db.session.commit()
@@ -49,12 +69,29 @@ def default_expense(default_user) -> Expenses:
 
 
 @pytest.fixture(autouse=True)
-def clear_db(init_database) -> None:
-    yield
-    for table in reversed(db.metadata.sorted_tables):
-        db.session.execute(table.delete())
-    db.session.commit()
-    db.session.close()
+def isolate_db(request, init_database) -> None:
+    """
+    Run each test in a transaction that is rolled back afterwards.
+
+    The app's commits only release savepoints inside it. Tests marked
+    ``commits`` really commit and have every table emptied instead.
+    """
+    if request.node.get_closest_marker("commits"):
+        yield
+        for table in reversed(db.metadata.sorted_tables):
+            db.session.execute(table.delete())
+        db.session.commit()
+        db.session.close()
+    else:
+        db.session.close()
+        with db.engine.connect() as connection:
+            transaction = begin_transaction(connection)
+            with session_on(connection):
+                yield
+            transaction.rollback()
+
+    response_cache.clear()
+    idempotency_store.clear()
 
 
 @pytest.fixture
@@ -100,3 +137,48 @@ def create_expense_url() -> str:
 @pytest.fixture
 def expenses_url() -> str:
     return url_for("expenses.get_expenses")
+
+
+@pytest.fixture
+def totals_url() -> str:
+    return url_for("expenses.get_totals")
+
+
+@pytest.fixture
+def stats_url() -> str:
+    return url_for("expenses.get_stats")
+
+
+@pytest.fixture
+def rollup_url() -> str:
+    return url_for("expenses.get_rollup")
+
+
+@pytest.fixture
+def search_url() -> str:
+    return url_for("expenses.search_expenses")
+
+
+@pytest.fixture
+def breakdown_url() -> str:
+    return url_for("expenses.get_breakdown")
+
+
+@pytest.fixture
+def categories_url() -> str:
+    return url_for("categories.create_category")
+
+
+@pytest.fixture
+def logout_url() -> str:
+    return url_for("auth.logout")
+
+
+@pytest.fixture
+def batch_url() -> str:
+    return url_for("batch.batch")
+
+
+@pytest.fixture
+def import_url() -> str:
+    return url_for("expenses.import_expenses_csv")
@@ -0,0 +1,89 @@
+import json
+import logging
+
+import pytest
+from flask import g
+from flask_jwt_extended import create_access_token
+from sqlalchemy import text
+from sqlalchemy.exc import OperationalError
+
+from app import create_app
+from app.access_log import access_log
+from app.db import db, User
+
+
+class ListHandler(logging.Handler):
+    def __init__(self) -> None:
+        super().__init__()
+        self.lines = []
+
+    def emit(self, record: logging.LogRecord) -> None:
+        self.lines.append(json.loads(self.format(record)))
+
+
+@pytest.fixture
+def logged_app(tmp_path):
+    def make(sample_rate: float):
+        app = create_app({
+            "SQLALCHEMY_DATABASE_URI": f"sqlite:///{tmp_path}/access.db",
+            "ACCESS_LOG": True,
+            "ACCESS_LOG_SAMPLE_RATE": sample_rate,
+        })
+        handler = ListHandler()
+        handler.setFormatter(access_log.listener.handlers[0].formatter)
+        access_log.listener.handlers = (handler,)
+        return app, handler
+
+    yield make
+    access_log.close()
+
+
+@pytest.mark.commits
+class TestAccessLog:
+
+    def test_request_is_logged_as_json(self, logged_app) -> None:
+        app, handler = logged_app(sample_rate=1.0)
+        with app.app_context():
+            db.create_all(bind_key=None)
+            user = User(username="log_user", password="password")
+            db.session.add(user)
+            db.session.commit()
+            user_id = user.id
+            headers = {"Authorization": f"Bearer {create_access_token(identity=user_id)}"}
+
+            response = app.test_client().post(
+                "/expenses/", json={"title": "Taxi", "amount": 3}, headers=headers
+            )
+            access_log.close()
+
+        assert response.status_code == 201
+        [line] = handler.lines
+        assert line["method"] == "POST"
+        assert line["endpoint"] == "expenses.create_expense"
+        assert line["status"] == 201
+        assert line["user_id"] == str(user_id)
+        assert line["db_queries"] > 0
+        assert 0 < line["db_ms"] <= line["latency_ms"]
+
+    def test_successful_requests_are_sampled(self, logged_app) -> None:
+        app, handler = logged_app(sample_rate=0.0)
+        client = app.test_client()
+
+        client.get("/")
+        client.get("/expenses/")
+        access_log.close()
+
+        assert [line["status"] for line in handler.lines] == [401]
+
+    def test_failed_statement_is_timed(self, logged_app) -> None:
+        app, _ = logged_app(sample_rate=1.0)
+
+        with app.test_request_context("/"):
+            access_log._start()
+            with pytest.raises(OperationalError):
+                db.session.execute(text("SELECT * FROM missing_table"))
+            db.session.rollback()
+            db.session.execute(text("SELECT 1"))
+
+            assert g.access_db_queries == 2
+            assert db.session.connection().info["access_query_start"] == []
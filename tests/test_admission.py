@@ -0,0 +1,112 @@
+import datetime
+import threading
+import time
+
+import pytest
+
+from app import create_app
+
+
+@pytest.fixture
+def admitted_app(tmp_path):
+    def make(**config):
+        return create_app({
+            "SQLALCHEMY_DATABASE_URI": f"sqlite:///{tmp_path}/admission.db",
+            "ADMISSION_CONTROL": True,
+            "ADMISSION_MAX_REQUESTS": 1,
+            "ADMISSION_EXPENSIVE_MAX_REQUESTS": 1,
+            "ADMISSION_MAX_QUEUE": 0,
+            "ADMISSION_QUEUE_TIMEOUT": datetime.timedelta(milliseconds=50),
+            "SERVER_NAME": None,
+            **config,
+        })
+
+    return make
+
+
+class TestAdmissionControl:
+
+    def test_request_over_the_limit_is_shed(self, admitted_app) -> None:
+        app = admitted_app()
+        client = app.test_client()
+
+        # An unclosed response keeps its slot, like a body still streaming.
+        held = client.get("/")
+        response = client.get("/")
+
+        assert response.status_code == 503
+        assert response.headers["Retry-After"] == "1"
+        assert response.json["error"]["code"] == 503
+
+        held.close()
+        with client.get("/") as response:
+            assert response.status_code == 200
+        with app.app_context():
+            assert app.extensions["admission"].gates["default"].metrics() == {
+                "limit": 1, "in_flight": 0, "queued": 0, "admitted": 2, "rejected": 1,
+            }
+
+    def test_queued_request_fails_at_the_deadline(self, admitted_app) -> None:
+        app = admitted_app(ADMISSION_MAX_QUEUE=1)
+        client = app.test_client()
+
+        held = client.get("/")
+        started = time.perf_counter()
+        response = client.get("/")
+
+        assert response.status_code == 503
+        assert time.perf_counter() - started >= 0.05
+        held.close()
+
+    def test_queued_request_runs_when_a_slot_frees(self, admitted_app) -> None:
+        app = admitted_app(
+            ADMISSION_MAX_QUEUE=1, ADMISSION_QUEUE_TIMEOUT=datetime.timedelta(seconds=5)
+        )
+        client = app.test_client()
+        gate = app.extensions["admission"].gates["default"]
+        statuses = []
+
+        held = client.get("/")
+        waiter = threading.Thread(target=lambda: statuses.append(client.get("/").status_code))
+        waiter.start()
+        while gate.queued == 0:
+            time.sleep(0.001)
+
+        # The queue is full, so a third request is shed without waiting.
+        assert client.get("/").status_code == 503
+
+        held.close()
+        waiter.join()
+        assert statuses == [200]
+
+    def test_expensive_routes_have_their_own_pool(self, admitted_app) -> None:
+        app = admitted_app()
+        client = app.test_client()
+
+        held = client.get("/")
+        login = client.post("/auth/login", json={})
+        assert login.status_code != 503
+
+        assert client.post("/auth/login", json={}).status_code == 503
+        login.close()
+        held.close()
+
+    def test_metrics_are_exempt(self, admitted_app) -> None:
+        app = admitted_app()
+        client = app.test_client()
+
+        held = client.get("/")
+        response = client.get("/metrics")
+
+        assert response.status_code == 200
+        assert response.json["admission"]["default"]["in_flight"] == 1
+        held.close()
+
+    def test_each_app_has_its_own_gates(self, admitted_app) -> None:
+        first, second = admitted_app(), admitted_app()
+
+        held = first.test_client().get("/")
+
+        with second.test_client().get("/") as response:
+            assert response.status_code == 200
+        held.close()
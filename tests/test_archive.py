@@ -0,0 +1,127 @@
+import datetime
+import re
+
+from flask import url_for
+from sqlalchemy import event
+
+from app.archive import archive_command, archive_expenses
+from app.db import db, utcnow, Expenses, User, ExpensesArchive, UserExpenseStats
+from app.schemas import expense_out_schema
+from app.stats import get_user_stats, verify_stats
+
+
+def add_expenses(user, *ages_and_amounts) -> list[Expenses]:
+    now = utcnow()
+    expenses = [
+        Expenses(
+            user=user,
+            title=f"expense_{i}",
+            amount=amount,
+            spent_at=now - datetime.timedelta(days=age),
+        )
+        for i, (age, amount) in enumerate(ages_and_amounts)
+    ]
+    db.session.add_all(expenses)
+    db.session.commit()
+    get_user_stats(user.id)
+    return expenses
+
+
+class TestArchiveExpenses:
+
+    def test_moves_old_expenses_in_chunks(self, default_user) -> None:
+        add_expenses(default_user, (400, 5), (500, 7), (600, 9), (10, 1))
+        cutoff = utcnow() - datetime.timedelta(days=365)
+
+        assert archive_expenses(cutoff, chunk_size=2) == 3
+
+        assert [e.amount for e in db.session.query(Expenses)] == [1]
+        archived = db.session.query(ExpensesArchive).order_by(ExpensesArchive.id).all()
+        assert [a.amount for a in archived] == [5, 7, 9]
+        stats = db.session.get(UserExpenseStats, default_user.id)
+        assert (stats.count, stats.total, stats.max_amount) == (1, 1, 1)
+        assert verify_stats() == []
+
+    def test_subtracts_archived_amounts_from_each_users_stats(self, default_user) -> None:
+        other = User(username="archive_other", password="password")
+        add_expenses(default_user, (400, 1), (500, 9), (10, 4), (20, 6))
+        add_expenses(other, (400, 3), (10, 2))
+
+        assert archive_expenses(utcnow() - datetime.timedelta(days=365), chunk_size=1) == 3
+
+        stats = db.session.get(UserExpenseStats, default_user.id)
+        assert (stats.count, stats.total, stats.min_amount, stats.max_amount) == (2, 10, 4, 6)
+        stats = db.session.get(UserExpenseStats, other.id)
+        assert (stats.count, stats.total, stats.min_amount, stats.max_amount) == (1, 2, 2, 2)
+        assert verify_stats() == []
+
+    def test_never_scans_the_expenses_table(self, default_user) -> None:
+        add_expenses(default_user, (400, 5), (500, 7), (10, 1))
+        statements = []
+
+        def record(conn, cursor, statement, parameters, *args) -> None:
+            if re.search(r"\bexpenses\b", statement):
+                statements.append((statement, parameters))
+
+        event.listen(db.engine, "before_cursor_execute", record)
+        archive_expenses(utcnow() - datetime.timedelta(days=365), chunk_size=10)
+        event.remove(db.engine, "before_cursor_execute", record)
+
+        assert statements
+        connection = db.session.connection()
+        for statement, parameters in statements:
+            plan = connection.exec_driver_sql(f"EXPLAIN QUERY PLAN {statement}", parameters)
+            details = "\n".join(row[-1] for row in plan)
+            assert not re.search(r"SCAN expenses\b", details), statement
+            assert "GROUP BY" not in statement
+
+    def test_command(self, test_client, default_user) -> None:
+        add_expenses(default_user, (40, 5), (10, 1))
+        runner = test_client.application.test_cli_runner()
+
+        result = runner.invoke(archive_command, ["--days", "30"])
+
+        assert result.exit_code == 0
+        assert "Archived 1 expenses" in result.output
+        assert db.session.query(ExpensesArchive).count() == 1
+
+
+class TestListArchivedExpenses:
+
+    def test_archive_is_read_only_when_asked(
+            self,
+            test_client,
+            headers_with_access_token,
+            default_user
+    ) -> None:
+        hot, cold, *_ = add_expenses(default_user, (10, 3), (400, 5), (500, 1))
+        hot_id, cold_data = hot.id, expense_out_schema.dump(cold)
+        archive_expenses(utcnow() - datetime.timedelta(days=365), chunk_size=10)
+        url = url_for("expenses.get_expenses")
+
+        response = test_client.get(url, headers=headers_with_access_token)
+        assert [e["id"] for e in response.json] == [hot_id]
+        assert response.headers["X-Total-Count"] == "1"
+
+        response = test_client.get(
+            url,
+            query_string={"include_archived": "true", "sort": "-amount"},
+            headers=headers_with_access_token,
+        )
+        assert [e["amount"] for e in response.json] == [5.0, 3.0, 1.0]
+        assert response.json[0] == cold_data
+        assert response.headers["X-Total-Count"] == "3"
+
+    def test_archived_expense_is_gone_from_single_reads(
+            self,
+            test_client,
+            headers_with_access_token,
+            default_user
+    ) -> None:
+        pk = add_expenses(default_user, (400, 5))[0].id
+        url = url_for("expenses.get_expense", pk=pk)
+        assert test_client.get(url, headers=headers_with_access_token).status_code == 200
+
+        archive_expenses(utcnow() - datetime.timedelta(days=365), chunk_size=10)
+
+        assert test_client.get(url, headers=headers_with_access_token).status_code == 404
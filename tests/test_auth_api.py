@@ -1,6 +1,10 @@
+import datetime
+import time
+
 from flask import url_for
 
-from app.db import db, User
+from app.db import db, User, RevokedToken
+from app.jwt import DecodedTokenCache, TokenBlocklist, blocklist, token_cache
 from app.schemas import UserSchema
 
 user_schema = UserSchema()
@@ -110,3 +114,113 @@ class TestRefreshToken:
 
         assert response.status_code == 422
         assert response.json == expected_error
+
+
+class TestLogout:
+
+    def test_revoked_access_token_is_rejected(
+            self,
+            test_client,
+            logout_url,
+            expenses_url,
+            headers_with_access_token
+    ) -> None:
+        response = test_client.post(logout_url, headers=headers_with_access_token)
+        assert response.status_code == 200
+        assert response.json == {"msg": "Access token revoked"}
+
+        response = test_client.get(expenses_url, headers=headers_with_access_token)
+        assert response.status_code == 401
+        assert response.json == {"msg": "Token has been revoked"}
+
+    def test_revoked_refresh_token_is_rejected(
+            self,
+            test_client,
+            logout_url,
+            refresh_token_url,
+            default_user_refresh_token
+    ) -> None:
+        headers = {"Authorization": "Bearer " + default_user_refresh_token}
+
+        response = test_client.post(logout_url, headers=headers)
+        assert response.json == {"msg": "Refresh token revoked"}
+
+        response = test_client.post(refresh_token_url, headers=headers)
+        assert response.status_code == 401
+
+    def test_revocation_is_persisted_and_loaded(
+            self,
+            test_client,
+            logout_url,
+            expenses_url,
+            headers_with_access_token
+    ) -> None:
+        test_client.post(logout_url, headers=headers_with_access_token)
+        assert db.session.query(RevokedToken).count() == 1
+
+        blocklist.clear()
+        response = test_client.get(expenses_url, headers=headers_with_access_token)
+        assert response.status_code == 401
+
+    def test_expired_rows_are_deleted_on_revoke(
+            self,
+            test_client,
+            logout_url,
+            headers_with_access_token
+    ) -> None:
+        db.session.add(RevokedToken(jti="expired", expires_at=datetime.datetime(2000, 1, 1)))
+        db.session.commit()
+
+        test_client.post(logout_url, headers=headers_with_access_token)
+
+        assert db.session.get(RevokedToken, "expired") is None
+
+
+class TestTokenBlocklist:
+
+    def test_expired_entries_are_pruned(self) -> None:
+        tokens = TokenBlocklist()
+        tokens.add("live", time.time() + 60)
+        tokens.add("expired", time.time() - 1)
+
+        assert "live" in tokens
+        assert "expired" not in tokens
+        assert len(tokens) == 1
+
+
+class TestDecodedTokenCache:
+
+    def test_repeated_token_is_decoded_once(
+            self,
+            test_client,
+            expenses_url,
+            headers_with_access_token
+    ) -> None:
+        token_cache.clear()
+
+        for _ in range(3):
+            response = test_client.get(expenses_url, headers=headers_with_access_token)
+            assert response.status_code == 200
+
+        assert token_cache.metrics()["hits"] == 2
+        assert token_cache.metrics()["misses"] == 1
+
+    def test_expired_entries_are_not_returned(self) -> None:
+        tokens = DecodedTokenCache()
+        tokens.add("live", {"sub": "1", "exp": time.time() + 60}, leeway=0)
+        tokens.add("expired", {"sub": "1", "exp": time.time() - 1}, leeway=0)
+
+        assert tokens.get("live")["sub"] == "1"
+        assert tokens.get("expired") is None
+        assert len(tokens) == 1
+
+    def test_least_recently_used_token_is_evicted(self) -> None:
+        tokens = DecodedTokenCache(max_entries=2)
+        exp = time.time() + 60
+        tokens.add("a", {"exp": exp}, leeway=0)
+        tokens.add("b", {"exp": exp}, leeway=0)
+        tokens.get("a")
+        tokens.add("c", {"exp": exp}, leeway=0)
+
+        assert tokens.get("b") is None
+        assert tokens.get("a") is not None and tokens.get("c") is not None
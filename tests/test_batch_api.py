@@ -0,0 +1,163 @@
+import pytest
+
+from app.db import db, Expenses, UserExpenseStats
+
+pytestmark = pytest.mark.commits
+
+
+class TestBatch:
+
+    def test_auth_required(self, test_client, batch_url) -> None:
+        response = test_client.post(
+            batch_url, json={"requests": [{"method": "GET", "path": "/expenses/"}]}
+        )
+        assert response.status_code == 401
+
+    def test_runs_sub_requests_in_order(
+            self,
+            test_client,
+            headers_with_access_token,
+            batch_url,
+            default_expense
+    ) -> None:
+        payload = {
+            "requests": [
+                {"method": "POST", "path": "/expenses/", "body": {"title": "Taxi", "amount": 30}},
+                {"method": "PATCH", "path": f"/expenses/{default_expense.id}", "body": {"amount": 5}},
+                {"method": "GET", "path": "/expenses/?sort=amount"},
+                {"method": "DELETE", "path": f"/expenses/{default_expense.id}"},
+            ]
+        }
+
+        response = test_client.post(batch_url, json=payload, headers=headers_with_access_token)
+
+        assert response.status_code == 200
+        assert response.json["committed"] is True
+        statuses = [r["status"] for r in response.json["responses"]]
+        assert statuses == [201, 200, 200, 204]
+        assert [e["amount"] for e in response.json["responses"][2]["body"]] == [5.0, 30.0]
+
+        titles = [e.title for e in db.session.query(Expenses)]
+        assert titles == ["Taxi"]
+        assert db.session.get(UserExpenseStats, default_expense.user_id).count == 1
+
+    def test_failed_sub_request_is_rolled_back_alone(
+            self,
+            test_client,
+            headers_with_access_token,
+            batch_url
+    ) -> None:
+        payload = {
+            "requests": [
+                {"method": "POST", "path": "/expenses/", "body": {"title": "Taxi", "amount": 30}},
+                {"method": "POST", "path": "/expenses/", "body": {"title": "", "amount": 1}},
+                {"method": "GET", "path": "/expenses/999"},
+            ]
+        }
+
+        response = test_client.post(batch_url, json=payload, headers=headers_with_access_token)
+
+        assert response.json["committed"] is True
+        assert [r["status"] for r in response.json["responses"]] == [201, 400, 404]
+        assert response.json["responses"][2]["body"]["error"]["code"] == 404
+        assert db.session.query(Expenses).count() == 1
+
+    def test_atomic_batch_rolls_back_everything(
+            self,
+            test_client,
+            headers_with_access_token,
+            batch_url
+    ) -> None:
+        payload = {
+            "atomic": True,
+            "requests": [
+                {"method": "POST", "path": "/expenses/", "body": {"title": "Taxi", "amount": 30}},
+                {"method": "POST", "path": "/expenses/", "body": {"title": "", "amount": 1}},
+                {"method": "POST", "path": "/expenses/", "body": {"title": "Tea", "amount": 2}},
+            ]
+        }
+
+        response = test_client.post(batch_url, json=payload, headers=headers_with_access_token)
+
+        assert response.json["committed"] is False
+        assert [r["status"] for r in response.json["responses"]] == [201, 400]
+        assert db.session.query(Expenses).count() == 0
+
+    def test_only_expenses_routes(
+            self,
+            test_client,
+            headers_with_access_token,
+            batch_url
+    ) -> None:
+        payload = {"requests": [{"method": "POST", "path": "/auth/logout"}]}
+
+        response = test_client.post(batch_url, json=payload, headers=headers_with_access_token)
+
+        assert response.json["responses"][0]["status"] == 404
+
+    def test_batch_size_is_limited(
+            self,
+            test_client,
+            headers_with_access_token,
+            batch_url
+    ) -> None:
+        payload = {"requests": [{"method": "GET", "path": "/expenses/"}] * 51}
+
+        response = test_client.post(batch_url, json=payload, headers=headers_with_access_token)
+
+        assert response.status_code == 400
+        assert "requests" in response.json["errors"]
+
+    def test_rolled_back_batch_does_not_store_idempotent_responses(
+            self,
+            test_client,
+            headers_with_access_token,
+            batch_url,
+            expenses_url
+    ) -> None:
+        create = {
+            "method": "POST",
+            "path": "/expenses/",
+            "body": {"title": "Taxi", "amount": 30},
+            "headers": {"Idempotency-Key": "batch-1"},
+        }
+        payload = {"atomic": True, "requests": [create, {"method": "GET", "path": "/expenses/999999"}]}
+
+        response = test_client.post(batch_url, json=payload, headers=headers_with_access_token)
+        assert response.json["committed"] is False
+
+        retry = test_client.post(
+            expenses_url,
+            json=create["body"],
+            headers={**headers_with_access_token, "Idempotency-Key": "batch-1"},
+        )
+        assert retry.status_code == 201
+        assert "Idempotent-Replayed" not in retry.headers
+        assert db.session.query(Expenses).count() == 1
+
+    def test_committed_batch_stores_idempotent_responses(
+            self,
+            test_client,
+            headers_with_access_token,
+            batch_url,
+            expenses_url
+    ) -> None:
+        create = {
+            "method": "POST",
+            "path": "/expenses/",
+            "body": {"title": "Taxi", "amount": 30},
+            "headers": {"Idempotency-Key": "batch-2"},
+        }
+
+        response = test_client.post(
+            batch_url, json={"requests": [create, create]}, headers=headers_with_access_token
+        )
+        assert [r["status"] for r in response.json["responses"]] == [201, 201]
+
+        retry = test_client.post(
+            expenses_url,
+            json=create["body"],
+            headers={**headers_with_access_token, "Idempotency-Key": "batch-2"},
+        )
+        assert retry.headers["Idempotent-Replayed"] == "true"
+        assert db.session.query(Expenses).count() == 1
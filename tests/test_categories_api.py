@@ -0,0 +1,62 @@
+from app.db import db, Category, User
+
+
+class TestCreateCategory:
+
+    def test_auth_required(self, test_client, categories_url) -> None:
+        response = test_client.post(categories_url, json={"name": "Food"})
+        assert response.status_code == 401
+
+    def test_create_with_valid_data(
+            self,
+            test_client,
+            headers_with_access_token,
+            categories_url,
+            default_user
+    ) -> None:
+        response = test_client.post(
+            categories_url, json={"name": "Food"}, headers=headers_with_access_token
+        )
+        category = db.session.get(Category, response.json["id"])
+
+        assert response.status_code == 201
+        assert response.json == {"id": category.id, "name": "Food"}
+        assert category.user_id == default_user.id
+
+    def test_name_unique_per_user(
+            self,
+            test_client,
+            headers_with_access_token,
+            categories_url
+    ) -> None:
+        test_client.post(categories_url, json={"name": "Food"}, headers=headers_with_access_token)
+        response = test_client.post(
+            categories_url, json={"name": "Food"}, headers=headers_with_access_token
+        )
+
+        assert response.status_code == 400
+        assert response.json["errors"] == {"name": ["Category already exists"]}
+
+
+class TestGetCategories:
+
+    def test_return_only_own_categories(
+            self,
+            test_client,
+            headers_with_access_token,
+            categories_url,
+            default_user
+    ) -> None:
+        another_user = User(username="another_user")
+        another_user.set_password("test_password")
+        db.session.add_all([
+            Category(user=default_user, name="Taxi"),
+            Category(user=default_user, name="Food"),
+            Category(user=another_user, name="Rent"),
+        ])
+        db.session.commit()
+
+        response = test_client.get(categories_url, headers=headers_with_access_token)
+
+        assert response.status_code == 200
+        assert [c["name"] for c in response.json] == ["Food", "Taxi"]
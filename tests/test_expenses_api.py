@@ -1,9 +1,19 @@
+import datetime
+import re
+from array import array
+
 import pytest
 
 from flask import url_for
+from sqlalchemy import Float, event, func, select, type_coerce
+from sqlalchemy.dialects import postgresql
+from sqlalchemy.schema import CreateIndex
 
-from app.db import db, Expenses, User
+from app import distribution
+from app.db import db, Category, Expenses, User
+from app.expenses import build_expenses_query
 from app.schemas import expense_out_schema, expenses_out_schema
+from app.stats import refresh_user_stats
 
 GET_EXPENSE_VIEW_NAME = "expenses.get_expense"
 UPDATE_EXPENSE_VIEW_NAME = "expenses.update_expense"
@@ -13,8 +23,20 @@ DELETE_EXPENSE_VIEW_NAME = "expenses.delete_expense"
 def expense_sample(*, user: User, **kwargs) -> Expenses:
     title = kwargs.get("title", "test_title")
     amount = kwargs.get("amount", 1)
+    expense = Expenses(user=user, title=title, amount=amount)
+    if "spent_at" in kwargs:
+        expense.spent_at = kwargs["spent_at"]
+
+    return expense
+
 
-    return Expenses(user=user, title=title, amount=amount)
+def query_plan(query) -> str:
+    compiled = query.compile(db.engine)
+    params = tuple(compiled.params[name] for name in compiled.positiontup)
+    rows = db.session.connection().exec_driver_sql(
+        f"EXPLAIN QUERY PLAN {compiled}", params
+    )
+    return "\n".join(row[-1] for row in rows)
 
 
 class TestExpenseCreate:
@@ -123,6 +145,7 @@ class TestGetExpenses:
 
         assert response.status_code == 200
         assert response.json == expected_expenses
+        assert response.headers["X-Total-Count"] == "3"
 
 
 class TestGetExpense:
@@ -336,3 +359,687 @@ class TestDeleteExpense:
         assert db.session.get(Expenses, default_expense.id) is None
         assert response.status_code == 204
         assert response.json is None
+
+
+class TestOwnershipScopedStatements:
+
+    @pytest.fixture
+    def expense_statements(self) -> list[str]:
+        statements = []
+
+        def record(conn, cursor, statement, *args) -> None:
+            # Stats updates read expenses in subqueries; only count direct access.
+            if re.search(r"\bexpenses\b", statement) and "user_expense_stats" not in statement:
+                statements.append(statement)
+
+        event.listen(db.engine, "before_cursor_execute", record)
+        yield statements
+        event.remove(db.engine, "before_cursor_execute", record)
+
+    @pytest.mark.parametrize("method, body", [
+        ("GET", None),
+        ("PATCH", {"title": "Renamed"}),
+        ("PATCH", {"amount": 42}),
+        ("DELETE", None),
+    ])
+    def test_own_expense_takes_one_statement(
+            self,
+            test_client,
+            headers_with_access_token,
+            default_expense,
+            expense_statements,
+            method,
+            body
+    ) -> None:
+        url = f"/expenses/{default_expense.id}"
+        refresh_user_stats(default_expense.user_id)
+        db.session.commit()
+        expense_statements.clear()
+
+        response = test_client.open(url, method=method, json=body, headers=headers_with_access_token)
+
+        assert response.status_code in (200, 204)
+        assert len(expense_statements) == 1
+
+    @pytest.mark.parametrize("method, body", [
+        ("GET", None),
+        ("PATCH", {"title": "Renamed"}),
+        ("PATCH", {"amount": -1}),
+        ("DELETE", None),
+    ])
+    def test_missing_expense_is_not_found(
+            self,
+            test_client,
+            headers_with_access_token,
+            method,
+            body
+    ) -> None:
+        response = test_client.open(
+            "/expenses/999999", method=method, json=body, headers=headers_with_access_token
+        )
+
+        assert response.status_code == 404
+        assert response.json["error"]["description"] == "Expense not found"
+
+    def test_update_returns_the_stored_row(
+            self,
+            test_client,
+            headers_with_access_token,
+            default_expense
+    ) -> None:
+        url = url_for(UPDATE_EXPENSE_VIEW_NAME, pk=default_expense.id)
+
+        response = test_client.patch(url, json={"amount": 42.5}, headers=headers_with_access_token)
+
+        db.session.refresh(default_expense)
+        assert response.json == expense_out_schema.dump(default_expense)
+        assert response.json["amount"] == 42.5
+
+
+class TestExpenseTotals:
+    def test_auth_required(
+            self,
+            test_client,
+            headers_with_access_token,
+            totals_url
+    ) -> None:
+        response = test_client.get(totals_url)
+        assert response.status_code == 401
+
+        response = test_client.get(totals_url, headers=headers_with_access_token)
+        assert response.status_code == 200
+
+    def test_totals_without_expenses(
+            self,
+            test_client,
+            headers_with_access_token,
+            totals_url
+    ) -> None:
+        response = test_client.get(totals_url, headers=headers_with_access_token)
+
+        assert response.json == {"count": 0, "total": 0.0, "min": None, "max": None}
+
+    def test_totals_follow_create_update_delete(
+            self,
+            test_client,
+            headers_with_access_token,
+            create_expense_url,
+            totals_url
+    ) -> None:
+        ids = []
+        for amount in (10, 20, 30):
+            response = test_client.post(
+                create_expense_url,
+                json={"title": "Test Expense", "amount": amount},
+                headers=headers_with_access_token
+            )
+            ids.append(response.json["id"])
+
+        response = test_client.get(totals_url, headers=headers_with_access_token)
+        assert response.json == {"count": 3, "total": 60.0, "min": 10.0, "max": 30.0}
+
+        test_client.patch(
+            url_for(UPDATE_EXPENSE_VIEW_NAME, pk=ids[2]),
+            json={"amount": 5},
+            headers=headers_with_access_token
+        )
+        response = test_client.get(totals_url, headers=headers_with_access_token)
+        assert response.json == {"count": 3, "total": 35.0, "min": 5.0, "max": 20.0}
+
+        test_client.delete(
+            url_for(DELETE_EXPENSE_VIEW_NAME, pk=ids[2]),
+            headers=headers_with_access_token
+        )
+        response = test_client.get(totals_url, headers=headers_with_access_token)
+        assert response.json == {"count": 2, "total": 30.0, "min": 10.0, "max": 20.0}
+
+
+class TestExpenseStats:
+    def test_auth_required(self, test_client, stats_url) -> None:
+        response = test_client.get(stats_url)
+        assert response.status_code == 401
+
+    def test_stats_without_expenses(
+            self,
+            test_client,
+            headers_with_access_token,
+            stats_url
+    ) -> None:
+        response = test_client.get(stats_url, headers=headers_with_access_token)
+
+        assert response.json["count"] == 0
+        assert response.json["median"] is None
+        assert response.json["histogram"] == []
+
+    def test_percentiles_and_histogram(
+            self,
+            test_client,
+            headers_with_access_token,
+            default_user,
+            stats_url
+    ) -> None:
+        for amount in (40, 10, 30, 20):
+            db.session.add(expense_sample(user=default_user, amount=amount))
+        db.session.commit()
+
+        response = test_client.get(
+            stats_url, query_string={"bins": 3}, headers=headers_with_access_token
+        )
+
+        assert response.json == {
+            "count": 4, "min": 10.0, "max": 40.0, "mean": 25.0, "std": 11.1803,
+            "median": 25.0, "p90": 37.0, "p99": 39.7,
+            "histogram": [
+                {"start": 10.0, "end": 20.0, "count": 1},
+                {"start": 20.0, "end": 30.0, "count": 1},
+                {"start": 30.0, "end": 40.0, "count": 2},
+            ],
+        }
+
+    def test_filter_by_spent_at(
+            self,
+            test_client,
+            headers_with_access_token,
+            default_user,
+            stats_url
+    ) -> None:
+        db.session.add_all([
+            expense_sample(user=default_user, amount=5, spent_at=datetime.datetime(2024, 6, 1)),
+            expense_sample(user=default_user, amount=7, spent_at=datetime.datetime(2025, 6, 1)),
+        ])
+        db.session.commit()
+
+        response = test_client.get(
+            stats_url, query_string={"from": "2025-01-01T00:00:00"}, headers=headers_with_access_token
+        )
+
+        assert response.json["count"] == 1
+        assert response.json["histogram"] == [{"start": 7.0, "end": 7.0, "count": 1}]
+
+    def test_invalid_bins(
+            self,
+            test_client,
+            headers_with_access_token,
+            stats_url
+    ) -> None:
+        response = test_client.get(
+            stats_url, query_string={"bins": 0}, headers=headers_with_access_token
+        )
+
+        assert response.status_code == 400
+        assert "bins" in response.json["errors"]
+
+    def test_amounts_query_uses_covering_index(self, default_user) -> None:
+        query = (
+            select(type_coerce(Expenses.amount, Float))
+            .where(Expenses.user_id == default_user.id)
+            .order_by(Expenses.amount)
+        )
+        plan = query_plan(query)
+
+        assert "USING COVERING INDEX ix_expenses_user_id_amount" in plan
+        assert "TEMP B-TREE" not in plan
+
+    def test_summary_matches_without_numpy(self, monkeypatch) -> None:
+        amounts = array("d", sorted([3.5, 1.25, 9.0, 4.75, 4.75, 2.0]))
+        expected = distribution.summarize(amounts, bins=4)
+        monkeypatch.setattr(distribution, "numpy", None)
+
+        assert distribution.summarize(amounts, bins=4) == expected
+        assert sum(b["count"] for b in expected["histogram"]) == 6
+
+
+class TestSpentAtFilter:
+    def test_filter_by_spent_at_range(
+            self,
+            test_client,
+            headers_with_access_token,
+            expenses_url,
+            default_user
+    ) -> None:
+        for day in (1, 15, 28):
+            db.session.add(expense_sample(
+                user=default_user, spent_at=datetime.datetime(2025, 2, day)
+            ))
+        db.session.commit()
+
+        response = test_client.get(
+            expenses_url,
+            query_string={"from": "2025-02-10T00:00:00", "to": "2025-02-28T00:00:00"},
+            headers=headers_with_access_token
+        )
+
+        assert response.status_code == 200
+        assert [e["spent_at"] for e in response.json] == ["2025-02-15T00:00:00"]
+        assert response.headers["X-Total-Count"] == "1"
+
+    def test_invalid_range(
+            self,
+            test_client,
+            headers_with_access_token,
+            expenses_url
+    ) -> None:
+        response = test_client.get(
+            expenses_url,
+            query_string={"from": "yesterday"},
+            headers=headers_with_access_token
+        )
+
+        assert response.status_code == 400
+        assert "from" in response.json["errors"]
+
+
+class TestExpenseRollup:
+    @pytest.mark.parametrize(
+        "bucket, expected",
+        [
+            ("day", [("2025-01-31", 1, 10.0), ("2025-02-03", 2, 50.0), ("2025-02-09", 1, 5.0)]),
+            ("week", [("2025-01-27", 1, 10.0), ("2025-02-03", 3, 55.0)]),
+            ("month", [("2025-01-01", 1, 10.0), ("2025-02-01", 3, 55.0)]),
+        ]
+    )
+    def test_rollup_buckets(
+            self,
+            test_client,
+            headers_with_access_token,
+            rollup_url,
+            default_user,
+            bucket,
+            expected
+    ) -> None:
+        samples = [
+            (datetime.datetime(2025, 1, 31, 12), 10),
+            (datetime.datetime(2025, 2, 3, 8), 20),
+            (datetime.datetime(2025, 2, 3, 23), 30),
+            (datetime.datetime(2025, 2, 9, 23), 5),
+        ]
+        for spent_at, amount in samples:
+            db.session.add(expense_sample(user=default_user, spent_at=spent_at, amount=amount))
+        db.session.commit()
+
+        response = test_client.get(
+            rollup_url,
+            query_string={"bucket": bucket},
+            headers=headers_with_access_token
+        )
+
+        assert response.status_code == 200
+        assert response.json == [
+            {"bucket": b, "count": count, "total": total}
+            for b, count, total in expected
+        ]
+
+    def test_invalid_bucket(
+            self,
+            test_client,
+            headers_with_access_token,
+            rollup_url
+    ) -> None:
+        response = test_client.get(
+            rollup_url,
+            query_string={"bucket": "year"},
+            headers=headers_with_access_token
+        )
+
+        assert response.status_code == 400
+
+
+class TestSearchExpenses:
+    def test_auth_required(self, test_client, search_url) -> None:
+        response = test_client.get(search_url, query_string={"q": "coffee"})
+        assert response.status_code == 401
+
+    def test_search_matches_substring_of_own_expenses(
+            self,
+            test_client,
+            headers_with_access_token,
+            search_url,
+            default_user
+    ) -> None:
+        for title in ("Morning coffee", "Coffee beans", "Groceries"):
+            db.session.add(expense_sample(user=default_user, title=title))
+
+        another_user = User(username="another_user")
+        another_user.set_password("test_password")
+        db.session.add(expense_sample(user=another_user, title="Coffee"))
+        db.session.commit()
+
+        response = test_client.get(
+            search_url,
+            query_string={"q": "offe"},
+            headers=headers_with_access_token
+        )
+
+        assert response.status_code == 200
+        assert sorted(e["title"] for e in response.json) == ["Coffee beans", "Morning coffee"]
+
+    def test_search_follows_updates_and_deletes(
+            self,
+            test_client,
+            headers_with_access_token,
+            search_url,
+            default_expense
+    ) -> None:
+        test_client.patch(
+            url_for(UPDATE_EXPENSE_VIEW_NAME, pk=default_expense.id),
+            json={"title": "Train ticket"},
+            headers=headers_with_access_token
+        )
+        response = test_client.get(
+            search_url, query_string={"q": "ticket"}, headers=headers_with_access_token
+        )
+        assert [e["id"] for e in response.json] == [default_expense.id]
+
+        test_client.delete(
+            url_for(DELETE_EXPENSE_VIEW_NAME, pk=default_expense.id),
+            headers=headers_with_access_token
+        )
+        response = test_client.get(
+            search_url, query_string={"q": "ticket"}, headers=headers_with_access_token
+        )
+        assert response.json == []
+
+    def test_search_is_paginated(
+            self,
+            test_client,
+            headers_with_access_token,
+            search_url,
+            default_user
+    ) -> None:
+        for _ in range(5):
+            db.session.add(expense_sample(user=default_user, title="Lunch"))
+        db.session.commit()
+
+        response = test_client.get(
+            search_url,
+            query_string={"q": "lunch", "page": 2, "per_page": 2},
+            headers=headers_with_access_token
+        )
+
+        assert response.status_code == 200
+        assert len(response.json) == 2
+
+    def test_query_too_short(
+            self,
+            test_client,
+            headers_with_access_token,
+            search_url
+    ) -> None:
+        response = test_client.get(
+            search_url, query_string={"q": "ab"}, headers=headers_with_access_token
+        )
+
+        assert response.status_code == 400
+        assert "q" in response.json["errors"]
+
+
+class TestExpenseListFilters:
+    @pytest.fixture
+    def expenses(self, default_user) -> list[Expenses]:
+        samples = [("Taxi", 30), ("Tea", 5), ("Lunch", 12), ("Travel", 120)]
+        expenses = [
+            expense_sample(user=default_user, title=title, amount=amount)
+            for title, amount in samples
+        ]
+        db.session.add_all(expenses)
+        db.session.commit()
+        return expenses
+
+    @pytest.mark.parametrize(
+        "params, expected_titles",
+        [
+            ({"amount_min": 10, "amount_max": 100}, ["Taxi", "Lunch"]),
+            ({"title_prefix": "T"}, ["Taxi", "Tea", "Travel"]),
+            ({"title_prefix": "Ta"}, ["Taxi"]),
+            ({"sort": "amount"}, ["Tea", "Lunch", "Taxi", "Travel"]),
+            ({"sort": "-amount", "title_prefix": "T"}, ["Travel", "Taxi", "Tea"]),
+        ]
+    )
+    def test_filters_and_sort(
+            self,
+            test_client,
+            headers_with_access_token,
+            expenses_url,
+            expenses,
+            params,
+            expected_titles
+    ) -> None:
+        response = test_client.get(
+            expenses_url, query_string=params, headers=headers_with_access_token
+        )
+
+        assert response.status_code == 200
+        assert [e["title"] for e in response.json] == expected_titles
+        assert response.headers["X-Total-Count"] == str(len(expected_titles))
+
+    @pytest.mark.parametrize(
+        "prefix, expected_titles",
+        [
+            ("\U0010ffff", ["\U0010ffff", "\U0010ffffx"]),
+            ("x\U0010ffff", ["x\U0010ffff"]),
+            ("\ud7ff", ["\ud7ffa"]),
+        ]
+    )
+    def test_title_prefix_at_the_end_of_a_code_point_range(
+            self,
+            test_client,
+            headers_with_access_token,
+            expenses_url,
+            default_user,
+            prefix,
+            expected_titles
+    ) -> None:
+        titles = ["\U0010ffff", "\U0010ffffx", "x\U0010ffff", "y", "\ud7ffa", "\ue000"]
+        db.session.add_all(expense_sample(user=default_user, title=title) for title in titles)
+        db.session.commit()
+
+        response = test_client.get(
+            expenses_url, query_string={"title_prefix": prefix}, headers=headers_with_access_token
+        )
+
+        assert response.status_code == 200
+        assert [e["title"] for e in response.json] == expected_titles
+
+    def test_title_index_serves_prefix_likes_on_postgresql(self) -> None:
+        [index] = [i for i in Expenses.__table__.indexes if i.name == "ix_expenses_user_id_title"]
+
+        ddl = str(CreateIndex(index).compile(dialect=postgresql.dialect()))
+
+        assert "title text_pattern_ops" in ddl
+
+    def test_unindexed_sort_is_rejected(
+            self,
+            test_client,
+            headers_with_access_token,
+            expenses_url
+    ) -> None:
+        response = test_client.get(
+            expenses_url, query_string={"sort": "title"}, headers=headers_with_access_token
+        )
+
+        assert response.status_code == 400
+        assert "sort" in response.json["errors"]
+
+    @pytest.mark.parametrize(
+        "filters, index",
+        [
+            ({"sort": "id"}, "ix_expenses_user_id"),
+            ({"sort": "amount"}, "ix_expenses_user_id_amount"),
+            ({"sort": "-amount"}, "ix_expenses_user_id_amount"),
+            ({"amount_min": 1, "amount_max": 10, "sort": "amount"}, "ix_expenses_user_id_amount"),
+            ({"title_prefix": "Ta"}, "ix_expenses_user_id_title"),
+            ({"spent_from": datetime.datetime(2025, 1, 1)}, "ix_expenses_user_id_spent_at"),
+        ]
+    )
+    def test_query_uses_index(self, default_user, filters, index) -> None:
+        plan = query_plan(build_expenses_query(default_user.id, filters))
+
+        assert "SCAN expenses" not in plan
+        assert f"USING INDEX {index}" in plan
+        if "sort" in filters:
+            assert "TEMP B-TREE" not in plan
+
+
+class TestExpenseBreakdown:
+    def test_breakdown_per_category(
+            self,
+            test_client,
+            headers_with_access_token,
+            breakdown_url,
+            default_user
+    ) -> None:
+        food = Category(user=default_user, name="Food")
+        taxi = Category(user=default_user, name="Taxi")
+        db.session.add_all([food, taxi])
+        db.session.flush()
+
+        for category, amount in ((food, 10), (food, 5), (taxi, 20), (None, 1)):
+            expense = expense_sample(user=default_user, amount=amount)
+            expense.category = category
+            db.session.add(expense)
+        db.session.commit()
+
+        response = test_client.get(breakdown_url, headers=headers_with_access_token)
+
+        assert response.status_code == 200
+        assert response.json == [
+            {"category_id": None, "category": None, "count": 1, "total": 1.0},
+            {"category_id": food.id, "category": "Food", "count": 2, "total": 15.0},
+            {"category_id": taxi.id, "category": "Taxi", "count": 1, "total": 20.0},
+        ]
+
+    def test_breakdown_uses_category_index(self, default_user) -> None:
+        plan = query_plan(
+            select(Expenses.category_id, func.count(Expenses.id))
+            .where(Expenses.user_id == default_user.id)
+            .group_by(Expenses.category_id)
+        )
+
+        assert "USING COVERING INDEX ix_expenses_user_id_category_id" in plan
+        assert "TEMP B-TREE" not in plan
+
+    def test_create_with_foreign_category(
+            self,
+            test_client,
+            headers_with_access_token,
+            create_expense_url
+    ) -> None:
+        another_user = User(username="another_user")
+        another_user.set_password("test_password")
+        category = Category(user=another_user, name="Food")
+        db.session.add(category)
+        db.session.commit()
+
+        response = test_client.post(
+            create_expense_url,
+            json={"title": "Test Expense", "amount": 1, "category_id": category.id},
+            headers=headers_with_access_token
+        )
+
+        assert response.status_code == 400
+        assert response.json["errors"] == {"category_id": ["Category not found"]}
+
+
+class TestImportExpenses:
+
+    @staticmethod
+    def post_csv(test_client, url, headers, body: str):
+        return test_client.post(
+            url,
+            data=body.encode(),
+            headers={**headers, "Content-Type": "text/csv"},
+        )
+
+    def test_auth_required(self, test_client, import_url) -> None:
+        response = test_client.post(
+            import_url, data=b"title,amount\n", headers={"Content-Type": "text/csv"}
+        )
+        assert response.status_code == 401
+
+    def test_requires_csv_content_type(
+            self,
+            test_client,
+            headers_with_access_token,
+            import_url
+    ) -> None:
+        response = test_client.post(
+            import_url, json={"title": "Taxi"}, headers=headers_with_access_token
+        )
+        assert response.status_code == 415
+
+    def test_missing_columns(
+            self,
+            test_client,
+            headers_with_access_token,
+            import_url
+    ) -> None:
+        response = self.post_csv(
+            test_client, import_url, headers_with_access_token, "title,price\nTaxi,1\n"
+        )
+
+        assert response.status_code == 400
+        assert response.json["errors"] == {"file": ["Missing columns: amount"]}
+
+    def test_import_valid_rows_and_report_invalid_ones(
+            self,
+            test_client,
+            headers_with_access_token,
+            import_url,
+            totals_url,
+            default_user
+    ) -> None:
+        another_user = User(username="another_user")
+        another_user.set_password("test_password")
+        own = Category(user=default_user, name="Food")
+        foreign = Category(user=another_user, name="Rent")
+        db.session.add_all([own, foreign])
+        db.session.commit()
+
+        body = (
+            "title,amount,spent_at,category_id\n"
+            "Taxi,10.50,2024-01-02T10:00:00,\n"
+            f"Lunch,5,,{own.id}\n"
+            "Broken,abc,,\n"
+            f"Rent,100,,{foreign.id}\n"
+        )
+        response = self.post_csv(test_client, import_url, headers_with_access_token, body)
+
+        assert response.status_code == 200
+        assert response.json == {
+            "imported": 2,
+            "failed": 2,
+            "errors": [
+                {"line": 4, "errors": {"amount": ["Not a valid number."]}},
+                {"line": 5, "errors": {"category_id": ["Category not found"]}},
+            ],
+        }
+        expenses = db.session.scalars(select(Expenses).order_by(Expenses.id)).all()
+        assert [(e.title, e.user_id, e.category_id) for e in expenses] == [
+            ("Taxi", default_user.id, None),
+            ("Lunch", default_user.id, own.id),
+        ]
+        assert expenses[0].spent_at == datetime.datetime(2024, 1, 2, 10)
+
+        totals = test_client.get(totals_url, headers=headers_with_access_token)
+        assert totals.json == {"count": 2, "total": 15.5, "min": 5.0, "max": 10.5}
+
+    def test_import_in_chunks_and_cap_errors(
+            self,
+            test_client,
+            headers_with_access_token,
+            import_url
+    ) -> None:
+        config = test_client.application.config
+        config["IMPORT_CHUNK_SIZE"], config["IMPORT_MAX_ERRORS"] = 2, 1
+        try:
+            body = "title,amount\n" + "Taxi,1\n" * 5 + ",1\n" * 3
+            response = self.post_csv(test_client, import_url, headers_with_access_token, body)
+        finally:
+            config["IMPORT_CHUNK_SIZE"], config["IMPORT_MAX_ERRORS"] = 1000, 100
+
+        assert response.json["imported"] == 5
+        assert response.json["failed"] == 3
+        assert response.json["errors"] == [
+            {"line": 7, "errors": {"title": ["Missing data for required field."]}},
+        ]
+        assert db.session.scalar(select(func.count(Expenses.id))) == 5
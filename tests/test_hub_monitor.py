@@ -0,0 +1,96 @@
+import datetime
+import importlib.util
+import logging
+import time
+
+import pytest
+
+from app import create_app
+from app.hub_monitor import HubMonitor, OUTSIDE_REQUEST, hub_monitor
+
+HAS_GEVENT = importlib.util.find_spec("gevent") is not None
+
+
+class Greenlet:
+    """Stands in for a greenlet: hashable and weakly referenceable."""
+
+
+class Blocked:
+    def __init__(self, greenlet, blocking_time: float) -> None:
+        self.greenlet = greenlet
+        self.blocking_time = blocking_time
+        self.info = ["=== Stack of blocked greenlet ===", '  File "app/auth.py", line 80']
+
+
+@pytest.fixture
+def monitor(test_client) -> HubMonitor:
+    monitor = HubMonitor()
+    monitor._blocked_event = Blocked
+    return monitor
+
+
+class TestHubMonitor:
+
+    def test_block_is_attributed_to_the_endpoint(self, test_client, monitor, caplog) -> None:
+        greenlet = Greenlet()
+        monitor._getcurrent = lambda: greenlet
+
+        with test_client.application.test_request_context("/auth/login", method="POST"):
+            monitor._start()
+            with caplog.at_level(logging.WARNING, logger="app.hub"):
+                monitor._on_event(Blocked(greenlet, 0.25))
+                monitor._on_event(Blocked(greenlet, 0.05))
+            monitor._finish(None)
+        monitor._on_event(Blocked(greenlet, 0.1))
+
+        assert monitor.metrics() == {
+            "blocks": 3,
+            "endpoints": {
+                "auth.login": {"count": 2, "total_ms": 300.0, "max_ms": 250.0},
+                OUTSIDE_REQUEST: {"count": 1, "total_ms": 100.0, "max_ms": 100.0},
+            },
+        }
+        assert "Hub blocked for 250.0 ms in auth.login" in caplog.text
+        assert "app/auth.py" in caplog.text
+
+    def test_nested_request_keeps_the_outer_endpoint(self, test_client, monitor) -> None:
+        greenlet = Greenlet()
+        monitor._getcurrent = lambda: greenlet
+        app = test_client.application
+
+        with app.test_request_context("/batch", method="POST"):
+            monitor._start()
+            with app.test_request_context("/expenses/", method="GET"):
+                monitor._start()
+                monitor._finish(None)
+            monitor._on_event(Blocked(greenlet, 0.2))
+            monitor._finish(None)
+
+        assert list(monitor.metrics()["endpoints"]) == ["batch.batch"]
+
+    @pytest.mark.skipif(HAS_GEVENT, reason="gevent is installed")
+    def test_requires_gevent(self, tmp_path) -> None:
+        with pytest.raises(RuntimeError, match="needs gevent"):
+            create_app({
+                "SQLALCHEMY_DATABASE_URI": f"sqlite:///{tmp_path}/hub.db",
+                "HUB_MONITOR": True,
+            })
+
+    @pytest.mark.skipif(not HAS_GEVENT, reason="needs gevent")
+    def test_detects_a_blocked_hub(self, tmp_path) -> None:
+        import gevent
+        from gevent import monkey
+
+        create_app({
+            "SQLALCHEMY_DATABASE_URI": f"sqlite:///{tmp_path}/hub.db",
+            "HUB_MONITOR": True,
+            "HUB_MONITOR_THRESHOLD": datetime.timedelta(milliseconds=50),
+        })
+        blocks = hub_monitor.blocks
+
+        gevent.spawn(monkey.get_original("time", "sleep"), 0.3).join()
+        deadline = time.monotonic() + 2
+        while hub_monitor.blocks == blocks and time.monotonic() < deadline:
+            gevent.sleep(0.05)
+
+        assert hub_monitor.blocks > blocks
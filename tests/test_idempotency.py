@@ -0,0 +1,146 @@
+import threading
+
+import pytest
+
+from app.db import db, Expenses, IdempotencyKey
+from app.idempotency import DatabaseBackend, MemoryBackend
+
+
+class TestIdempotentCreateExpense:
+
+    def test_replay_returns_first_response_without_insert(
+            self,
+            test_client,
+            headers_with_access_token,
+            create_expense_url
+    ) -> None:
+        headers = {**headers_with_access_token, "Idempotency-Key": "create-1"}
+        payload = {"title": "Test Expense", "amount": 100}
+
+        first = test_client.post(create_expense_url, json=payload, headers=headers)
+        second = test_client.post(create_expense_url, json=payload, headers=headers)
+
+        assert first.status_code == second.status_code == 201
+        assert first.json == second.json
+        assert second.headers["Idempotent-Replayed"] == "true"
+        assert db.session.query(Expenses).count() == 1
+
+    def test_without_key_every_request_inserts(
+            self,
+            test_client,
+            headers_with_access_token,
+            create_expense_url
+    ) -> None:
+        payload = {"title": "Test Expense", "amount": 100}
+
+        test_client.post(create_expense_url, json=payload, headers=headers_with_access_token)
+        test_client.post(create_expense_url, json=payload, headers=headers_with_access_token)
+
+        assert db.session.query(Expenses).count() == 2
+
+    def test_key_reused_with_different_body(
+            self,
+            test_client,
+            headers_with_access_token,
+            create_expense_url
+    ) -> None:
+        headers = {**headers_with_access_token, "Idempotency-Key": "create-2"}
+
+        test_client.post(create_expense_url, json={"title": "A", "amount": 1}, headers=headers)
+        response = test_client.post(
+            create_expense_url, json={"title": "B", "amount": 1}, headers=headers
+        )
+
+        assert response.status_code == 422
+        assert response.json["error"]["code"] == 422
+
+    def test_failed_request_can_be_retried(
+            self,
+            test_client,
+            headers_with_access_token,
+            create_expense_url
+    ) -> None:
+        headers = {**headers_with_access_token, "Idempotency-Key": "create-3"}
+        payload = {"title": "", "amount": 1}
+
+        assert test_client.post(create_expense_url, json=payload, headers=headers).status_code == 400
+        assert test_client.post(create_expense_url, json=payload, headers=headers).status_code == 400
+
+
+class TestIdempotentLogin:
+
+    def test_login_replay(self, test_client, default_user, login_url) -> None:
+        headers = {"Idempotency-Key": "login-1"}
+        payload = {"username": default_user.username, "password": "test_password"}
+
+        first = test_client.post(login_url, json=payload, headers=headers)
+        second = test_client.post(login_url, json=payload, headers=headers)
+
+        assert first.json == second.json
+
+
+class TestMemoryBackend:
+
+    def test_in_flight_duplicate_waits_for_first_result(self) -> None:
+        backend = MemoryBackend()
+        assert backend.claim("key", "body") == (True, "body")
+
+        results = []
+
+        def duplicate() -> None:
+            results.append((backend.claim("key", "body"), backend.wait("key", 5)))
+
+        thread = threading.Thread(target=duplicate)
+        thread.start()
+        backend.complete("key", (201, b"{}", "application/json"))
+        thread.join()
+
+        assert results == [((False, "body"), (True, (201, b"{}", "application/json")))]
+
+    def test_store_is_bounded(self) -> None:
+        backend = MemoryBackend(max_keys=2)
+        for i in range(5):
+            backend.claim(str(i), "body")
+            backend.complete(str(i), (201, b"{}", "application/json"))
+
+        assert len(backend) == 2
+
+    def test_in_flight_claims_are_not_evicted(self) -> None:
+        backend = MemoryBackend(max_keys=2)
+        backend.claim("running", "body")
+        for i in range(3):
+            backend.claim(str(i), "body")
+            backend.complete(str(i), (201, b"{}", "application/json"))
+
+        assert len(backend) == 2
+        assert backend.claim("running", "body") == (False, "body")
+
+    def test_expired_keys_are_reclaimed(self) -> None:
+        backend = MemoryBackend(ttl=-1)
+        backend.claim("key", "body")
+
+        assert backend.claim("key", "other") == (True, "other")
+
+
+@pytest.mark.commits
+class TestDatabaseBackend:
+
+    def test_claims_are_shared_through_the_table(self, test_client) -> None:
+        first, second = DatabaseBackend(), DatabaseBackend()
+
+        assert first.claim("key", "body") == (True, "body")
+        assert second.claim("key", "other") == (False, "body")
+        assert second.wait("key", 0) == (False, None)
+
+        first.complete("key", (201, b"{}", "application/json"))
+        assert second.wait("key", 0) == (True, (201, b"{}", "application/json"))
+
+        first.release("key")
+        assert second.wait("key", 0) == (True, None)
+        assert second.claim("key", "other") == (True, "other")
+
+    def test_expired_keys_are_reclaimed(self, test_client) -> None:
+        DatabaseBackend(ttl=-1).claim("key", "body")
+
+        assert DatabaseBackend().claim("key", "other") == (True, "other")
+        assert db.session.query(IdempotencyKey).count() == 1
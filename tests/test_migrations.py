@@ -0,0 +1,27 @@
+from flask_migrate import downgrade, upgrade
+from sqlalchemy import event
+
+from app import create_app
+from app.db import db
+
+
+class TestMigrations:
+
+    def test_tables_are_rebuilt_without_foreign_keys(self, tmp_path) -> None:
+        app = create_app({"SQLALCHEMY_DATABASE_URI": f"sqlite:///{tmp_path}/migrations.db"})
+        enforced = []
+
+        def check(conn, cursor, statement, *args) -> None:
+            if statement.lstrip().startswith(("CREATE TABLE", "DROP TABLE")):
+                enforced.append(cursor.connection.execute("PRAGMA foreign_keys").fetchone()[0])
+
+        with app.app_context():
+            event.listen(db.engine, "before_cursor_execute", check)
+            upgrade()
+            downgrade(revision="2def4ed6e1f7")
+            upgrade()
+            event.remove(db.engine, "before_cursor_execute", check)
+
+            assert enforced and set(enforced) == {0}
+            with db.engine.connect() as connection:
+                assert connection.exec_driver_sql("PRAGMA foreign_keys").scalar() == 1
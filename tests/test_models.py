@@ -1,6 +1,7 @@
+from sqlalchemy import delete
 from werkzeug.security import check_password_hash
 
-from app.db import User
+from app.db import db, Category, Expenses, User
 
 
 class TestUserModel:
@@ -27,3 +28,30 @@ class TestExpenseModel:
 
     def test_string_representation(self, default_expense) -> None:
         assert str(default_expense) == f"<{default_expense.id} - {default_expense.title}>"
+
+
+class TestSqliteProfile:
+
+    def test_pragmas_are_applied(self, init_database) -> None:
+        connection = db.session.connection()
+
+        assert connection.exec_driver_sql("PRAGMA foreign_keys").scalar() == 1
+        assert connection.exec_driver_sql("PRAGMA journal_mode").scalar() == "wal"
+        assert connection.exec_driver_sql("PRAGMA synchronous").scalar() == 1
+
+    def test_deleting_user_cascades_to_expenses(self, default_expense) -> None:
+        db.session.execute(delete(User).where(User.id == default_expense.user_id))
+        db.session.commit()
+
+        assert db.session.query(Expenses).count() == 0
+
+    def test_deleting_category_unsets_expense_category(self, default_expense) -> None:
+        category = Category(user_id=default_expense.user_id, name="Food")
+        default_expense.category = category
+        db.session.commit()
+
+        db.session.execute(delete(Category))
+        db.session.commit()
+        db.session.refresh(default_expense)
+
+        assert default_expense.category_id is None
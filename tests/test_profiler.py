@@ -0,0 +1,91 @@
+import json
+import marshal
+
+import pytest
+from flask_jwt_extended import create_access_token
+
+from app import create_app
+from app.db import db, User
+
+
+@pytest.fixture
+def profiled_app(tmp_path):
+    def make(**config):
+        app = create_app({
+            "SQLALCHEMY_DATABASE_URI": f"sqlite:///{tmp_path}/profiler.db",
+            "PROFILER_ENABLED": False,
+            "PROFILER_SECRET": "s3cret",
+            **config,
+        })
+        with app.app_context():
+            db.create_all(bind_key=None)
+            user = User(username="profile_user", password="password")
+            db.session.add(user)
+            db.session.commit()
+            headers = {"Authorization": f"Bearer {create_access_token(identity=user.id)}"}
+        return app, headers
+
+    return make
+
+
+@pytest.mark.commits
+class TestProfiler:
+
+    def test_pstats_profile_replaces_the_response(self, profiled_app) -> None:
+        app, headers = profiled_app()
+
+        response = app.test_client().get("/expenses/", headers={
+            **headers, "X-Profile": "pstats", "X-Profile-Secret": "s3cret",
+        })
+
+        assert response.status_code == 200
+        assert response.headers["X-Profiled-Status"] == "200"
+        assert response.headers["Content-Disposition"].endswith(".prof")
+        stats = marshal.loads(response.data)
+        assert any(name == "get_expenses" for _, _, name in stats)
+
+    def test_speedscope_profile(self, profiled_app) -> None:
+        app, headers = profiled_app(PROFILER_ENABLED=True, PROFILER_SAMPLE_INTERVAL=0.0001)
+
+        response = app.test_client().get("/expenses/", headers={
+            **headers, "X-Profile": "speedscope",
+        })
+
+        profile = json.loads(response.data)
+        [sampled] = profile["profiles"]
+        assert sampled["type"] == "sampled"
+        assert len(sampled["samples"]) == len(sampled["weights"])
+        frames = profile["shared"]["frames"]
+        assert all(index < len(frames) for stack in sampled["samples"] for index in stack)
+
+    def test_header_is_ignored_without_the_secret(self, profiled_app) -> None:
+        app, headers = profiled_app()
+        client = app.test_client()
+
+        for secret in ("wrong", None):
+            extra = {"X-Profile-Secret": secret} if secret else {}
+            response = client.get("/expenses/", headers={
+                **headers, "X-Profile": "pstats", **extra,
+            })
+            assert response.json == []
+            assert "X-Profiled-Status" not in response.headers
+
+    def test_profile_is_saved_to_directory(self, profiled_app, tmp_path) -> None:
+        app, headers = profiled_app(PROFILER_ENABLED=True, PROFILER_DIR=str(tmp_path / "profiles"))
+
+        response = app.test_client().get("/expenses/", headers={**headers, "X-Profile": "pstats"})
+
+        assert response.json == []
+        filename = response.headers["X-Profile-File"]
+        assert (tmp_path / "profiles" / filename).exists()
+
+    def test_batch_is_one_profile(self, profiled_app) -> None:
+        app, headers = profiled_app(PROFILER_ENABLED=True)
+
+        response = app.test_client().post("/batch", json={
+            "requests": [{"method": "GET", "path": "/expenses/"}] * 2,
+        }, headers={**headers, "X-Profile": "pstats"})
+
+        assert response.headers["X-Profiled-Status"] == "200"
+        stats = marshal.loads(response.data)
+        assert any(name == "get_expenses" for _, _, name in stats)
@@ -0,0 +1,197 @@
+import csv
+import datetime
+import json
+
+import pytest
+from flask_jwt_extended import create_access_token
+
+from app import create_app
+from app.archive import archive_expenses
+from app.db import db, Category, Expenses, ReportJob, User
+from app.reports import build_report, claim_job, process_pool, requeue_interrupted, serve
+
+
+@pytest.fixture
+def reports_dir(test_client, tmp_path, monkeypatch) -> str:
+    path = str(tmp_path / "reports")
+    monkeypatch.setitem(test_client.application.config, "REPORTS_DIR", path)
+    return path
+
+
+def add_expenses(user: User) -> None:
+    food = Category(user_id=user.id, name="Food")
+    db.session.add(food)
+    db.session.flush()
+    db.session.add_all([
+        Expenses(user_id=user.id, title="Lunch", amount=12.5,
+                 spent_at=datetime.datetime(2025, 3, 1), category_id=food.id),
+        Expenses(user_id=user.id, title="Taxi", amount=20,
+                 spent_at=datetime.datetime(2025, 1, 5)),
+        Expenses(user_id=user.id, title="Old", amount=1,
+                 spent_at=datetime.datetime(2024, 12, 31)),
+    ])
+    db.session.commit()
+
+
+class TestReports:
+
+    def test_report_is_queued(
+            self,
+            test_client,
+            headers_with_access_token
+    ) -> None:
+        response = test_client.post(
+            "/reports", json={"year": 2025}, headers=headers_with_access_token
+        )
+
+        assert response.status_code == 202
+        assert response.headers["Location"].endswith(f"/reports/{response.json['id']}")
+        assert response.json["status"] == "queued"
+        assert response.json["format"] == "csv"
+        assert response.json["download_url"] is None
+
+    def test_invalid_format(
+            self,
+            test_client,
+            headers_with_access_token
+    ) -> None:
+        response = test_client.post(
+            "/reports", json={"year": 2025, "format": "xlsx"}, headers=headers_with_access_token
+        )
+
+        assert response.status_code == 400
+        assert "format" in response.json["errors"]
+
+    @pytest.mark.parametrize("fmt", ["csv", "json"])
+    def test_built_report_can_be_downloaded(
+            self,
+            test_client,
+            headers_with_access_token,
+            default_user,
+            reports_dir,
+            monkeypatch,
+            fmt
+    ) -> None:
+        add_expenses(default_user)
+        monkeypatch.setitem(test_client.application.config, "REPORT_CHUNK_SIZE", 1)
+        job_id = test_client.post(
+            "/reports", json={"year": 2025, "format": fmt}, headers=headers_with_access_token
+        ).json["id"]
+
+        assert claim_job() == job_id
+        build_report(job_id)
+
+        status = test_client.get(f"/reports/{job_id}", headers=headers_with_access_token).json
+        assert status["status"] == "done"
+        assert (status["rows_done"], status["rows_total"], status["progress"]) == (2, 2, 1.0)
+
+        response = test_client.get(status["download_url"], headers=headers_with_access_token)
+        assert response.status_code == 200
+        body = response.get_data(as_text=True)
+        if fmt == "csv":
+            rows = list(csv.DictReader(body.splitlines()))
+            assert [(r["title"], r["category"]) for r in rows] == [("Taxi", ""), ("Lunch", "Food")]
+        else:
+            rows = json.loads(body)
+            assert [(r["title"], r["amount"]) for r in rows] == [("Taxi", 20.0), ("Lunch", 12.5)]
+
+    def test_report_includes_archived_expenses(
+            self,
+            test_client,
+            headers_with_access_token,
+            default_user,
+            reports_dir,
+            monkeypatch
+    ) -> None:
+        add_expenses(default_user)
+        db.session.add(Expenses(user_id=default_user.id, title="Tea", amount=2,
+                                spent_at=datetime.datetime(2025, 2, 1)))
+        db.session.commit()
+        archive_expenses(datetime.datetime(2025, 2, 15), chunk_size=10)
+        monkeypatch.setitem(test_client.application.config, "REPORT_CHUNK_SIZE", 1)
+        job_id = test_client.post(
+            "/reports", json={"year": 2025}, headers=headers_with_access_token
+        ).json["id"]
+
+        assert claim_job() == job_id
+        build_report(job_id)
+
+        status = test_client.get(f"/reports/{job_id}", headers=headers_with_access_token).json
+        assert (status["rows_done"], status["rows_total"]) == (3, 3)
+        body = test_client.get(
+            status["download_url"], headers=headers_with_access_token
+        ).get_data(as_text=True)
+        rows = list(csv.DictReader(body.splitlines()))
+        assert [r["title"] for r in rows] == ["Taxi", "Tea", "Lunch"]
+        assert db.session.query(Expenses).count() == 1
+
+    def test_unfinished_report_has_no_file(
+            self,
+            test_client,
+            headers_with_access_token
+    ) -> None:
+        job_id = test_client.post(
+            "/reports", json={"year": 2025}, headers=headers_with_access_token
+        ).json["id"]
+
+        response = test_client.get(f"/reports/{job_id}/file", headers=headers_with_access_token)
+
+        assert response.status_code == 404
+
+    def test_other_users_report_is_forbidden(
+            self,
+            test_client,
+            headers_with_access_token
+    ) -> None:
+        other = User(username="other_user", password="password")
+        db.session.add(other)
+        db.session.flush()
+        job = ReportJob(user_id=other.id, year=2025, format="csv")
+        db.session.add(job)
+        db.session.commit()
+
+        response = test_client.get(f"/reports/{job.id}", headers=headers_with_access_token)
+        assert response.status_code == 403
+        response = test_client.get("/reports/999999", headers=headers_with_access_token)
+        assert response.status_code == 404
+
+    def test_interrupted_jobs_are_requeued(self, default_user) -> None:
+        job = ReportJob(user_id=default_user.id, year=2025, format="csv", status="running")
+        db.session.add(job)
+        db.session.commit()
+
+        assert requeue_interrupted() == 1
+        assert claim_job() == job.id
+        assert claim_job() is None
+
+
+@pytest.mark.commits
+class TestReportWorker:
+
+    def test_jobs_run_on_the_process_pool(self, tmp_path) -> None:
+        app = create_app({
+            "SQLALCHEMY_DATABASE_URI": f"sqlite:///{tmp_path}/reports.db",
+            "REPORTS_DIR": str(tmp_path / "reports"),
+            "SERVER_NAME": None,
+        })
+        with app.app_context():
+            db.create_all(bind_key=None)
+            user = User(username="report_user", password="password")
+            db.session.add(user)
+            db.session.commit()
+            add_expenses(user)
+            headers = {"Authorization": f"Bearer {create_access_token(identity=user.id)}"}
+
+            client = app.test_client()
+            ids = [
+                client.post("/reports", json={"year": year}, headers=headers).json["id"]
+                for year in (2024, 2025)
+            ]
+
+            with process_pool(2) as pool:
+                assert serve(pool, 2, poll_interval=0.05, until_idle=True) == 2
+
+            db.session.expire_all()
+            jobs = [db.session.get(ReportJob, pk) for pk in ids]
+            assert [(job.status, job.rows_total) for job in jobs] == [("done", 1), ("done", 2)]
+            assert (tmp_path / "reports" / f"{ids[1]}.csv").exists()
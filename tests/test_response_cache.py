@@ -0,0 +1,168 @@
+import pytest
+from flask import url_for
+from sqlalchemy import update
+
+from app import expenses
+from app.db import db, Expenses, User
+from app.response_cache import MemoryBackend, response_cache
+
+
+def expense_url(pk: int) -> str:
+    return url_for("expenses.get_expense", pk=pk)
+
+
+class TestGetExpenseCache:
+
+    def test_second_read_is_served_from_cache(
+            self,
+            test_client,
+            headers_with_access_token,
+            default_expense
+    ) -> None:
+        first = test_client.get(expense_url(default_expense.id), headers=headers_with_access_token)
+        second = test_client.get(expense_url(default_expense.id), headers=headers_with_access_token)
+
+        assert first.headers["X-Cache"] == "MISS"
+        assert second.headers["X-Cache"] == "HIT"
+        assert second.json == first.json
+        assert response_cache.metrics()["hits"] >= 1
+
+    def test_update_and_delete_invalidate(
+            self,
+            test_client,
+            headers_with_access_token,
+            default_expense
+    ) -> None:
+        url = expense_url(default_expense.id)
+        test_client.get(url, headers=headers_with_access_token)
+
+        test_client.patch(url, json={"amount": 7}, headers=headers_with_access_token)
+        response = test_client.get(url, headers=headers_with_access_token)
+        assert response.headers["X-Cache"] == "MISS"
+        assert response.json["amount"] == 7.0
+
+        test_client.delete(url, headers=headers_with_access_token)
+        response = test_client.get(url, headers=headers_with_access_token)
+        assert response.status_code == 404
+
+    def test_cached_entry_is_not_served_to_another_user(
+            self,
+            test_client,
+            headers_with_access_token,
+            default_expense
+    ) -> None:
+        test_client.get(expense_url(default_expense.id), headers=headers_with_access_token)
+
+        another_user = User(username="another_user")
+        another_user.set_password("test_password")
+        db.session.add(another_user)
+        db.session.commit()
+        token = test_client.post(
+            url_for("auth.login"),
+            json={"username": "another_user", "password": "test_password"},
+        ).json["access_token"]
+
+        response = test_client.get(
+            expense_url(default_expense.id), headers={"Authorization": f"Bearer {token}"}
+        )
+        assert response.status_code == 403
+
+    @pytest.mark.commits
+    def test_rolled_back_batch_leaves_no_stale_entry(
+            self,
+            test_client,
+            headers_with_access_token,
+            batch_url,
+            default_expense
+    ) -> None:
+        url = expense_url(default_expense.id)
+        payload = {
+            "atomic": True,
+            "requests": [
+                {"method": "PATCH", "path": url, "body": {"amount": 7}},
+                {"method": "GET", "path": url},
+                {"method": "GET", "path": "/expenses/999"},
+            ],
+        }
+        response = test_client.post(batch_url, json=payload, headers=headers_with_access_token)
+        assert response.json["committed"] is False
+
+        response = test_client.get(url, headers=headers_with_access_token)
+        assert response.json["amount"] == 100.0
+
+    def test_read_racing_an_update_is_not_cached(
+            self,
+            test_client,
+            headers_with_access_token,
+            default_expense,
+            monkeypatch
+    ) -> None:
+        url = expense_url(default_expense.id)
+        owned_expense_row = expenses._owned_expense_row
+
+        def read_then_update(pk: int):
+            # Another request commits a change between our read and our set.
+            row = owned_expense_row(pk)
+            db.session.execute(update(Expenses).where(Expenses.id == pk).values(amount=7))
+            response_cache.invalidate(default_expense.user_id, [pk])
+            monkeypatch.setattr(expenses, "_owned_expense_row", owned_expense_row)
+            return row
+
+        monkeypatch.setattr(expenses, "_owned_expense_row", read_then_update)
+        stale = test_client.get(url, headers=headers_with_access_token)
+        assert stale.json["amount"] == 100.0
+
+        response = test_client.get(url, headers=headers_with_access_token)
+        assert response.headers["X-Cache"] == "MISS"
+        assert response.json["amount"] == 7.0
+
+    def test_metrics_endpoint(self, test_client) -> None:
+        response = test_client.get(url_for("metrics.get_metrics"))
+
+        assert response.status_code == 200
+        assert set(response.json["response_cache"]) == {
+            "hits", "misses", "invalidations", "hit_rate"
+        }
+
+
+class TestMemoryBackend:
+
+    def test_evicts_least_recently_used(self) -> None:
+        backend = MemoryBackend(max_entries=2)
+        backend.set("a", b"1", ttl=60, generation=0)
+        backend.set("b", b"2", ttl=60, generation=0)
+        backend.get("a")
+        backend.set("c", b"3", ttl=60, generation=0)
+
+        assert backend.get("b") == (None, 0)
+        assert backend.get("a") == (b"1", 0)
+        assert backend.get("c") == (b"3", 0)
+
+    def test_expired_entries_are_dropped(self) -> None:
+        backend = MemoryBackend()
+        backend.set("a", b"1", ttl=-1, generation=0)
+
+        assert backend.get("a") == (None, 0)
+        assert len(backend) == 0
+
+    def test_read_from_before_an_invalidation_is_not_stored(self) -> None:
+        backend = MemoryBackend()
+        _, generation = backend.get("a")
+
+        backend.invalidate("a")
+        backend.set("a", b"stale", ttl=60, generation=generation)
+        assert backend.get("a")[0] is None
+
+        _, generation = backend.get("a")
+        backend.set("a", b"fresh", ttl=60, generation=generation)
+        assert backend.get("a")[0] == b"fresh"
+
+    def test_evicted_generations_still_reject_old_reads(self) -> None:
+        backend = MemoryBackend(max_entries=1)
+        _, generation = backend.get("a")
+
+        backend.invalidate("a")
+        backend.invalidate("b")
+        backend.set("a", b"stale", ttl=60, generation=generation)
+
+        assert backend.get("a")[0] is None
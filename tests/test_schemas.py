@@ -1,8 +1,11 @@
+import datetime
+
 import pytest
 from marshmallow import ValidationError
+from sqlalchemy import select
 
-from app.db import User
-from app.schemas import UserSchema
+from app.db import db, expense_row_columns, Category, Expenses, User
+from app.schemas import UserSchema, dump_expense_rows, expenses_out_schema
 
 
 class TestUserSchema:
@@ -29,3 +32,24 @@ class TestUserSchema:
             schema.load(data)
 
         assert e.value.messages == expected_message
+
+
+class TestDumpExpenseRows:
+
+    def test_matches_the_schema(self, default_user: User) -> None:
+        category = Category(user_id=default_user.id, name="Food")
+        db.session.add(category)
+        db.session.flush()
+        db.session.add_all([
+            Expenses(user_id=default_user.id, title="Lunch", amount=12.5,
+                     spent_at=datetime.datetime(2025, 3, 1, 12, 30), category_id=category.id),
+            Expenses(user_id=default_user.id, title="Taxi", amount=20),
+        ])
+        db.session.commit()
+
+        rows = db.session.execute(
+            select(*expense_row_columns()).order_by(Expenses.id)
+        ).all()
+        expenses = db.session.scalars(select(Expenses).order_by(Expenses.id)).all()
+
+        assert dump_expense_rows(rows) == expenses_out_schema.dump(expenses)
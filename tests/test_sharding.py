@@ -0,0 +1,191 @@
+import pytest
+from flask_jwt_extended import create_access_token
+from sqlalchemy import func, select
+
+from app import create_app
+from app.db import db, shard_key, User, Expenses, UserExpenseStats
+from app.sharding import create_shard_schema, rebalance
+
+
+def make_app(tmp_path, shard_count: int):
+    return create_app({
+        "SQLALCHEMY_DATABASE_URI": f"sqlite:///{tmp_path}/main.db",
+        "EXPENSE_SHARDS": [f"sqlite:///{tmp_path}/shard{i}.db" for i in range(shard_count)],
+        "SERVER_NAME": None,
+    })
+
+
+def expense_counts(shard_count: int) -> dict:
+    counts = {}
+    for key in [None, *(f"shard{i}" for i in range(shard_count))]:
+        with db.engines[key].connect() as connection:
+            counts[key] = connection.scalar(
+                select(func.count()).select_from(Expenses.__table__)
+            )
+    return counts
+
+
+def create_users(count: int) -> list[User]:
+    users = [User(username=f"user_{i:04}", password="password") for i in range(count)]
+    db.session.add_all(users)
+    db.session.commit()
+    return users
+
+
+@pytest.fixture
+def sharded_app(tmp_path):
+    app = make_app(tmp_path, shard_count=3)
+    with app.app_context():
+        db.create_all(bind_key=None)
+        create_shard_schema()
+        yield app
+
+
+@pytest.mark.commits
+class TestShardRouting:
+
+    def test_expenses_are_written_to_the_users_shard(self, sharded_app) -> None:
+        users = create_users(4)
+        client = sharded_app.test_client()
+
+        for user in users:
+            headers = {"Authorization": f"Bearer {create_access_token(identity=user.id)}"}
+            response = client.post(
+                "/expenses/", json={"title": "Taxi", "amount": 10}, headers=headers
+            )
+            assert response.status_code == 201
+
+            pk = response.json["id"]
+            assert client.get(f"/expenses/{pk}", headers=headers).json["user_id"] == user.id
+            totals = client.get("/expenses/totals", headers=headers).json
+            assert totals["count"] == 1
+
+        expected = {None: 0, "shard0": 0, "shard1": 0, "shard2": 0}
+        for user in users:
+            expected[shard_key(user.id, 3)] += 1
+        assert expense_counts(3) == expected
+
+    def test_batch_runs_on_the_users_shard(self, sharded_app) -> None:
+        user = create_users(1)[0]
+        headers = {"Authorization": f"Bearer {create_access_token(identity=user.id)}"}
+
+        response = sharded_app.test_client().post("/batch", headers=headers, json={
+            "requests": [
+                {"method": "POST", "path": "/expenses/", "body": {"title": "Taxi", "amount": 3}},
+                {"method": "GET", "path": "/expenses/"},
+            ]
+        })
+
+        assert [r["status"] for r in response.json["responses"]] == [201, 200]
+        assert expense_counts(3)[shard_key(user.id, 3)] == 1
+
+    def test_ids_are_unique_across_shards(self, sharded_app) -> None:
+        users = create_users(6)
+        client = sharded_app.test_client()
+        ids = {}
+        for user in users:
+            headers = {"Authorization": f"Bearer {create_access_token(identity=user.id)}"}
+            for title in ("Taxi", "Rent"):
+                response = client.post(
+                    "/expenses/", json={"title": title, "amount": 1}, headers=headers
+                )
+                ids[response.json["id"]] = user
+
+        assert len(ids) == 12
+        assert len({shard_key(user.id, 3) for user in users}) > 1
+
+        first, other = users[0], next(
+            user for user in users[1:] if shard_key(user.id, 3) != shard_key(users[0].id, 3)
+        )
+        pk = next(pk for pk, owner in ids.items() if owner is other)
+        headers = {"Authorization": f"Bearer {create_access_token(identity=first.id)}"}
+        assert client.get(f"/expenses/{pk}", headers=headers).status_code == 403
+        assert client.delete(f"/expenses/{pk}", headers=headers).status_code == 403
+        assert client.get("/expenses/999999", headers=headers).status_code == 404
+
+
+@pytest.mark.commits
+class TestRebalance:
+
+    def test_spreads_an_unsharded_database(self, tmp_path) -> None:
+        app = make_app(tmp_path, shard_count=0)
+        with app.app_context():
+            db.create_all(bind_key=None)
+            users = create_users(6)
+            for user in users:
+                db.session.add_all([
+                    Expenses(user_id=user.id, title="Taxi", amount=user.id),
+                    Expenses(user_id=user.id, title="Rent", amount=1),
+                ])
+            db.session.commit()
+            user_ids = [user.id for user in users]
+
+        app = make_app(tmp_path, shard_count=2)
+        with app.app_context():
+            create_shard_schema()
+
+            assert rebalance() == (6, [])
+            counts = expense_counts(2)
+            assert counts[None] == 0
+            assert counts["shard0"] + counts["shard1"] == 12
+
+            for user_id in user_ids:
+                engine = db.engines[shard_key(user_id, 2)]
+                with engine.connect() as connection:
+                    stats = connection.execute(
+                        select(UserExpenseStats.__table__)
+                        .where(UserExpenseStats.user_id == user_id)
+                    ).one()
+                assert (stats.count, stats.total) == (2, user_id + 1)
+
+            assert rebalance() == (0, [])
+
+    def test_moves_users_when_shards_are_added(self, tmp_path) -> None:
+        app = make_app(tmp_path, shard_count=1)
+        with app.app_context():
+            db.create_all(bind_key=None)
+            create_shard_schema()
+            user_ids = [user.id for user in create_users(5)]
+            client = app.test_client()
+            for user_id in user_ids:
+                headers = {"Authorization": f"Bearer {create_access_token(identity=user_id)}"}
+                client.post("/expenses/", json={"title": "Taxi", "amount": 1}, headers=headers)
+
+        app = make_app(tmp_path, shard_count=3)
+        with app.app_context():
+            create_shard_schema()
+            moved, collisions = rebalance()
+
+            assert collisions == []
+            assert moved == sum(shard_key(user_id, 3) != "shard0" for user_id in user_ids)
+            assert sum(expense_counts(3).values()) == 5
+
+            client = app.test_client()
+            for user_id in user_ids:
+                headers = {"Authorization": f"Bearer {create_access_token(identity=user_id)}"}
+                assert len(client.get("/expenses/", headers=headers).json) == 1
+
+    def test_moves_between_shards_keep_ids(self, tmp_path) -> None:
+        app = make_app(tmp_path, shard_count=2)
+        with app.app_context():
+            db.create_all(bind_key=None)
+            create_shard_schema()
+            user_ids = [user.id for user in create_users(8)]
+            client = app.test_client()
+            ids = {}
+            for user_id in user_ids:
+                headers = {"Authorization": f"Bearer {create_access_token(identity=user_id)}"}
+                response = client.post(
+                    "/expenses/", json={"title": "Taxi", "amount": 1}, headers=headers
+                )
+                ids[user_id] = response.json["id"]
+
+        app = make_app(tmp_path, shard_count=3)
+        with app.app_context():
+            create_shard_schema()
+            assert rebalance()[1] == []
+
+            client = app.test_client()
+            for user_id, pk in ids.items():
+                headers = {"Authorization": f"Bearer {create_access_token(identity=user_id)}"}
+                assert [e["id"] for e in client.get("/expenses/", headers=headers).json] == [pk]
@@ -0,0 +1,117 @@
+from app import stats
+from app.db import db, Expenses, UserExpenseStats
+from app.stats import stats_cli, rebuild_stats, refresh_user_stats, verify_stats
+
+
+class TestStatsCommands:
+
+    def test_verify_detects_stale_stats(self, default_expense) -> None:
+        db.session.add(UserExpenseStats(user_id=default_expense.user_id, count=5, total=1))
+        db.session.commit()
+
+        assert verify_stats() == [default_expense.user_id]
+
+    def test_rebuild_recomputes_stats(self, default_user) -> None:
+        for amount in (1, 2, 3):
+            db.session.add(Expenses(user=default_user, title="test_title", amount=amount))
+        db.session.add(UserExpenseStats(user_id=default_user.id, count=0, total=0))
+        db.session.commit()
+
+        assert rebuild_stats() == 1
+
+        stats = db.session.get(UserExpenseStats, default_user.id)
+        assert (stats.count, stats.total, stats.min_amount, stats.max_amount) == (3, 6, 1, 3)
+        assert verify_stats() == []
+
+    def test_cli_verify_exit_code(self, test_client, default_expense) -> None:
+        runner = test_client.application.test_cli_runner()
+
+        result = runner.invoke(stats_cli, ["verify"])
+        assert result.exit_code == 1
+
+        result = runner.invoke(stats_cli, ["rebuild"])
+        assert result.exit_code == 0
+
+        result = runner.invoke(stats_cli, ["verify"])
+        assert result.exit_code == 0
+        assert "consistent" in result.output
+
+
+class TestRecordAmountChange:
+
+    def test_extremes_follow_the_changed_expense(
+            self,
+            test_client,
+            headers_with_access_token,
+            default_user
+    ) -> None:
+        expenses = [
+            Expenses(user=default_user, title="test_title", amount=amount)
+            for amount in (10, 20, 30)
+        ]
+        db.session.add_all(expenses)
+        db.session.commit()
+        refresh_user_stats(default_user.id)
+        db.session.commit()
+
+        for expense, amount in ((expenses[0], 40), (expenses[0], 5), (expenses[2], 25)):
+            response = test_client.patch(
+                f"/expenses/{expense.id}",
+                json={"amount": amount},
+                headers=headers_with_access_token
+            )
+            assert response.status_code == 200
+            assert verify_stats() == []
+
+        stats = db.session.get(UserExpenseStats, default_user.id)
+        db.session.refresh(stats)
+        assert (stats.count, stats.total, stats.min_amount, stats.max_amount) == (3, 50, 5, 25)
+
+    def test_missing_stats_row_is_backfilled(
+            self,
+            test_client,
+            headers_with_access_token,
+            default_expense
+    ) -> None:
+        response = test_client.patch(
+            f"/expenses/{default_expense.id}",
+            json={"amount": 7},
+            headers=headers_with_access_token
+        )
+
+        assert response.status_code == 200
+        assert db.session.get(UserExpenseStats, default_expense.user_id).total == 7
+
+
+class TestFirstWrite:
+
+    def test_stats_row_created_by_a_racing_write_gets_the_delta(
+            self,
+            default_user,
+            monkeypatch
+    ) -> None:
+        user_id = default_user.id
+        db.session.add(Expenses(user=default_user, title="test_title", amount=7))
+        db.session.flush()
+        aggregate = stats._user_aggregate
+
+        def racing_aggregate(user_id: int) -> dict:
+            # Another request's first write lands between our UPDATE and INSERT.
+            db.session.execute(stats.stats_table.insert().values(
+                user_id=user_id, count=1, total=3, min_amount=3, max_amount=3
+            ))
+            return aggregate(user_id)
+
+        monkeypatch.setattr(stats, "_user_aggregate", racing_aggregate)
+        stats.record_insert(user_id, 7)
+
+        row = db.session.get(UserExpenseStats, user_id)
+        assert (row.count, row.total, row.min_amount, row.max_amount) == (2, 10, 3, 7)
+
+    def test_refresh_overwrites_an_existing_row(self, default_expense) -> None:
+        db.session.add(UserExpenseStats(user_id=default_expense.user_id, count=5, total=1))
+        db.session.flush()
+
+        refreshed = refresh_user_stats(default_expense.user_id)
+
+        assert (refreshed.count, refreshed.total) == (1, default_expense.amount)
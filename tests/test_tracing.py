@@ -0,0 +1,150 @@
+import json
+import threading
+
+import pytest
+from flask_jwt_extended import create_access_token
+from sqlalchemy import text
+from sqlalchemy.exc import OperationalError
+
+from app import create_app
+from app.db import db, User
+from app.tracing import FileExporter, OtlpFileExporter, Span, Trace, tracer
+
+
+@pytest.fixture
+def traced_app(tmp_path):
+    def make(**config):
+        app = create_app({
+            "SQLALCHEMY_DATABASE_URI": f"sqlite:///{tmp_path}/tracing.db",
+            "TRACING_EXPORTER": "memory",
+            "DEBUG": True,
+            **config,
+        })
+        with app.app_context():
+            db.create_all(bind_key=None)
+            user = User(username="trace_user", password="password")
+            db.session.add(user)
+            db.session.commit()
+            headers = {"Authorization": f"Bearer {create_access_token(identity=user.id)}"}
+        return app, headers
+
+    return make
+
+
+@pytest.mark.commits
+class TestTracing:
+
+    def test_list_request_is_broken_into_spans(self, traced_app) -> None:
+        app, headers = traced_app()
+        client = app.test_client()
+
+        client.get("/expenses/", headers=headers)
+
+        [trace] = tracer.exporter.traces
+        names = [span.name for span in trace.spans]
+        assert names[0] == "GET /expenses/"
+        assert trace.root.attributes == {"endpoint": "expenses.get_expenses", "status": 200}
+        for name in ("jwt.decode", "jwt.blocklist", "jwt.user_lookup", "sql",
+                     "expenses.query", "expenses.serialize", "json.encode"):
+            assert name in names
+        by_id = {span.span_id: span for span in trace.spans}
+        lookup = next(span for span in trace.spans if span.name == "jwt.user_lookup")
+        sql = next(span for span in trace.spans if span.parent_id == lookup.span_id)
+        assert sql.name == "sql" and by_id[lookup.parent_id] is trace.root
+        assert all(span.end_ns >= span.start_ns for span in trace.spans)
+
+    def test_batch_is_one_trace(self, traced_app) -> None:
+        app, headers = traced_app()
+
+        app.test_client().post("/batch", headers=headers, json={
+            "requests": [{"method": "GET", "path": "/expenses/"}] * 2
+        })
+
+        [trace] = tracer.exporter.traces
+        assert [s.name for s in trace.spans].count("expenses.serialize") == 2
+        assert trace.root.end_ns >= max(span.end_ns for span in trace.spans)
+
+    def test_slowest_traces_view(self, traced_app) -> None:
+        app, headers = traced_app()
+        client = app.test_client()
+        client.get("/")
+        client.get("/expenses/", headers=headers)
+
+        response = client.get("/debug/traces?limit=2")
+
+        durations = [trace["duration_ms"] for trace in response.json]
+        assert len(durations) == 2
+        assert durations == sorted(durations, reverse=True)
+
+    def test_unsampled_requests_are_not_traced(self, traced_app) -> None:
+        app, headers = traced_app(TRACING_SAMPLE_RATE=0.0)
+
+        app.test_client().get("/expenses/", headers=headers)
+
+        assert len(tracer.exporter.traces) == 0
+
+    def test_failed_statement_ends_its_span(self, traced_app) -> None:
+        app, _ = traced_app()
+
+        with app.test_request_context("/"):
+            tracer._start()
+            with pytest.raises(OperationalError):
+                db.session.execute(text("SELECT * FROM missing_table"))
+            db.session.rollback()
+            db.session.execute(text("SELECT 1"))
+            tracer._finish(None)
+
+        [trace] = tracer.exporter.traces
+        failed, *_, last = [span for span in trace.spans if span.name == "sql"]
+        assert failed.attributes["error"] == "OperationalError"
+        assert failed.end_ns >= failed.start_ns > 0
+        assert last.parent_id == trace.root.span_id
+
+    def test_otlp_exporter(self, traced_app, tmp_path) -> None:
+        path = tmp_path / "traces.jsonl"
+        app, headers = traced_app(TRACING_EXPORTER="otlp", TRACING_FILE=str(path))
+
+        app.test_client().get("/expenses/", headers=headers)
+
+        assert isinstance(tracer.exporter, OtlpFileExporter)
+        tracer.close()
+        [line] = path.read_text().splitlines()
+        [resource_spans] = json.loads(line)["resourceSpans"]
+        spans = resource_spans["scopeSpans"][0]["spans"]
+        root = spans[0]
+        assert root["kind"] == 2 and root["parentSpanId"] == ""
+        assert len(root["traceId"]) == 32 and len(root["spanId"]) == 16
+        assert {"key": "status", "value": {"intValue": "200"}} in root["attributes"]
+        assert all(span["traceId"] == root["traceId"] for span in spans)
+
+    def test_file_exporter_writes_off_the_request_thread(self, traced_app, tmp_path) -> None:
+        path = tmp_path / "traces.jsonl"
+        app, headers = traced_app(TRACING_EXPORTER="file", TRACING_FILE=str(path))
+        writers = []
+        encode = tracer.exporter.encode
+        tracer.exporter.encode = lambda trace: writers.append(threading.get_ident()) or encode(trace)
+
+        app.test_client().get("/expenses/", headers=headers)
+        tracer.close()
+
+        assert writers and threading.get_ident() not in writers
+        [line] = path.read_text().splitlines()
+        assert json.loads(line)["name"] == "GET /expenses/"
+
+
+class TestFileExporter:
+
+    def test_drops_traces_when_the_queue_is_full(self, tmp_path) -> None:
+        path = tmp_path / "traces.jsonl"
+        exporter = FileExporter(str(path), max_queue=1)
+        exporter.listener.stop()
+        trace = Trace()
+        trace.spans.append(Span("job", None, {}))
+
+        for _ in range(3):
+            exporter.export(trace)
+
+        assert exporter.metrics() == {"queued": 1, "dropped": 2}
+        exporter.listener.start()
+        exporter.close()
+        assert len(path.read_text().splitlines()) == 1
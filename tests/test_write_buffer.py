@@ -0,0 +1,186 @@
+import threading
+import time
+
+import pytest
+from flask_jwt_extended import create_access_token
+from werkzeug.exceptions import ServiceUnavailable
+
+from app import create_app
+from app.db import db, Expenses, User, UserExpenseStats
+from app.schemas import expense_out_schema
+from app.write_buffer import ExpenseWriteBuffer
+
+
+@pytest.fixture
+def write_buffer_enabled(test_client) -> None:
+    test_client.application.config["EXPENSE_WRITE_BUFFER"] = True
+    yield
+    test_client.application.config["EXPENSE_WRITE_BUFFER"] = False
+
+
+@pytest.mark.commits
+class TestBufferedCreateExpense:
+
+    def test_create_returns_committed_expense(
+            self,
+            test_client,
+            headers_with_access_token,
+            create_expense_url,
+            write_buffer_enabled
+    ) -> None:
+        response = test_client.post(
+            create_expense_url,
+            json={"title": "Test Expense", "amount": 100},
+            headers=headers_with_access_token
+        )
+        db.session.expire_all()
+        created_expense = db.session.get(Expenses, response.json["id"])
+
+        assert response.status_code == 201
+        assert response.json == expense_out_schema.dump(created_expense)
+        assert db.session.get(UserExpenseStats, created_expense.user_id).count == 1
+
+    def test_batch_bypasses_the_buffer(
+            self,
+            test_client,
+            headers_with_access_token,
+            batch_url,
+            write_buffer_enabled,
+            monkeypatch
+    ) -> None:
+        submits = []
+        monkeypatch.setattr("app.expenses.write_buffer.submit", submits.append)
+        payload = {
+            "atomic": True,
+            "requests": [
+                {"method": "POST", "path": "/expenses/", "body": {"title": "Taxi", "amount": 30}},
+                {"method": "GET", "path": "/expenses/999999"},
+            ],
+        }
+
+        response = test_client.post(batch_url, json=payload, headers=headers_with_access_token)
+
+        assert response.json["committed"] is False
+        assert response.json["responses"][0]["status"] == 201
+        assert submits == []
+        assert db.session.query(Expenses).count() == 0
+
+
+class TestExpenseWriteBuffer:
+
+    @pytest.mark.commits
+    def test_concurrent_submits_share_one_commit(self, test_client, default_user) -> None:
+        app = test_client.application
+        write_buffer = ExpenseWriteBuffer(max_rows=5, max_delay=5)
+        flushes = []
+        flush = write_buffer._flush
+
+        def counting_flush(group) -> None:
+            flushes.append(len(group))
+            flush(group)
+
+        write_buffer._flush = counting_flush
+        results = []
+        user_id = default_user.id
+
+        def create(amount: int) -> None:
+            with app.app_context():
+                results.append(write_buffer.submit(
+                    {"user_id": user_id, "title": "test_title", "amount": amount}
+                ))
+
+        threads = [threading.Thread(target=create, args=(i,)) for i in range(1, 6)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        assert flushes == [5]
+        assert sorted(row["amount"] for row in results) == [1, 2, 3, 4, 5]
+        assert len({row["id"] for row in results}) == 5
+        assert db.session.query(Expenses).count() == 5
+        assert db.session.get(UserExpenseStats, user_id).total == 15
+
+    @pytest.mark.commits
+    def test_flush_leaves_the_callers_session_alone(
+            self,
+            test_client,
+            default_user,
+            default_password_hash
+    ) -> None:
+        write_buffer = ExpenseWriteBuffer(max_delay=0)
+        user_id = default_user.id
+        default_user.password = "not_committed"
+
+        row = write_buffer.submit({"user_id": user_id, "title": "test_title", "amount": 1})
+
+        assert default_user in db.session.dirty
+        db.session.rollback()
+        assert default_user.password == default_password_hash
+        assert db.session.get(Expenses, row["id"]) is not None
+
+    def test_follower_gives_up_on_a_stuck_leader(self, test_client) -> None:
+        write_buffer = ExpenseWriteBuffer(max_rows=2, max_delay=5, timeout=0.05)
+        release = threading.Event()
+        write_buffer._flush = lambda group: release.wait(5)
+        leader = threading.Thread(target=write_buffer.submit, args=({"user_id": 1},))
+        leader.start()
+        while not write_buffer._pending:
+            time.sleep(0.001)
+
+        with pytest.raises(ServiceUnavailable):
+            write_buffer.submit({"user_id": 1})
+
+        release.set()
+        leader.join()
+
+    def test_failed_group_raises_for_every_caller(self, test_client) -> None:
+        write_buffer = ExpenseWriteBuffer(max_delay=0)
+
+        with pytest.raises(Exception):
+            write_buffer.submit({"user_id": None, "title": "test_title", "amount": 1})
+
+        assert db.session.query(Expenses).count() == 0
+
+
+@pytest.mark.commits
+class TestConcurrentLeaders:
+
+    def test_leaders_flushing_at_once_all_commit(self, tmp_path) -> None:
+        app = create_app({
+            "SQLALCHEMY_DATABASE_URI": f"sqlite:///{tmp_path}/write_buffer.db",
+            "SQLITE_PROFILE": "performance",
+            "EXPENSE_WRITE_BUFFER": True,
+            # Every request leads its own group, so all of them flush at once.
+            "EXPENSE_WRITE_BUFFER_MAX_ROWS": 1,
+            "SERVER_NAME": None,
+        })
+        with app.app_context():
+            db.create_all(bind_key=None)
+            user = User(username="buffer_user", password="password")
+            db.session.add(user)
+            db.session.commit()
+            user_id = user.id
+            headers = {"Authorization": f"Bearer {create_access_token(identity=user_id)}"}
+
+        start = threading.Barrier(16)
+        statuses = []
+
+        def create(amount: int) -> None:
+            client = app.test_client()
+            start.wait()
+            for _ in range(3):
+                response = client.post(
+                    "/expenses/", json={"title": "Taxi", "amount": amount}, headers=headers
+                )
+                statuses.append(response.status_code)
+
+        threads = [threading.Thread(target=create, args=(i,)) for i in range(1, 17)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join(timeout=60)
+
+        assert statuses == [201] * 48
+        with app.app_context():
+            assert db.session.get(UserExpenseStats, user_id).count == 48